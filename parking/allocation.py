@@ -0,0 +1,193 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .availability import record_transition
+from .models import ParkingSession, ParkingSpot
+
+# Spot partitions (is_handicap, is_ev_charging) to try, in order, for a
+# vehicle's (needs handicap spot, is electric). Handicap spots only go to
+# vehicles that need them, and EV chargers are handed to other cars last.
+PREFERENCES = {
+    (False, False): ((False, False), (False, True)),
+    (False, True): ((False, True), (False, False)),
+    (True, False): ((True, False), (True, True)),
+    (True, True): ((True, True), (True, False)),
+}
+
+
+class NoFreeSpot(Exception):
+    pass
+
+
+class SpotAllocator:
+    """
+    Hands out free spots per lot from in-memory sets keyed by
+    (is_handicap, is_ev_charging), so picking a spot is a set pop.
+
+    The database stays the source of truth: spots popped from a set are
+    re-checked and locked with select_for_update(skip_locked) before being
+    flipped to occupied, so spots taken by another process are skipped. When
+    a set runs dry the remaining spots come straight from the database, and
+    sets are reloaded every `refresh_interval` seconds to pick up spots freed
+    elsewhere.
+    """
+
+    def __init__(self, refresh_interval=30.0):
+        self.refresh_interval = refresh_interval
+        self.lock = threading.Lock()
+        self.lots = {}       # lot id -> {(is_handicap, is_ev_charging): set of spot ids}
+        self.loaded_at = {}  # lot id -> time.monotonic() of the last load
+
+    def load(self, lot_id):
+        free = {partition: set() for partition in PREFERENCES}
+        spots = ParkingSpot.objects.filter(parking_lot_id=lot_id, status='available')
+        for spot_id, is_handicap, is_ev_charging in spots.values_list('id', 'is_handicap', 'is_ev_charging'):
+            free[(is_handicap, is_ev_charging)].add(spot_id)
+        self.lots[lot_id] = free
+        self.loaded_at[lot_id] = time.monotonic()
+
+    def invalidate(self, lot_id=None):
+        with self.lock:
+            if lot_id is None:
+                self.lots.clear()
+                self.loaded_at.clear()
+            else:
+                self.lots.pop(lot_id, None)
+                self.loaded_at.pop(lot_id, None)
+
+    def pop(self, lot_id, partition, count):
+        with self.lock:
+            if lot_id not in self.lots or time.monotonic() - self.loaded_at[lot_id] > self.refresh_interval:
+                self.load(lot_id)
+            free = self.lots[lot_id][partition]
+            return [free.pop() for _ in range(min(count, len(free)))]
+
+    def occupy(self, spot_ids, lot_id, partition):
+        ParkingSpot.objects.filter(pk__in=spot_ids).update(status='occupied', updated_at=timezone.now())
+        # update() skips the post_save counter signal
+        record_transition((lot_id, 'available', *partition), (lot_id, 'occupied', *partition), len(spot_ids))
+
+    def claim(self, spot_id, lot_id, partition):
+        """Flip one given spot from available to occupied; False if it is no longer free."""
+        is_handicap, is_ev_charging = partition
+        with transaction.atomic():
+            claimed = ParkingSpot.objects.filter(
+                pk=spot_id, parking_lot_id=lot_id, status='available',
+                is_handicap=is_handicap, is_ev_charging=is_ev_charging,
+            ).update(status='occupied', updated_at=timezone.now())
+            if claimed:
+                record_transition((lot_id, 'available', *partition), (lot_id, 'occupied', *partition))
+        return bool(claimed)
+
+    def claim_batch(self, lot_id, partition, count):
+        """Occupy up to `count` free spots of one partition and return their ids."""
+        is_handicap, is_ev_charging = partition
+        free = ParkingSpot.objects.select_for_update(skip_locked=True).filter(
+            parking_lot_id=lot_id, status='available', is_handicap=is_handicap, is_ev_charging=is_ev_charging,
+        )
+        with transaction.atomic():
+            # Spots from the set are confirmed and locked in one query. Concurrent
+            # claimers skip each other's locked rows instead of queueing on them
+            popped = self.pop(lot_id, partition, count)
+            claimed = list(free.filter(pk__in=popped).values_list('id', flat=True)) if popped else []
+            if len(claimed) < count:
+                # The set ran dry or was stale, so take the rest from the database
+                extra = list(free.exclude(pk__in=claimed).values_list('id', flat=True)[:count - len(claimed)])
+                if extra:
+                    # It missed spots freed elsewhere, so reload it next time
+                    self.invalidate(lot_id)
+                    claimed += extra
+            if claimed:
+                self.occupy(claimed, lot_id, partition)
+        return claimed
+
+    def allocate_many(self, lot_id, needs):
+        """
+        Occupy spots for a list of (needs handicap spot, is electric) pairs in
+        one lot. Returns spot ids in the same order, None where the lot is full.
+        """
+        spot_ids = [None] * len(needs)
+        waiting = list(range(len(needs)))
+        with transaction.atomic():
+            for choice in range(len(PREFERENCES[(False, False)])):
+                by_partition = {}
+                for index in waiting:
+                    by_partition.setdefault(PREFERENCES[needs[index]][choice], []).append(index)
+                for partition, indexes in by_partition.items():
+                    for index, spot_id in zip(indexes, self.claim_batch(lot_id, partition, len(indexes))):
+                        spot_ids[index] = spot_id
+                waiting = [index for index in waiting if spot_ids[index] is None]
+                if not waiting:
+                    break
+        return spot_ids
+
+    def allocate(self, lot_id, needs_handicap=False, is_electric=False):
+        """Occupy and return the id of a free spot in the lot, or None when it is full."""
+        return self.allocate_many(lot_id, [(needs_handicap, is_electric)])[0]
+
+    def release_many(self, spot_ids):
+        """Make occupied spots available again; returns how many were released."""
+        with transaction.atomic():
+            spots = list(
+                ParkingSpot.objects.select_for_update()
+                .filter(pk__in=spot_ids, status='occupied')
+                .values_list('id', 'parking_lot_id', 'is_handicap', 'is_ev_charging')
+            )
+            if not spots:
+                return 0
+            ParkingSpot.objects.filter(pk__in=[spot[0] for spot in spots]).update(
+                status='available', updated_at=timezone.now(),
+            )
+            released = {}
+            for spot_id, lot_id, is_handicap, is_ev_charging in spots:
+                released.setdefault((lot_id, is_handicap, is_ev_charging), []).append(spot_id)
+            for (lot_id, is_handicap, is_ev_charging), ids in released.items():
+                record_transition((lot_id, 'occupied', is_handicap, is_ev_charging),
+                                  (lot_id, 'available', is_handicap, is_ev_charging), len(ids))
+        with self.lock:
+            for (lot_id, is_handicap, is_ev_charging), ids in released.items():
+                if lot_id in self.lots:
+                    self.lots[lot_id][(is_handicap, is_ev_charging)].update(ids)
+        return len(spots)
+
+    def release(self, spot_id):
+        """Make an occupied spot available again; False if it was not occupied."""
+        return self.release_many([spot_id]) == 1
+
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+def get_allocator():
+    global _allocator
+    if _allocator is None:
+        with _allocator_lock:
+            if _allocator is None:
+                _allocator = SpotAllocator(
+                    refresh_interval=getattr(settings, 'SPOT_ALLOCATOR_REFRESH_INTERVAL', 30.0),
+                )
+    return _allocator
+
+
+def start_session(vehicle, lot_id, start_time, allocator=None):
+    """
+    Allocate a spot suited to the vehicle and open its session.
+
+    Raises NoFreeSpot when the lot is full, and IntegrityError (after
+    handing the spot back) when the vehicle already has an active session.
+    """
+    allocator = allocator or get_allocator()
+    spot_id = allocator.allocate(lot_id, vehicle.needs_handicap_spot, vehicle.is_electric)
+    if spot_id is None:
+        raise NoFreeSpot(f'No free spot in parking lot {lot_id}')
+    try:
+        with transaction.atomic():
+            return ParkingSession.objects.create(vehicle=vehicle, parking_spot_id=spot_id, start_time=start_time)
+    except IntegrityError:
+        allocator.release(spot_id)
+        raise
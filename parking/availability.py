@@ -0,0 +1,130 @@
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .http_cache import lot_changed
+from .models import ParkingLot, ParkingSpot, SpotStatusCounter
+
+
+def spot_key(spot):
+    return (spot.parking_lot_id, spot.status, spot.is_handicap, spot.is_ev_charging)
+
+
+def adjust_counter(key, delta):
+    lot_id, status, is_handicap, is_ev_charging = key
+    counter, _ = SpotStatusCounter.objects.get_or_create(
+        parking_lot_id=lot_id, status=status, is_handicap=is_handicap, is_ev_charging=is_ev_charging,
+    )
+    SpotStatusCounter.objects.filter(pk=counter.pk).update(count=F('count') + delta)
+    if status == 'available':
+        # Keep the denormalized field on the lot in step with the counters
+        ParkingLot.objects.filter(pk=lot_id).update(
+            available_spots=F('available_spots') + delta, updated_at=timezone.now(),
+        )
+
+
+def record_transition(old_key, new_key, count=1):
+    """
+    Move `count` spots between counters. Keys are (lot_id, status,
+    is_handicap, is_ev_charging); pass None as `old_key` for new spots and as
+    `new_key` for deleted ones.
+    """
+    if old_key == new_key or not count:
+        return
+    with transaction.atomic():
+        if old_key is not None:
+            adjust_counter(old_key, -count)
+        if new_key is not None:
+            adjust_counter(new_key, count)
+    # Allocation moves spots with update(), which sends no signals
+    for lot_id in {key[0] for key in (old_key, new_key) if key is not None}:
+        lot_changed(lot_id)
+
+
+def summarize(counters):
+    """Availability summary for one lot from its SpotStatusCounter rows."""
+    return summarize_rows(
+        (counter.status, counter.is_handicap, counter.is_ev_charging, counter.count) for counter in counters
+    )
+
+
+def summarize_rows(rows):
+    """Availability summary from (status, is_handicap, is_ev_charging, count) tuples."""
+    by_status = {status: 0 for status, _ in ParkingSpot.SPOT_STATUS}
+    available_handicap = available_ev_charging = 0
+    for status, is_handicap, is_ev_charging, count in rows:
+        by_status[status] += count
+        if status == 'available':
+            available_handicap += count if is_handicap else 0
+            available_ev_charging += count if is_ev_charging else 0
+    total = sum(by_status.values())
+    return {
+        'total_spots': total,
+        'available_spots': by_status['available'],
+        'available_handicap': available_handicap,
+        'available_ev_charging': available_ev_charging,
+        'by_status': by_status,
+        'occupancy_rate': (total - by_status['available']) / total * 100 if total else 0.0,
+    }
+
+
+def lot_availability(lot_id):
+    return summarize(SpotStatusCounter.objects.filter(parking_lot_id=lot_id))
+
+
+def with_availability(lots):
+    """Annotate lots with `spot_count` and `available` from their counters, in the same query."""
+    return lots.annotate(
+        spot_count=Coalesce(Sum('status_counters__count'), 0),
+        available=Coalesce(Sum('status_counters__count', filter=Q(status_counters__status='available')), 0),
+    )
+
+
+def reconcile(lot_ids=None):
+    """
+    Rebuild counters and ParkingLot.available_spots from the spots table.
+
+    Returns {lot_id: {status: (stored, actual)}} for every count that had drifted.
+    """
+    spots = ParkingSpot.objects.all()
+    counters = SpotStatusCounter.objects.all()
+    lots = ParkingLot.objects.all()
+    if lot_ids is not None:
+        spots = spots.filter(parking_lot_id__in=lot_ids)
+        counters = counters.filter(parking_lot_id__in=lot_ids)
+        lots = lots.filter(pk__in=lot_ids)
+
+    actual = {
+        (row['parking_lot_id'], row['status'], row['is_handicap'], row['is_ev_charging']): row['count']
+        for row in spots.values('parking_lot_id', 'status', 'is_handicap', 'is_ev_charging').annotate(count=Count('id'))
+    }
+    drift = {}
+    with transaction.atomic():
+        stored = {
+            (counter.parking_lot_id, counter.status, counter.is_handicap, counter.is_ev_charging): counter
+            for counter in counters.select_for_update()
+        }
+        for key in set(actual) | set(stored):
+            count = actual.get(key, 0)
+            counter = stored.get(key)
+            if counter is None:
+                drift.setdefault(key[0], {})[key[1:]] = (0, count)
+                SpotStatusCounter.objects.create(
+                    parking_lot_id=key[0], status=key[1], is_handicap=key[2], is_ev_charging=key[3], count=count,
+                )
+            elif counter.count != count:
+                drift.setdefault(key[0], {})[key[1:]] = (counter.count, count)
+                counter.count = count
+                counter.save(update_fields=['count'])
+
+        available = {}
+        for (lot_id, status, _, _), count in actual.items():
+            if status == 'available':
+                available[lot_id] = available.get(lot_id, 0) + count
+        for lot in lots.select_for_update():
+            if lot.available_spots != available.get(lot.pk, 0):
+                drift.setdefault(lot.pk, {})['available_spots'] = (lot.available_spots, available.get(lot.pk, 0))
+                lot.available_spots = available.get(lot.pk, 0)
+                lot.save(update_fields=['available_spots', 'updated_at'])
+    return drift
@@ -0,0 +1,103 @@
+import cv2
+import numpy as np
+
+
+def edge_contours(image):
+    """(gray, edged, contours) of a BGR frame: bilateral filter, Canny, flat contour list."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    # Remove noise while keeping edges sharp
+    gray = cv2.bilateralFilter(gray, 11, 17, 17)
+    edged = cv2.Canny(gray, 30, 200)
+    # The hierarchy is not used, so a flat list is enough
+    contours, _ = cv2.findContours(edged, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    return gray, edged, contours
+
+
+def contour_geometry(contours):
+    """
+    Bounding boxes and polygon areas for every contour at once.
+
+    All contour points are concatenated into one array and reduced per contour
+    with np.*.reduceat, instead of calling boundingRect/contourArea in a loop.
+    Returns (boxes, areas) where boxes is an (n, 4) array of x, y, w, h.
+    """
+    lengths = np.fromiter((len(contour) for contour in contours), dtype=np.int64, count=len(contours))
+    points = np.concatenate(contours).reshape(-1, 2).astype(np.int64)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    x, y = points[:, 0], points[:, 1]
+
+    min_x = np.minimum.reduceat(x, starts)
+    min_y = np.minimum.reduceat(y, starts)
+    max_x = np.maximum.reduceat(x, starts)
+    max_y = np.maximum.reduceat(y, starts)
+    boxes = np.stack([min_x, min_y, max_x - min_x + 1, max_y - min_y + 1], axis=1)
+
+    # Shoelace formula, with each contour's last point wrapping to its first
+    following = np.arange(1, len(points) + 1)
+    following[starts + lengths - 1] = starts
+    cross = x * y[following] - x[following] * y
+    areas = np.abs(np.add.reduceat(cross, starts)) / 2.0
+    return boxes, areas
+
+
+def box_sums(integral, boxes):
+    x, y, w, h = boxes.T
+    return integral[y + h, x + w] - integral[y, x + w] - integral[y + h, x] + integral[y, x]
+
+
+def box_iou(box, boxes):
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[0] + box[2], boxes[:, 0] + boxes[:, 2])
+    y2 = np.minimum(box[1] + box[3], boxes[:, 1] + boxes[:, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    union = box[2] * box[3] + boxes[:, 2] * boxes[:, 3] - intersection
+    return intersection / np.maximum(union, 1)
+
+
+def score_plate_candidates(edged, contours, top_k=3, aspect_range=(1.0, 6.0), area_range=(0.0005, 0.2),
+                           min_fill=0.5, density_range=(0.05, 0.6), target_density=0.2, max_overlap=0.5):
+    """
+    Rank contours by how plate-like their bounding boxes are.
+
+    Candidates are filtered on aspect ratio, share of the frame area, fill
+    ratio (contour area / box area) and Canny edge density inside the box,
+    then scored by fill ratio times edge density. Near-duplicate boxes, such
+    as the inner and outer outline of the same plate, are suppressed.
+    Returns up to `top_k` (x, y, w, h) boxes, best first.
+    """
+    if not len(contours):
+        return []
+
+    boxes, areas = contour_geometry(contours)
+    widths = boxes[:, 2].astype(np.float64)
+    heights = boxes[:, 3].astype(np.float64)
+    box_areas = widths * heights
+    aspect = widths / heights
+    area_share = box_areas / edged.size
+    fill = areas / box_areas
+    integral = cv2.integral((edged > 0).astype(np.uint8))
+    density = box_sums(integral, boxes) / box_areas
+
+    valid = (
+        (aspect >= aspect_range[0]) & (aspect <= aspect_range[1])
+        & (area_share >= area_range[0]) & (area_share <= area_range[1])
+        & (fill >= min_fill)
+        & (density >= density_range[0]) & (density <= density_range[1])
+    )
+    if not valid.any():
+        return []
+
+    scores = fill * np.clip(density / target_density, 0.0, 1.0)
+    candidates = np.flatnonzero(valid)
+    candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+
+    selected = []
+    for index in candidates:
+        box = boxes[index]
+        if selected and box_iou(box, boxes[selected]).max() > max_overlap:
+            continue
+        selected.append(index)
+        if len(selected) == top_k:
+            break
+    return [tuple(int(v) for v in boxes[index]) for index in selected]
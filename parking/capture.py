@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+from django.conf import settings
+
+
+def camera_stream_url(camera):
+    # ALPR_CAMERA_SOURCES lets a camera replay a local file instead of RTSP
+    sources = getattr(settings, 'ALPR_CAMERA_SOURCES', {})
+    return sources.get(camera.pk) or f'rtsp://{camera.ip_address}:{camera.port}'
+
+
+class FrameRingBuffer:
+    """Bounded frame buffer that drops the oldest frame when full."""
+
+    def __init__(self, maxlen=8):
+        self.frames = deque(maxlen=maxlen)
+        self.dropped = 0
+        self.condition = threading.Condition()
+
+    def __len__(self):
+        with self.condition:
+            return len(self.frames)
+
+    def put(self, frame, timestamp=None):
+        with self.condition:
+            if len(self.frames) == self.frames.maxlen:
+                self.dropped += 1
+            self.frames.append((timestamp or time.time(), frame))
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        # Returns the oldest buffered (timestamp, frame) pair, or (None, None)
+        with self.condition:
+            if not self.frames:
+                self.condition.wait(timeout)
+            if not self.frames:
+                return None, None
+            return self.frames.popleft()
+
+    def latest(self):
+        with self.condition:
+            if not self.frames:
+                return None, None
+            return self.frames[-1]
+
+    def clear(self):
+        with self.condition:
+            self.frames.clear()
+
+
+class SyntheticFrameSource:
+    """VideoCapture-like source replaying in-memory frames, for tests and benchmarks."""
+
+    def __init__(self, frames, fps=None, loop=False):
+        self.frames = list(frames)
+        self.fps = fps
+        self.loop = loop
+        self.position = 0
+        self.opened = True
+
+    def isOpened(self):
+        return self.opened
+
+    def read(self):
+        if not self.opened:
+            return False, None
+        if self.position >= len(self.frames):
+            if not self.loop or not self.frames:
+                return False, None
+            self.position = 0
+        if self.fps:
+            time.sleep(1.0 / self.fps)
+        frame = self.frames[self.position]
+        self.position += 1
+        return True, frame
+
+    def release(self):
+        self.opened = False
+
+
+class CaptureWorker(threading.Thread):
+    """
+    Keeps one stream open per camera and decodes frames on its own thread.
+
+    `source` is an RTSP URL, a local video file path, or a callable returning
+    a VideoCapture-like object (isOpened/read/release). The stream is reopened
+    with exponential backoff whenever it fails or reaches the end.
+    """
+
+    def __init__(self, source, buffer_size=8, min_backoff=0.5, max_backoff=30.0, name=None):
+        super().__init__(name=name or f'capture-{source}', daemon=True)
+        self.source = source
+        self.buffer = FrameRingBuffer(buffer_size)
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.frames_read = 0
+        self.reconnects = 0
+        self.connected = False
+        self._stop_event = threading.Event()
+
+    def open(self):
+        if callable(self.source):
+            return self.source()
+        return cv2.VideoCapture(self.source)
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    @property
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def run(self):
+        backoff = self.min_backoff
+        while not self._stop_event.is_set():
+            cap = self.open()
+            try:
+                if cap is None or not cap.isOpened():
+                    raise ConnectionError(f'Could not open stream {self.source}')
+                self.connected = True
+                backoff = self.min_backoff
+                while not self._stop_event.is_set():
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    self.frames_read += 1
+                    self.buffer.put(frame)
+            except ConnectionError as e:
+                print(str(e))
+            finally:
+                self.connected = False
+                if cap is not None:
+                    cap.release()
+
+            if self._stop_event.is_set():
+                break
+            self.reconnects += 1
+            self._stop_event.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def read(self, timeout=None):
+        return self.buffer.get(timeout)
+
+
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+def get_capture_worker(camera, source=None, buffer_size=None):
+    """Return the running capture worker for a camera, starting it on first use."""
+    if buffer_size is None:
+        buffer_size = getattr(settings, 'ALPR_CAPTURE_BUFFER_SIZE', 8)
+    with _workers_lock:
+        worker = _workers.get(camera.pk)
+        if worker is None or not worker.is_alive():
+            worker = CaptureWorker(
+                source or camera_stream_url(camera),
+                buffer_size=buffer_size,
+                max_backoff=getattr(settings, 'ALPR_CAPTURE_MAX_BACKOFF', 30.0),
+                name=f'capture-{camera.pk}',
+            )
+            worker.start()
+            _workers[camera.pk] = worker
+        return worker
+
+
+def stop_capture_workers(timeout=5.0):
+    with _workers_lock:
+        workers = list(_workers.values())
+        _workers.clear()
+    for worker in workers:
+        worker.stop(timeout)
@@ -0,0 +1,99 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Avg, DecimalField, F, Func, IntegerField, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import ParkingAnalytics, ParkingSession, Reservation, Vehicle
+
+GLOBAL = 'global'
+
+
+def version_key(scope):
+    return f'dashboard-version:{scope}'
+
+
+def bump_version(scope):
+    try:
+        cache.incr(version_key(scope))
+    except ValueError:
+        cache.set(version_key(scope), 1, None)
+
+
+def cached(scope, build):
+    """
+    Return build() cached under the current version of `scope`; bumping the version invalidates it.
+
+    Versions live in the cache, so writes from other processes only invalidate
+    when CACHES is shared (CACHE_URL); otherwise entries can be stale for up to
+    DASHBOARD_CACHE_TIMEOUT seconds.
+    """
+    version = cache.get(version_key(scope), 0)
+    key = f'dashboard:{scope}:{version}'
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300))
+    return value
+
+
+def subquery_total(queryset, function, field, output_field):
+    # COUNT/SUM as a scalar subquery, so several totals share one SELECT
+    return Subquery(
+        queryset.order_by().annotate(total=Func(F(field), function=function)).values('total'),
+        output_field=output_field,
+    )
+
+
+def user_summary(user):
+    now = timezone.now()
+    totals = User.objects.filter(pk=user.pk).values(
+        active_sessions_count=subquery_total(
+            ParkingSession.objects.filter(vehicle__user=OuterRef('pk'), status='active'), 'COUNT', 'pk', IntegerField()
+        ),
+        upcoming_reservations_count=subquery_total(
+            Reservation.objects.filter(user=OuterRef('pk'), start_time__gte=now, status='confirmed'),
+            'COUNT', 'pk', IntegerField(),
+        ),
+        vehicles_count=subquery_total(Vehicle.objects.filter(user=OuterRef('pk')), 'COUNT', 'pk', IntegerField()),
+        total_spent=subquery_total(
+            ParkingSession.objects.filter(vehicle__user=OuterRef('pk'), status='completed'),
+            'SUM', 'fee', DecimalField(max_digits=10, decimal_places=2),
+        ),
+    ).get()
+    totals['total_spent'] = totals['total_spent'] or 0
+
+    totals['recent_sessions'] = list(
+        ParkingSession.objects.filter(vehicle__user=user)
+        .select_related('vehicle', 'parking_spot__parking_lot')
+        .order_by('-start_time')[:5]
+    )
+    totals['upcoming_reservations'] = list(
+        Reservation.objects.filter(user=user, start_time__gte=now, status='confirmed')
+        .select_related('vehicle', 'parking_spot__parking_lot')
+        .order_by('start_time')[:5]
+    )
+    return totals
+
+
+def occupancy_chart(days=7):
+    """Average occupancy across all lots for each of the last `days` days, as (labels, values)."""
+    today = timezone.now().date()
+    dates = [today - timedelta(days=i) for i in range(days - 1, -1, -1)]
+    averages = dict(
+        ParkingAnalytics.objects.filter(date__range=(dates[0], today))
+        .values('date')
+        .annotate(avg_occupancy=Avg('average_occupancy'))
+        .values_list('date', 'avg_occupancy')
+    )
+    return [date.strftime('%Y-%m-%d') for date in dates], [float(averages.get(date) or 0) for date in dates]
+
+
+def dashboard_context(user):
+    context = dict(cached(f'user:{user.pk}', lambda: user_summary(user)))
+    chart_labels, chart_data = cached(GLOBAL, occupancy_chart)
+    context['chart_labels'] = chart_labels
+    context['chart_data'] = chart_data
+    return context
@@ -0,0 +1,109 @@
+import csv
+import json
+
+from asgiref.sync import sync_to_async
+from django.db import models
+
+from .models import LicensePlateLog, ParkingAnalytics, ParkingSession
+
+EXPORTS = {
+    'sessions': {
+        'model': ParkingSession,
+        'date_field': 'start_time',
+        'fields': (
+            'id', 'vehicle__license_plate', 'parking_spot__parking_lot_id', 'parking_spot__spot_number',
+            'start_time', 'end_time', 'status', 'fee',
+        ),
+    },
+    'logs': {
+        'model': LicensePlateLog,
+        'date_field': 'timestamp',
+        'fields': ('id', 'camera_id', 'camera__parking_lot_id', 'license_plate', 'log_type', 'confidence',
+                   'image', 'timestamp', 'processed'),
+    },
+    'analytics': {
+        'model': ParkingAnalytics,
+        'date_field': 'date',
+        'fields': ('id', 'parking_lot_id', 'date', 'total_vehicles', 'peak_hour_occupancy', 'average_occupancy',
+                   'revenue'),
+    },
+}
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def export_rows(dataset, since=None, until=None, chunk_size=2000):
+    """
+    Return (header, rows) for a dataset, where rows is a lazy tuple iterator
+    fetched `chunk_size` rows at a time (server-side cursors on PostgreSQL).
+    `since`/`until` are inclusive dates.
+    """
+    export = EXPORTS[dataset]
+    queryset = export['model'].objects.all()
+    date_field = export['date_field']
+    if isinstance(export['model']._meta.get_field(date_field), models.DateTimeField):
+        date_field += '__date'
+    if since:
+        queryset = queryset.filter(**{f'{date_field}__gte': since})
+    if until:
+        queryset = queryset.filter(**{f'{date_field}__lte': until})
+    rows = queryset.order_by('pk').values_list(*export['fields']).iterator(chunk_size=chunk_size)
+    return export['fields'], rows
+
+
+class Echo:
+    """File-like object whose write() just hands the line back to csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def csv_stream(header, rows, rows_per_chunk=500):
+    # Group lines so the response is not flushed once per row
+    writer = csv.writer(Echo())
+    chunk = [writer.writerow(header)]
+    for row in rows:
+        chunk.append(writer.writerow(row))
+        if len(chunk) >= rows_per_chunk:
+            yield ''.join(chunk).encode()
+            chunk = []
+    if chunk:
+        yield ''.join(chunk).encode()
+
+
+def ndjson_stream(header, rows, rows_per_chunk=500):
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps(dict(zip(header, row)), default=str))
+        if len(chunk) >= rows_per_chunk:
+            yield ('\n'.join(chunk) + '\n').encode()
+            chunk = []
+    if chunk:
+        yield ('\n'.join(chunk) + '\n').encode()
+
+
+async def async_stream(chunks):
+    """
+    Async iterator over a sync chunk generator, for StreamingHttpResponse under
+    ASGI. Each chunk is produced in the thread that owns the DB connection, so
+    the queryset iterator keeps its cursor and rows are never buffered up front.
+    """
+    chunks = iter(chunks)
+    try:
+        while True:
+            chunk = await sync_to_async(next)(chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        # Also runs when the client goes away, so the server-side cursor is released
+        await sync_to_async(chunks.close)()
+
+
+STREAMS = {
+    'csv': csv_stream,
+    'ndjson': ndjson_stream,
+}
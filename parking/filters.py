@@ -0,0 +1,64 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import models
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+BOOLEAN_VALUES = {'true': True, '1': True, 'yes': True, 'false': False, '0': False, 'no': False}
+
+
+def lookup_field(model, lookup):
+    # Follow a 'parking_spot__parking_lot' style lookup to its final model field
+    field = None
+    for name in lookup.split('__'):
+        field = model._meta.get_field(name)
+        model = field.related_model
+    return field
+
+
+class QueryParamFilterBackend(BaseFilterBackend):
+    """
+    Server-side filters declared on the view.
+
+    `filter_fields` maps a query parameter to an ORM lookup; comma-separated
+    values become an __in filter and boolean fields accept true/false.
+    `date_field` enables ?since= and ?until= (inclusive) on that column,
+    taking dates or ISO datetimes.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        for param, lookup in getattr(view, 'filter_fields', {}).items():
+            value = params.get(param)
+            if not value:
+                continue
+            if isinstance(lookup_field(queryset.model, lookup), models.BooleanField):
+                if value.lower() not in BOOLEAN_VALUES:
+                    raise ValidationError({param: 'Expected true or false.'})
+                queryset = queryset.filter(**{lookup: BOOLEAN_VALUES[value.lower()]})
+                continue
+            try:
+                if ',' in value:
+                    queryset = queryset.filter(**{f'{lookup}__in': value.split(',')})
+                else:
+                    queryset = queryset.filter(**{lookup: value})
+            except (ValueError, DjangoValidationError):
+                raise ValidationError({param: f'Invalid value {value!r}.'})
+
+        date_field = getattr(view, 'date_field', None)
+        if date_field:
+            is_datetime = isinstance(lookup_field(queryset.model, date_field), models.DateTimeField)
+            for param, operator in (('since', 'gte'), ('until', 'lte')):
+                value = params.get(param)
+                if not value:
+                    continue
+                try:
+                    parsed = parse_datetime(value) if 'T' in value or ' ' in value else parse_date(value)
+                except ValueError:
+                    # Well formed but not a real date, e.g. 2024-02-30 or 25:00
+                    parsed = None
+                if parsed is None:
+                    raise ValidationError({param: 'Expected a date (YYYY-MM-DD) or ISO datetime.'})
+                lookup = f'{date_field}__date' if is_datetime and not hasattr(parsed, 'hour') else date_field
+                queryset = queryset.filter(**{f'{lookup}__{operator}': parsed})
+        return queryset
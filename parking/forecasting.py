@@ -0,0 +1,271 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import ParkingAnalytics
+
+# numpy, pandas, scikit-learn and joblib are imported inside the functions that
+# use them, so web workers that never predict do not load them
+
+GLOBAL_MODEL = 'global'
+
+
+def date_features(dates):
+    import numpy as np
+    import pandas as pd
+    dates = pd.to_datetime(pd.Series(dates))
+    return np.column_stack([dates.dt.dayofweek, dates.dt.month])
+
+
+def lot_date_features(lot_ids, dates):
+    """Feature rows for every (lot, date) pair, lot-major, with the lot id as the first column."""
+    import numpy as np
+    per_date = date_features(dates)
+    return np.column_stack([
+        np.repeat(np.asarray(lot_ids), len(per_date)),
+        np.tile(per_date, (len(lot_ids), 1)),
+    ])
+
+
+def fit_occupancy_model(features, occupancy):
+    from sklearn.ensemble import RandomForestRegressor
+    model = RandomForestRegressor(n_estimators=100)
+    model.fit(features, occupancy)
+    return model
+
+
+def train_lot_model(lot_id):
+    """Fit the occupancy model for one lot, or return None without history."""
+    import numpy as np
+    rows = list(ParkingAnalytics.objects.filter(parking_lot_id=lot_id).values_list('date', 'average_occupancy'))
+    if not rows:
+        return None
+    dates, occupancy = zip(*rows)
+    return fit_occupancy_model(date_features(dates), np.array(occupancy))
+
+
+def train_global_model():
+    """Fit one model over every lot's history with the lot id as a feature."""
+    import numpy as np
+    rows = list(ParkingAnalytics.objects.values_list('parking_lot_id', 'date', 'average_occupancy'))
+    if not rows:
+        return None
+    lot_ids, dates, occupancy = zip(*rows)
+    features = np.column_stack([np.array(lot_ids), date_features(dates)])
+    return {'model': fit_occupancy_model(features, np.array(occupancy)), 'lot_ids': set(lot_ids)}
+
+
+class OccupancyModelRegistry:
+    """
+    Trained occupancy models keyed by parking lot, plus one GLOBAL_MODEL
+    covering every lot.
+
+    Models are persisted to `model_dir` by train(), normally from the
+    train_occupancy_models command on a schedule, and kept in an LRU of at
+    most `max_models` entries. A request only trains when no persisted model
+    exists yet. In-memory copies are tied to the file's mtime, so every
+    worker picks up a retrained model on its next use without a shared
+    cache. Writing analytics rows calls invalidate(), which only marks the
+    model stale; the old one is served until `train_occupancy_models --stale`
+    replaces it.
+    """
+
+    def __init__(self, model_dir, max_models=128):
+        self.model_dir = model_dir
+        self.max_models = max_models
+        self.models = OrderedDict()
+        self.lock = threading.Lock()
+        self.training = set()
+
+    def model_path(self, lot_id):
+        return os.path.join(self.model_dir, f'lot_{lot_id}.joblib')
+
+    def stale_path(self, lot_id):
+        return os.path.join(self.model_dir, f'lot_{lot_id}.stale')
+
+    def model_version(self, lot_id):
+        # The persisted file's mtime; None until the model was trained
+        try:
+            return os.stat(self.model_path(lot_id)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def get(self, lot_id, train=True, remember=True):
+        """
+        The lot's model entry, loading or (with `train`) fitting it when needed.
+        Without `train` a missing model is fitted on a background thread and
+        None returned. Without `remember` a loaded model is not added to the
+        LRU, so one large request does not evict every other lot's model.
+        """
+        version = self.model_version(lot_id)
+        with self.lock:
+            entry = self.models.get(lot_id)
+            if entry is not None and entry['version'] == version:
+                self.models.move_to_end(lot_id)
+                return entry
+
+        model = self.load(lot_id) if version is not None else None
+        if model is None:
+            if not train:
+                # Marked too, so `train_occupancy_models --stale` fits it if this process goes away first
+                self.mark_stale(lot_id)
+                self.train_in_background(lot_id)
+                return None
+            model = self.train(lot_id)
+            if model is None:
+                return None
+            version = self.model_version(lot_id)
+        if not remember:
+            return {'model': model, 'version': version, 'predictions': {}}
+        return self.remember(lot_id, model, version)
+
+    def remember(self, lot_id, model, version):
+        entry = {'model': model, 'version': version, 'predictions': {}}
+        with self.lock:
+            self.models[lot_id] = entry
+            self.models.move_to_end(lot_id)
+            while len(self.models) > self.max_models:
+                self.models.popitem(last=False)
+        return entry
+
+    def load(self, lot_id):
+        import joblib
+        try:
+            return joblib.load(self.model_path(lot_id))
+        except (FileNotFoundError, EOFError):
+            return None
+
+    def save(self, lot_id, model):
+        import joblib
+        os.makedirs(self.model_dir, exist_ok=True)
+        path = self.model_path(lot_id)
+        joblib.dump(model, path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+    def train(self, lot_id):
+        # Cleared first, so analytics written while fitting mark the new model stale again
+        try:
+            os.remove(self.stale_path(lot_id))
+        except FileNotFoundError:
+            pass
+        model = train_global_model() if lot_id == GLOBAL_MODEL else train_lot_model(lot_id)
+        if model is not None:
+            self.save(lot_id, model)
+        return model
+
+    def train_in_background(self, lot_id):
+        with self.lock:
+            if lot_id in self.training:
+                return
+            self.training.add(lot_id)
+
+        def run():
+            try:
+                self.train(lot_id)
+            except Exception as e:
+                print(f"Error training occupancy model for lot {lot_id}: {str(e)}")
+            finally:
+                with self.lock:
+                    self.training.discard(lot_id)
+                connection.close()
+
+        threading.Thread(target=run, name=f'train-occupancy-{lot_id}', daemon=True).start()
+
+    def mark_stale(self, lot_id):
+        os.makedirs(self.model_dir, exist_ok=True)
+        open(self.stale_path(lot_id), 'a').close()
+
+    def invalidate(self, lot_id):
+        # New history for any lot also makes the global model stale
+        for key in (lot_id, GLOBAL_MODEL):
+            self.mark_stale(key)
+
+    def stale_models(self):
+        """Lot ids (and GLOBAL_MODEL) marked stale by invalidate() since their last training."""
+        try:
+            names = os.listdir(self.model_dir)
+        except FileNotFoundError:
+            return []
+        keys = [name[len('lot_'):-len('.stale')] for name in names if name.startswith('lot_') and name.endswith('.stale')]
+        return [key if key == GLOBAL_MODEL else int(key) for key in keys]
+
+    def predict(self, lot_id, date):
+        # Called from requests, so a missing model is only queued for training, never fitted here
+        entry = self.get(lot_id, train=False)
+        if entry is None:
+            return None
+        predictions = entry['predictions']
+        if date not in predictions:
+            predictions[date] = float(entry['model'].predict(date_features([date]))[0])
+        return predictions[date]
+
+    def predict_next_day(self, lot_id):
+        next_day = timezone.now().date() + timedelta(days=1)
+        return next_day, self.predict(lot_id, next_day)
+
+    def forecast(self, lot_ids, dates, per_lot=False):
+        """
+        Predicted occupancy for many lots over many dates, as {lot_id: [value per date]}.
+
+        By default the global model scores every (lot, date) row in a single
+        predict call. With `per_lot` each lot's own model predicts all of its
+        dates in one call. Nothing is fitted on this path: lots without
+        history, or whose model is still training in the background, are left
+        out.
+        """
+        if per_lot:
+            forecasts = {}
+            features = date_features(dates)
+            # More lots than the LRU holds would evict every model on each call
+            remember = len(lot_ids) <= self.max_models
+            with_history = set(
+                ParkingAnalytics.objects.filter(parking_lot_id__in=lot_ids).values_list('parking_lot_id', flat=True)
+                .distinct()
+            )
+            for lot_id in lot_ids:
+                if lot_id not in with_history:
+                    continue
+                entry = self.get(lot_id, train=False, remember=remember)
+                if entry is not None:
+                    forecasts[lot_id] = entry['model'].predict(features).tolist()
+            return forecasts
+
+        entry = self.get(GLOBAL_MODEL, train=False)
+        if entry is None:
+            return {}
+        lot_ids = [lot_id for lot_id in lot_ids if lot_id in entry['model']['lot_ids']]
+        if not lot_ids:
+            return {}
+        predictions = entry['model']['model'].predict(lot_date_features(lot_ids, dates))
+        return dict(zip(lot_ids, predictions.reshape(len(lot_ids), len(dates)).tolist()))
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry():
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = OccupancyModelRegistry(
+                    getattr(settings, 'OCCUPANCY_MODEL_DIR', os.path.join(settings.BASE_DIR, 'ml_models')),
+                    max_models=getattr(settings, 'OCCUPANCY_MODEL_CACHE_SIZE', 128),
+                )
+    return _registry
+
+
+@receiver(setting_changed)
+def reset_model_registry(setting, **kwargs):
+    # Lets override_settings point the registry somewhere else, e.g. a temporary directory in tests
+    global _registry
+    if setting in ('OCCUPANCY_MODEL_DIR', 'OCCUPANCY_MODEL_CACHE_SIZE'):
+        _registry = None
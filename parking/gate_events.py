@@ -0,0 +1,225 @@
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .allocation import get_allocator
+from .dashboard import bump_version
+from .models import Camera, LicensePlateLog, ParkingSession, Vehicle
+from .plates import get_plate_index, normalize_plate
+
+LOG_TYPES = {log_type for log_type, _ in LicensePlateLog.LOG_TYPE}
+
+
+def session_fee(start_time, end_time):
+    # $2 per hour, as for sessions closed by the recognition service
+    return round((end_time - start_time).total_seconds() / 3600 * 2, 2)
+
+
+def clean_event(event):
+    """Return (fields, errors) for one posted event."""
+    if not isinstance(event, dict):
+        return None, {'non_field_errors': 'Each event must be an object'}
+    errors = {}
+    key = event.get('idempotency_key')
+    if not isinstance(key, str) or not 0 < len(key) <= 64:
+        errors['idempotency_key'] = 'Required, at most 64 characters'
+    camera = event.get('camera')
+    if not isinstance(camera, int) or isinstance(camera, bool):
+        errors['camera'] = 'Must be a camera id'
+    plate = event.get('license_plate')
+    plate = normalize_plate(plate) if isinstance(plate, str) else ''
+    if not 0 < len(plate) <= 20:
+        errors['license_plate'] = 'Required, at most 20 letters and digits'
+    if event.get('log_type') not in LOG_TYPES:
+        errors['log_type'] = 'Must be check_in or check_out'
+    confidence = event.get('confidence', 1.0)
+    if not isinstance(confidence, (int, float)) or isinstance(confidence, bool) or not 0 <= confidence <= 1:
+        errors['confidence'] = 'Must be a number between 0 and 1'
+    timestamp = event.get('timestamp')
+    if timestamp is None:
+        timestamp = timezone.now()
+    else:
+        try:
+            timestamp = parse_datetime(timestamp) if isinstance(timestamp, str) else None
+        except ValueError:
+            timestamp = None
+        if timestamp is None:
+            errors['timestamp'] = 'Must be an ISO datetime'
+        elif timezone.is_naive(timestamp):
+            timestamp = timezone.make_aware(timestamp)
+    if errors:
+        return None, errors
+    return {
+        'idempotency_key': key,
+        'camera_id': camera,
+        'license_plate': plate,
+        'log_type': event['log_type'],
+        'confidence': float(confidence),
+        'timestamp': timestamp,
+    }, None
+
+
+def ingest(events):
+    """
+    Record a batch of gate events and open or close the matching sessions.
+
+    Everything is written in one transaction, with one bulk query per table.
+    Events already recorded under the same (camera, idempotency_key) come back
+    as duplicates and change nothing, so a batch can be re-posted after a
+    network drop. Returns one result dict per event, in order.
+    """
+    try:
+        return _ingest(events)
+    except IntegrityError:
+        # A concurrent post of the same keys, or of a check-in for the same
+        # vehicle, got in first; a second pass sees its rows
+        pass
+    try:
+        return _ingest(events)
+    except IntegrityError:
+        # Lost the race again. The transaction rolled back, so nothing from the
+        # batch was written and the device can post it again as is
+        results, _ = check_events(events)
+        conflict = {'non_field_errors': 'Conflicted with a concurrent post, retry'}
+        for result in results:
+            if result['status'] == 'accepted':
+                result.update(status='rejected', errors=conflict)
+        return results
+
+
+def check_events(events):
+    """(results, cleaned fields) for a batch, with invalid events already rejected."""
+    results = []
+    cleaned = []
+    for event in events:
+        fields, errors = clean_event(event)
+        key = event.get('idempotency_key') if isinstance(event, dict) else None
+        results.append({'idempotency_key': key, 'status': 'rejected', 'errors': errors} if errors else
+                       {'idempotency_key': key, 'status': 'accepted'})
+        cleaned.append(fields)
+    return results, cleaned
+
+
+def _ingest(events):
+    results, cleaned = check_events(events)
+
+    # Everything the batch refers to is looked up with one query per table
+    valid = [index for index, fields in enumerate(cleaned) if fields]
+    lots = dict(Camera.objects.filter(pk__in={cleaned[i]['camera_id'] for i in valid})
+                .values_list('id', 'parking_lot_id'))
+    seen = dict(
+        ((camera_id, key), log_id) for camera_id, key, log_id in LicensePlateLog.objects.filter(
+            camera_id__in=lots, idempotency_key__in={cleaned[i]['idempotency_key'] for i in valid},
+        ).values_list('camera_id', 'idempotency_key', 'id')
+    )
+
+    index = get_plate_index()
+    accepted, first, repeats = [], {}, []
+    for i in valid:
+        fields = cleaned[i]
+        identity = (fields['camera_id'], fields['idempotency_key'])
+        if fields['camera_id'] not in lots:
+            results[i].update(status='rejected', errors={'camera': 'Unknown camera'})
+        elif identity in seen:
+            results[i].update(status='duplicate', log=seen[identity])
+        elif identity in first:
+            # Repeated within the batch; gets the first one's log below
+            results[i]['status'] = 'duplicate'
+            repeats.append((i, first[identity]))
+        else:
+            first[identity] = i
+            match = index.lookup(fields['license_plate'])
+            fields['vehicle_id'] = match.vehicle_id if match else None
+            accepted.append(i)
+
+    vehicles = {
+        vehicle_id: (user_id, (needs_handicap_spot, is_electric))
+        for vehicle_id, user_id, needs_handicap_spot, is_electric in Vehicle.objects.filter(
+            pk__in={cleaned[i]['vehicle_id'] for i in accepted} - {None},
+        ).values_list('id', 'user_id', 'needs_handicap_spot', 'is_electric')
+    }
+
+    with transaction.atomic():
+        # Lock the active sessions this batch may close
+        active = {
+            session.vehicle_id: session
+            for session in ParkingSession.objects.select_for_update().filter(vehicle_id__in=vehicles, status='active')
+        }
+        active_ids = {vehicle_id: session.pk for vehicle_id, session in active.items()}
+
+        # Replay the events in order against the active sessions
+        opened, closed, logs = [], [], []
+        for i in accepted:
+            fields = cleaned[i]
+            vehicle_id = fields['vehicle_id'] if fields['vehicle_id'] in vehicles else None
+            if vehicle_id is None:
+                results[i]['outcome'] = 'unmatched'
+            elif fields['log_type'] == 'check_in':
+                if vehicle_id in active:
+                    results[i]['outcome'] = 'already_active'
+                else:
+                    session = ParkingSession(vehicle_id=vehicle_id, start_time=fields['timestamp'])
+                    active[vehicle_id] = session
+                    opened.append((session, lots[fields['camera_id']], results[i]))
+            else:
+                session = active.pop(vehicle_id, None)
+                if session is None:
+                    results[i]['outcome'] = 'no_active_session'
+                else:
+                    session.end_time = max(fields['timestamp'], session.start_time)
+                    session.status = 'completed'
+                    session.fee = session_fee(session.start_time, session.end_time)
+                    closed.append((session, results[i]))
+            # Unmatched reads stay unprocessed, as with the recognition service
+            logs.append(LicensePlateLog(
+                camera_id=fields['camera_id'], license_plate=fields['license_plate'], log_type=fields['log_type'],
+                confidence=fields['confidence'], timestamp=fields['timestamp'], image='',
+                idempotency_key=fields['idempotency_key'], processed=vehicle_id is not None,
+            ))
+
+        # Spots for the new sessions, one batch per lot
+        allocator = get_allocator()
+        by_lot = {}
+        for session, lot_id, _ in opened:
+            by_lot.setdefault(lot_id, []).append(session)
+        for lot_id, sessions in by_lot.items():
+            spot_ids = allocator.allocate_many(lot_id, [vehicles[session.vehicle_id][1] for session in sessions])
+            for session, spot_id in zip(sessions, spot_ids):
+                session.parking_spot_id = spot_id
+        for session, _, result in opened:
+            if session.parking_spot_id is None:
+                result['outcome'] = 'lot_full'
+        for session, result in closed:
+            if session.pk is None and session.parking_spot_id is None:
+                result['outcome'] = 'no_active_session'
+        opened = [(session, result) for session, _, result in opened if session.parking_spot_id is not None]
+        closed = [(session, result) for session, result in closed if session.parking_spot_id is not None]
+        existing = [session for session, _ in closed if session.pk is not None]
+        # The upsert would insert any id that is not already a row, so only the locked sessions may reach it.
+        # Raised as a conflict, not asserted, so it still holds under python -O and ingest() retries
+        if any(active_ids.get(session.vehicle_id) != session.pk for session in existing):
+            raise IntegrityError('Closing a session that is no longer active')
+
+        for log, i in zip(LicensePlateLog.objects.bulk_create(logs), accepted):
+            results[i]['log'] = log.pk
+        # Sessions opened and closed within the batch are created completed
+        ParkingSession.objects.bulk_create([session for session, _ in opened])
+        # Closed sessions are upserted on their id, which is far cheaper to
+        # build than bulk_update's CASE WHEN per row
+        ParkingSession.objects.bulk_create(
+            existing, update_conflicts=True, unique_fields=['id'],
+            update_fields=['end_time', 'status', 'fee', 'updated_at'],
+        )
+        allocator.release_many([session.parking_spot_id for session, _ in closed])
+
+    for session, result in opened:
+        result.update(outcome='checked_in', session=session.pk, spot=session.parking_spot_id)
+    for session, result in closed:
+        result.update(outcome='checked_out', session=session.pk, spot=session.parking_spot_id, fee=str(session.fee))
+    for i, original in repeats:
+        results[i]['log'] = results[original].get('log')
+
+    # Bulk writes skip the signals that invalidate dashboards
+    for user_id in {vehicles[session.vehicle_id][0] for session, _ in opened + closed}:
+        bump_version(f'user:{user_id}')
+    return results
@@ -0,0 +1,112 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from rest_framework.response import Response
+
+from .models import ParkingLot, ParkingSpot
+
+# Every lot and spot; single lots use lot_scope()
+LOTS = 'lots'
+
+
+def lot_scope(lot_id):
+    return f'lot:{lot_id}'
+
+
+def version_key(scope):
+    return f'http-cache-version:{scope}'
+
+
+def lot_changed(lot_id):
+    """Invalidate validators for one lot and for the lot lists, once the transaction commits."""
+    def bump():
+        for scope in (LOTS, lot_scope(lot_id)):
+            try:
+                cache.incr(version_key(scope))
+            except ValueError:
+                cache.set(version_key(scope), 1, None)
+    transaction.on_commit(bump)
+
+
+def compute_validators(scope):
+    lots, spots = ParkingLot.objects.all(), ParkingSpot.objects.all()
+    if scope != LOTS:
+        lot_id = scope.split(':')[1]
+        if lot_id.isdigit():
+            lots, spots = lots.filter(pk=lot_id), spots.filter(parking_lot_id=lot_id)
+        else:
+            # Not a lot; the view answers 404
+            lots, spots = lots.none(), spots.none()
+    # Counts catch deletions, which leave Max('updated_at') unchanged. There is
+    # no Last-Modified: a whole-second date would miss both of those
+    lot_row = lots.aggregate(count=Count('id'), updated=Max('updated_at'))
+    spot_row = spots.aggregate(count=Count('id'), updated=Max('updated_at'))
+    state = (lot_row['count'], lot_row['updated'], spot_row['count'], spot_row['updated'])
+    return hashlib.md5(repr((scope,) + state).encode()).hexdigest()[:20]
+
+
+def validators(scope):
+    """
+    ETag of the lots and spots in `scope`.
+
+    Kept under the scope's version, which lot and spot writes in this process
+    bump. Writes made by other processes only show up once the entry times out
+    after HTTP_CACHE_VALIDATOR_TIMEOUT seconds, unless the cache is shared.
+    """
+    version = cache.get(version_key(scope), 0)
+    key = f'http-cache-validators:{scope}:{version}'
+    value = cache.get(key)
+    if value is None:
+        value = compute_validators(scope)
+        cache.set(key, value, getattr(settings, 'HTTP_CACHE_VALIDATOR_TIMEOUT', 2.0))
+    return value
+
+
+def with_validators(response, etag):
+    response.headers['ETag'] = quote_etag(etag)
+    # Clients may keep a copy but have to revalidate it on every poll
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def conditional_data(request, scope, build):
+    """
+    DRF Response for build()'s serialized data with an ETag.
+
+    A matching If-None-Match gets a 304 before anything is serialized, and
+    serialized data is cached per URL and ETag. Views must check the object
+    exists first, or a deleted one would keep answering 304.
+    """
+    etag = validators(scope)
+    response = get_conditional_response(request, etag=quote_etag(etag))
+    if response is None:
+        key = f'http-cache-data:{etag}:{hashlib.md5(request.build_absolute_uri().encode()).hexdigest()}'
+        data = cache.get(key)
+        if data is None:
+            data = build()
+            cache.set(key, data, getattr(settings, 'HTTP_CACHE_TIMEOUT', 300))
+        response = Response(data)
+    return with_validators(response, etag)
+
+
+def conditional_page(request, scope, render_page, *extra):
+    """
+    Like conditional_data for template views. Pages also show who is logged
+    in and any flash messages, so the user and `extra` values are part of the
+    tag and pages with pending messages are always rendered.
+    render_page(etag) gets the data ETag for keying template fragments.
+    """
+    etag = validators(scope)
+    page_etag = hashlib.md5(repr((etag, request.user.pk) + extra).encode()).hexdigest()[:20]
+    response = None
+    if not len(get_messages(request)):
+        response = get_conditional_response(request, etag=quote_etag(page_etag))
+    if response is None:
+        response = render_page(etag)
+    return with_validators(response, page_etag)
@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, IntegrityError, connections
+from django.db.models import Count
+from django.utils import timezone
+
+from parking.allocation import NoFreeSpot, SpotAllocator, start_session
+from parking.availability import reconcile
+from parking.models import ParkingLot, ParkingSession, ParkingSpot, Vehicle
+
+
+class Command(BaseCommand):
+    help = 'Run hundreds of parallel check-ins through the spot allocator and check no spot is handed out twice'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--spots', type=int, default=200)
+        parser.add_argument('--check-ins', type=int, default=300, help='Parallel check-ins, one thread each')
+        parser.add_argument('--allocators', type=int, default=4,
+                            help='Independent allocators, standing in for worker processes with their own free sets')
+        parser.add_argument('--repeat', type=float, default=0.1, help='Share of vehicles that check in twice')
+
+    def handle(self, *args, **options):
+        connection = connections['default']
+        directory = tempfile.mkdtemp(prefix='bench-allocation-')
+        if connection.vendor == 'sqlite':
+            # A file rather than the in-memory test database, so threads share it
+            connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'allocation.sqlite3')
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def seed(self, spots, check_ins, repeat):
+        user = User.objects.create(username='bench-allocation')
+        lot = ParkingLot.objects.create(name='Allocation benchmark', total_spots=spots, location='-')
+        # Spot signals keep the counters and available_spots in step
+        for i in range(spots):
+            ParkingSpot.objects.create(parking_lot=lot, spot_number=str(i), is_handicap=i % 10 == 0,
+                                       is_ev_charging=i % 5 == 1)
+        vehicles = Vehicle.objects.bulk_create(
+            Vehicle(user=user, license_plate=f'A{i:07d}', vehicle_type='car', brand='-', model='-', color='-',
+                    needs_handicap_spot=i % 12 == 0, is_electric=i % 4 == 0)
+            for i in range(check_ins - int(check_ins * repeat))
+        )
+        # Some vehicles get a second, simultaneous check-in
+        return lot, vehicles + vehicles[:check_ins - len(vehicles)]
+
+    def run(self, options):
+        lot, vehicles = self.seed(options['spots'], options['check_ins'], options['repeat'])
+        allocators = [SpotAllocator() for _ in range(options['allocators'])]
+        for allocator in allocators:
+            allocator.load(lot.pk)
+
+        outcomes = {'allocated': 0, 'full': 0, 'duplicate': 0, 'error': 0}
+        outcomes_lock = threading.Lock()
+        barrier = threading.Barrier(len(vehicles))
+
+        def worker(index):
+            barrier.wait()
+            try:
+                start_session(vehicles[index], lot.pk, timezone.now(), allocator=allocators[index % len(allocators)])
+                outcome = 'allocated'
+            except NoFreeSpot:
+                outcome = 'full'
+            except IntegrityError:
+                outcome = 'duplicate'
+            except DatabaseError:
+                outcome = 'error'
+            finally:
+                connections['default'].close()
+            with outcomes_lock:
+                outcomes[outcome] += 1
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(vehicles))]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f'{len(vehicles)} parallel check-ins, {options["spots"]} spots, {len(allocators)} allocators: '
+            f'{len(vehicles) / elapsed:.0f} check-ins/s  ' + '  '.join(f'{k} {v}' for k, v in outcomes.items())
+        )
+        self.verify(lot, outcomes)
+
+    def verify(self, lot, outcomes):
+        active = ParkingSession.objects.filter(status='active', parking_spot__parking_lot=lot)
+        problems = []
+        shared = active.values('parking_spot').annotate(sessions=Count('id')).filter(sessions__gt=1)
+        if shared.exists():
+            problems.append(f'{shared.count()} spots hold more than one active session')
+        twice = active.values('vehicle').annotate(sessions=Count('id')).filter(sessions__gt=1)
+        if twice.exists():
+            problems.append(f'{twice.count()} vehicles hold more than one active session')
+        occupied = ParkingSpot.objects.filter(parking_lot=lot, status='occupied').count()
+        if occupied != active.count() or active.count() != outcomes['allocated']:
+            problems.append(f'{occupied} occupied spots, {active.count()} active sessions, '
+                            f'{outcomes["allocated"]} allocations')
+        misplaced = active.filter(parking_spot__is_handicap=True, vehicle__needs_handicap_spot=False).count()
+        if misplaced:
+            problems.append(f'{misplaced} handicap spots given to vehicles that do not need one')
+        drift = reconcile([lot.pk])
+        if drift:
+            problems.append(f'availability counters drifted: {drift}')
+        if problems:
+            raise CommandError('; '.join(problems))
+        self.stdout.write(self.style.SUCCESS('No spot allocated twice; spots and counters agree with sessions'))
@@ -0,0 +1,132 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from parking.models import (
+    Camera, LicensePlateLog, ParkingLot, ParkingSession, ParkingSpot, SpotStatusCounter, Vehicle,
+)
+
+
+class Command(BaseCommand):
+    help = 'Measure check-in writes/sec under concurrent threads for SQLite (stock and tuned) and the default database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 8])
+        parser.add_argument('--events', type=int, default=300, help='Check-ins per thread')
+        parser.add_argument('--profiles', nargs='+', choices=['sqlite-default', 'sqlite-tuned', 'default'],
+                            help='Defaults to both SQLite profiles, plus the default database when it is not SQLite')
+
+    def handle(self, *args, **options):
+        profiles = options['profiles'] or ['sqlite-default', 'sqlite-tuned']
+        if not options['profiles'] and connections['default'].vendor != 'sqlite':
+            profiles.append('default')
+
+        directory = tempfile.mkdtemp(prefix='bench-db-writes-')
+        old_name = None
+        try:
+            for profile in profiles:
+                if profile == 'default':
+                    # Same server and settings, but a throwaway database like the test runner's
+                    old_name = connections['default'].settings_dict['NAME']
+                    connections['default'].creation.create_test_db(verbosity=0, autoclobber=True)
+                alias = self.prepare(profile, directory)
+                for threads in options['threads']:
+                    self.run(profile, alias, threads, options['events'])
+        finally:
+            for alias in list(connections.settings):
+                if alias.startswith('bench-'):
+                    connections[alias].close()
+            if old_name is not None:
+                connections['default'].creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def prepare(self, profile, directory):
+        if profile == 'default':
+            return 'default'
+        alias = f'bench-{profile}'
+        database = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(directory, f'{profile}.sqlite3'),
+            'OPTIONS': dict(settings.SQLITE_OPTIONS) if profile == 'sqlite-tuned' else {},
+        }
+        connections.settings[alias] = connections.configure_settings({'default': database})['default']
+        call_command('migrate', database=alias, verbosity=0)
+        return alias
+
+    def seed(self, alias, threads, events):
+        suffix = time.time_ns()
+        user = User.objects.db_manager(alias).create(username=f'bench-writes-{suffix}')
+        lot = ParkingLot.objects.using(alias).create(
+            name='Write benchmark', total_spots=threads * events, available_spots=threads * events, location='-'
+        )
+        camera = Camera.objects.using(alias).create(
+            name='Write benchmark', location='-', ip_address='127.0.0.1', parking_lot=lot
+        )
+        spots = ParkingSpot.objects.using(alias).bulk_create(
+            ParkingSpot(parking_lot=lot, spot_number=str(i)) for i in range(threads * events)
+        )
+        vehicles = Vehicle.objects.using(alias).bulk_create(
+            Vehicle(user=user, license_plate=f'W{suffix % 10 ** 8}{i}', vehicle_type='car', brand='-', model='-',
+                    color='-')
+            for i in range(threads * events)
+        )
+        SpotStatusCounter.objects.using(alias).bulk_create([
+            SpotStatusCounter(parking_lot=lot, status='available', count=threads * events),
+            SpotStatusCounter(parking_lot=lot, status='occupied', count=0),
+        ])
+        return user, lot, camera, spots, vehicles
+
+    def check_in(self, alias, lot, camera, spot, vehicle):
+        # The writes one processed check-in makes: log, spot flip, live counters and the session
+        with transaction.atomic(using=alias):
+            LicensePlateLog.objects.using(alias).create(
+                camera=camera, license_plate=vehicle.license_plate, log_type='check_in', confidence=0.9,
+                image='license_plates/bench.jpg', processed=True,
+            )
+            ParkingSpot.objects.using(alias).filter(pk=spot.pk).update(status='occupied', updated_at=timezone.now())
+            counters = SpotStatusCounter.objects.using(alias).filter(parking_lot=lot, is_handicap=False,
+                                                                     is_ev_charging=False)
+            counters.filter(status='available').update(count=F('count') - 1)
+            counters.filter(status='occupied').update(count=F('count') + 1)
+            ParkingLot.objects.using(alias).filter(pk=lot.pk).update(available_spots=F('available_spots') - 1)
+            ParkingSession.objects.using(alias).create(vehicle=vehicle, parking_spot=spot, start_time=timezone.now())
+
+    def run(self, profile, alias, threads, events):
+        _, lot, camera, spots, vehicles = self.seed(alias, threads, events)
+        barrier = threading.Barrier(threads)
+        done, errors = [0] * threads, [0] * threads
+
+        def worker(index):
+            barrier.wait()
+            try:
+                for i in range(index * events, (index + 1) * events):
+                    try:
+                        self.check_in(alias, lot, camera, spots[i], vehicles[i])
+                        done[index] += 1
+                    except DatabaseError:
+                        errors[index] += 1
+            finally:
+                connections[alias].close()
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f'{profile:<15} {threads:>3} threads  {sum(done) / elapsed:8.0f} check-ins/s  '
+            f'{sum(errors):>5} failed'
+        )
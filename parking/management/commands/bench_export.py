@@ -0,0 +1,93 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from parking.exports import STREAMS, async_stream, export_rows
+from parking.models import ParkingLot, ParkingSession, ParkingSpot, Vehicle
+
+# One session per minute, so a day holds this many rows
+ROWS_PER_DAY = 24 * 60
+
+
+class Command(BaseCommand):
+    help = 'Measure export throughput and peak memory streaming session rows from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500000)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        connection = connections['default']
+        directory = tempfile.mkdtemp(prefix='bench-export-')
+        if connection.vendor == 'sqlite':
+            # A file like the real database rather than the in-memory test one
+            connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'export.sqlite3')
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.run(options['rows'], options['chunk_size'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def seed(self, rows):
+        user = User.objects.create_user('bench-export', password='-')
+        lot = ParkingLot.objects.create(name='Export benchmark', total_spots=500, location='-')
+        spots = ParkingSpot.objects.bulk_create(ParkingSpot(parking_lot=lot, spot_number=str(i)) for i in range(500))
+        vehicles = Vehicle.objects.bulk_create(
+            Vehicle(user=user, license_plate=f'51A{i:05d}', vehicle_type='car', brand='-', model='-', color='-')
+            for i in range(1000)
+        )
+        started = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=rows // ROWS_PER_DAY + 1)
+        for offset in range(0, rows, 10000):
+            ParkingSession.objects.bulk_create(
+                ParkingSession(vehicle=vehicles[i % len(vehicles)], parking_spot=spots[i % len(spots)],
+                               start_time=started + timedelta(minutes=i), end_time=started + timedelta(minutes=i + 120),
+                               status='completed', fee='4.00')
+                for i in range(offset, min(offset + 10000, rows))
+            )
+        return started.date()
+
+    def run(self, rows, chunk_size):
+        first_day = self.seed(rows)
+        self.stdout.write(f'{rows} sessions, {chunk_size} rows per fetch')
+
+        for export_format, stream in STREAMS.items():
+            started = time.perf_counter()
+            header, data = export_rows('sessions', chunk_size=chunk_size)
+            size = sum(len(chunk) for chunk in stream(header, data))
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{export_format:<7} {rows} rows in {elapsed:.1f}s  {rows / elapsed:.0f} rows/s  '
+                f'{size / 2 ** 20:.1f} MiB out'
+            )
+
+            # tracemalloc slows things down a lot, so peak memory is measured on separate runs;
+            # it should stay flat as the number of days exported grows
+            for days in (rows // ROWS_PER_DAY // 100, rows // ROWS_PER_DAY // 10, rows // ROWS_PER_DAY):
+                tracemalloc.start()
+                header, data = export_rows('sessions', until=first_day + timedelta(days=days), chunk_size=chunk_size)
+                for _ in stream(header, data):
+                    pass
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                self.stdout.write(f'{export_format:<7} peak memory for {days + 1} days: {peak / 2 ** 10:.1f} KiB')
+
+        # The ASGI path: the same generator, each chunk handed over from the DB thread
+        async def consume(chunks):
+            return sum([len(chunk) async for chunk in chunks])
+
+        started = time.perf_counter()
+        header, data = export_rows('sessions', chunk_size=chunk_size)
+        asyncio.run(consume(async_stream(STREAMS['csv'](header, data))))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'csv/asgi {rows} rows in {elapsed:.1f}s  {rows / elapsed:.0f} rows/s')
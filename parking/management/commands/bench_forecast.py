@@ -0,0 +1,60 @@
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from parking.forecasting import date_features, fit_occupancy_model, lot_date_features
+
+
+class Command(BaseCommand):
+    help = 'Compare per-lot and batched global occupancy forecasting on synthetic history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lots', type=int, default=500)
+        parser.add_argument('--history-days', type=int, default=120)
+        parser.add_argument('--horizon', type=int, default=7, help='Days forecast per lot')
+        parser.add_argument('--sample', type=int, default=20,
+                            help='Per-lot models actually fitted; their fit time is extrapolated to --lots')
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        lots, days, horizon = options['lots'], options['history_days'], options['horizon']
+        start = date(2024, 1, 1)
+        history = [start + timedelta(days=i) for i in range(days)]
+        future = [history[-1] + timedelta(days=i + 1) for i in range(horizon)]
+        history_features = date_features(history)
+        future_features = date_features(future)
+        base = rng.uniform(20, 80, lots)
+        occupancy = np.clip(base[:, None] + 10 * np.sin(history_features[:, 0] / 7 * 2 * np.pi) + rng.normal(0, 5, (lots, days)), 0, 100)
+
+        # Previous behaviour: fit a model on every request, one lot at a time
+        sample = min(options['sample'], lots)
+        started = time.perf_counter()
+        models = [fit_occupancy_model(history_features, occupancy[lot]) for lot in range(sample)]
+        per_lot_train = (time.perf_counter() - started) / sample * lots
+        legacy = per_lot_train
+
+        # Cached per-lot models still need one predict call per lot
+        started = time.perf_counter()
+        for lot in range(lots):
+            models[lot % sample].predict(future_features)
+        per_lot_predict = time.perf_counter() - started
+        legacy += per_lot_predict
+
+        lot_ids = np.arange(1, lots + 1)
+        started = time.perf_counter()
+        model = fit_occupancy_model(lot_date_features(lot_ids, history), occupancy.ravel())
+        global_train = time.perf_counter() - started
+        started = time.perf_counter()
+        model.predict(lot_date_features(lot_ids, future))
+        global_predict = time.perf_counter() - started
+
+        self.stdout.write(f'{lots} lots, {days} days of history, {horizon}-day horizon')
+        self.stdout.write(f'  fit per request, per-lot loop  {legacy * 1000:10.1f} ms (extrapolated from {sample} lots)')
+        self.stdout.write(f'  cached per-lot models, loop    {per_lot_predict * 1000:10.1f} ms  (offline training {per_lot_train:.1f} s, extrapolated)')
+        self.stdout.write(f'  global model, one batch        {global_predict * 1000:10.1f} ms  (offline training {global_train:.1f} s)')
+        self.stdout.write(self.style.SUCCESS(
+            f'Batched global forecast is {legacy / global_predict:.0f}x faster than fitting per request '
+            f'and {per_lot_predict / global_predict:.0f}x faster than looping over cached models'
+        ))
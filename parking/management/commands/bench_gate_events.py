@@ -0,0 +1,92 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from parking.availability import reconcile
+from parking.models import Camera, LicensePlateLog, ParkingLot, ParkingSession, ParkingSpot, Vehicle
+
+
+class Command(BaseCommand):
+    help = 'Measure events/sec through POST /api/api/gate-events/bulk/ on one worker, including retried batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vehicles', type=int, default=20000)
+        parser.add_argument('--batch', type=int, default=500, help='Events per request')
+
+    def handle(self, *args, **options):
+        connection = connections['default']
+        directory = tempfile.mkdtemp(prefix='bench-gate-events-')
+        if connection.vendor == 'sqlite':
+            # A file like the real database rather than the in-memory test one
+            connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'gate_events.sqlite3')
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            # The test client's host is 'testserver', which only tests allow by default
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                self.run(options['vehicles'], options['batch'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def run(self, count, batch):
+        user = User.objects.create_user('bench-gate-events', password='-', is_staff=True)
+        lot = ParkingLot.objects.create(name='Gate benchmark', total_spots=count, location='-')
+        camera = Camera.objects.create(name='Gate benchmark', location='-', ip_address='127.0.0.1', parking_lot=lot)
+        ParkingSpot.objects.bulk_create(
+            ParkingSpot(parking_lot=lot, spot_number=str(i), is_ev_charging=i % 5 == 0) for i in range(count)
+        )
+        reconcile([lot.pk])  # bulk_create skips the counter signals
+        plates = [f'{10 + i % 89}A{i:06d}' for i in range(count)]
+        Vehicle.objects.bulk_create(
+            Vehicle(user=user, license_plate=plate, vehicle_type='car', brand='-', model='-', color='-',
+                    is_electric=i % 7 == 0)
+            for i, plate in enumerate(plates)
+        )
+
+        client = Client()
+        client.force_login(user)
+        now = timezone.now().isoformat()
+
+        def events(log_type):
+            return [
+                {'idempotency_key': f'{log_type}-{i}', 'camera': camera.pk, 'license_plate': plate,
+                 'log_type': log_type, 'confidence': 0.9, 'timestamp': now}
+                for i, plate in enumerate(plates)
+            ]
+
+        self.stdout.write(f'{count} vehicles, {batch} events per request')
+        for name, workload in (('check-in', events('check_in')), ('retried check-in', events('check_in')),
+                               ('check-out', events('check_out'))):
+            started = time.perf_counter()
+            statuses = {}
+            for start in range(0, len(workload), batch):
+                response = client.post('/api/api/gate-events/bulk/', json.dumps({'events': workload[start:start + batch]}),
+                                       content_type='application/json')
+                if response.status_code != 200:
+                    raise CommandError(f'{name}: HTTP {response.status_code} {response.content[:200]!r}')
+                for status, value in response.json()['counts'].items():
+                    statuses[status] = statuses.get(status, 0) + value
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{name:<17} {len(workload) / elapsed:8.0f} events/s  {statuses}')
+
+        sessions = ParkingSession.objects.filter(parking_spot__parking_lot=lot)
+        problems = []
+        if sessions.count() != count or sessions.filter(status='active').exists():
+            problems.append(f'{sessions.count()} sessions, {sessions.filter(status="active").count()} still active')
+        if LicensePlateLog.objects.count() != 2 * count:
+            problems.append(f'{LicensePlateLog.objects.count()} plate logs for {2 * count} distinct events')
+        drift = reconcile([lot.pk])
+        if drift:
+            problems.append(f'availability counters drifted: {drift}')
+        if problems:
+            raise CommandError('; '.join(problems))
+        self.stdout.write(self.style.SUCCESS('Every vehicle checked in and out once; retries changed nothing'))
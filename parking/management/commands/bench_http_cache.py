@@ -0,0 +1,78 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+
+from parking.models import ParkingLot, ParkingSpot
+
+
+class Command(BaseCommand):
+    help = 'Compare uncached, server-cached and 304 Not Modified responses of the lot and spot read endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint and mode')
+        parser.add_argument('--lots', type=int, default=20)
+        parser.add_argument('--spots', type=int, default=200, help='Spots per lot')
+
+    def handle(self, *args, **options):
+        connection = connections['default']
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            # The test client's host is 'testserver', which only tests allow by default
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                self.run(options['requests'], options['lots'], options['spots'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run(self, requests, lot_count, spot_count):
+        user = User.objects.create_user('bench-http-cache', password='-')
+        lots = [
+            ParkingLot.objects.create(name=f'Lot {i}', total_spots=spot_count, location='-')
+            for i in range(lot_count)
+        ]
+        for lot in lots:
+            for i in range(spot_count):
+                ParkingSpot.objects.create(parking_lot=lot, spot_number=str(i), is_ev_charging=i % 5 == 0)
+        client = Client()
+        client.force_login(user)
+
+        paths = [
+            '/api/api/parking-lots/',
+            f'/api/api/parking-lots/{lots[0].pk}/',
+            f'/api/api/parking-lots/{lots[0].pk}/availability/',
+            '/api/api/parking-spots/available_spots/',
+        ]
+        self.stdout.write(f'{lot_count} lots of {spot_count} spots, {requests} requests per mode (us/request)')
+        self.stdout.write(f'{"":<45} {"uncached":>9} {"cached":>9} {"304":>9}')
+        etags = {}
+        for path in paths:
+            etag = etags[path] = client.get(path).headers.get('ETag')
+            if etag is None:
+                raise CommandError(f'{path} sent no ETag')
+
+            def measure(before=None, **headers):
+                started = time.perf_counter()
+                for _ in range(requests):
+                    if before:
+                        before()
+                    response = client.get(path, **headers)
+                return (time.perf_counter() - started) / requests * 1e6, response.status_code
+
+            # Clearing drops cached validators and data; the session lives in the database
+            uncached, _ = measure(cache.clear)
+            cached, _ = measure()
+            not_modified, status = measure(HTTP_IF_NONE_MATCH=etag)
+            if status != 304:
+                raise CommandError(f'{path} answered {status} to a matching If-None-Match')
+            self.stdout.write(f'{path:<45} {uncached:9.0f} {cached:9.0f} {not_modified:9.0f}')
+
+        spot = ParkingSpot.objects.filter(parking_lot=lots[0]).first()
+        spot.status = 'maintenance'
+        spot.save()
+        if client.get(paths[1], HTTP_IF_NONE_MATCH=etags[paths[1]]).status_code == 304:
+            raise CommandError('A spot write left the lot ETag unchanged')
+        self.stdout.write(self.style.SUCCESS('A spot write changed the lot ETag'))
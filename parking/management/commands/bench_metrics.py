@@ -0,0 +1,66 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+
+from parking.models import ParkingLot, ParkingSpot
+
+
+class Command(BaseCommand):
+    help = 'Measure the per-request overhead of MetricsMiddleware at different SQL sample rates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per profile and round')
+        parser.add_argument('--rounds', type=int, default=5, help='Profiles are interleaved; the best round counts')
+        parser.add_argument('--path', default='/api/api/parking-spots/?expand=parking_lot',
+                            help='Path requested by a logged-in staff user')
+
+    def handle(self, *args, **options):
+        connection = connections['default']
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            # The test client's host is 'testserver', which only tests allow by default
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                self.run(options['requests'], options['rounds'], options['path'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run(self, requests, rounds, path):
+        user = User.objects.create_user('bench-metrics', password='-', is_staff=True)
+        lot = ParkingLot.objects.create(name='Metrics benchmark', total_spots=50, location='-')
+        for i in range(50):
+            ParkingSpot.objects.create(parking_lot=lot, spot_number=str(i))
+
+        without = [name for name in settings.MIDDLEWARE if name != 'parking.metrics.MetricsMiddleware']
+        profiles = [
+            ('no middleware', {'MIDDLEWARE': without}),
+            ('sample 0.0', {'MIDDLEWARE': ['parking.metrics.MetricsMiddleware'] + without, 'METRICS_SAMPLE_RATE': 0.0}),
+            ('sample 0.1', {'MIDDLEWARE': ['parking.metrics.MetricsMiddleware'] + without, 'METRICS_SAMPLE_RATE': 0.1}),
+            ('sample 1.0', {'MIDDLEWARE': ['parking.metrics.MetricsMiddleware'] + without, 'METRICS_SAMPLE_RATE': 1.0}),
+        ]
+        best = {}
+        for _ in range(rounds):
+            for name, overrides in profiles:
+                with override_settings(**overrides):
+                    # A new client loads the middleware list from the overridden settings
+                    client = Client()
+                    client.force_login(user)
+                    for _ in range(20):
+                        response = client.get(path)
+                    if response.status_code != 200:
+                        # Otherwise error pages would be timed
+                        raise CommandError(f'{path}: HTTP {response.status_code}')
+                    started = time.perf_counter()
+                    for _ in range(requests):
+                        client.get(path)
+                    per_request = (time.perf_counter() - started) / requests * 1e6
+                best[name] = min(best.get(name, per_request), per_request)
+
+        self.stdout.write(f'{path}, best of {rounds} rounds of {requests} requests')
+        baseline = best[profiles[0][0]]
+        for name, _ in profiles:
+            self.stdout.write(f'{name:<14} {best[name]:8.0f} us/request  {best[name] - baseline:+6.0f} us')
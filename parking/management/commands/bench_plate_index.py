@@ -0,0 +1,83 @@
+import random
+import resource
+import string
+import time
+
+from django.core.management.base import BaseCommand
+
+from parking.plates import PlateIndex
+
+# Read errors an OCR engine typically makes, in both directions
+SWAPS = {'0': 'O', 'O': '0', '8': 'B', 'B': '8', '1': 'I', 'I': '1', '5': 'S', 'S': '5', '2': 'Z', 'Z': '2',
+         '6': 'G', 'G': '6', 'D': '0'}
+
+
+def synthetic_plate(rng):
+    # Vietnamese-style plates: province code, series letter(s), 4-5 digits
+    series = rng.choice(string.ascii_uppercase) + rng.choice(['', rng.choice(string.ascii_uppercase + string.digits)])
+    return f'{rng.randint(10, 99)}{series}{rng.randint(0, 99999):0{rng.choice([4, 5])}d}'
+
+
+def confuse(rng, plate):
+    positions = [i for i, c in enumerate(plate) if c in SWAPS]
+    if not positions:
+        return plate
+    i = rng.choice(positions)
+    return plate[:i] + SWAPS[plate[i]] + plate[i + 1:]
+
+
+def typo(rng, plate):
+    i = rng.randrange(len(plate))
+    edit = rng.choice(['substitute', 'insert', 'delete'])
+    if edit == 'substitute':
+        return plate[:i] + rng.choice(string.ascii_uppercase + string.digits) + plate[i + 1:]
+    if edit == 'insert':
+        return plate[:i] + rng.choice(string.digits) + plate[i:]
+    return plate[:i] + plate[i + 1:]
+
+
+class Command(BaseCommand):
+    help = 'Build a PlateIndex over synthetic registered plates and measure lookup speed and match rate'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plates', type=int, default=1000000)
+        parser.add_argument('--queries', type=int, default=20000)
+        parser.add_argument('--max-distance', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        plates = list(dict.fromkeys(synthetic_plate(rng) for _ in range(options['plates'])))
+        registered = set(plates)
+
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        index = PlateIndex(max_distance=options['max_distance'])
+        index.load(enumerate(plates, 1))
+        build = time.perf_counter() - started
+        rss = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024
+        self.stdout.write(f'Indexed {len(index)} plates in {build:.1f}s, ~{rss:.0f} MiB RSS growth')
+
+        samples = rng.sample(range(len(plates)), min(options['queries'], len(plates)))
+        unknown = []
+        while len(unknown) < len(samples):
+            plate = synthetic_plate(rng)
+            if plate not in registered:
+                unknown.append(plate)
+        cases = {
+            'exact read': [(plates[i], i + 1) for i in samples],
+            'one confusable swap': [(confuse(rng, plates[i]), i + 1) for i in samples],
+            'one random edit': [(typo(rng, plates[i]), i + 1) for i in samples],
+            'unregistered plate': [(plate, None) for plate in unknown],
+        }
+
+        self.stdout.write(f'{"":<22} {"us/lookup":>10} {"exact-only":>11} {"index":>8} {"wrong":>7}')
+        for label, reads in cases.items():
+            started = time.perf_counter()
+            matches = [index.lookup(read) for read, _ in reads]
+            elapsed = (time.perf_counter() - started) / len(reads) * 1e6
+            exact_only = sum(read in registered for read, expected in reads if expected) / len(reads)
+            matched = sum(match is not None and match.vehicle_id == expected for match, (_, expected) in zip(matches, reads))
+            wrong = sum(match is not None and match.vehicle_id != expected for match, (_, expected) in zip(matches, reads))
+            self.stdout.write(
+                f'{label:<22} {elapsed:10.1f} {exact_only:11.1%} {matched / len(reads):8.1%} {wrong / len(reads):7.1%}'
+            )
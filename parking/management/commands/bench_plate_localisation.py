@@ -0,0 +1,86 @@
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from parking.candidates import box_iou, edge_contours, score_plate_candidates
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def legacy_boxes(image):
+    # The previous approach: top-10 contours by area, first quadrilateral wins
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    gray = cv2.bilateralFilter(gray, 11, 17, 17)
+    edged = cv2.Canny(gray, 30, 200)
+    contours, _ = cv2.findContours(edged.copy(), cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    contours = sorted(contours, key=cv2.contourArea, reverse=True)[:10]
+    for contour in contours:
+        peri = cv2.arcLength(contour, True)
+        approx = cv2.approxPolyDP(contour, 0.018 * peri, True)
+        if len(approx) == 4:
+            return [cv2.boundingRect(contour)]
+    return []
+
+
+def vectorized_boxes(image):
+    # What LicensePlateRecognition.locate_plates does, without building the OCR engine and writer
+    gray, edged, contours = edge_contours(image)
+    return score_plate_candidates(
+        edged, contours,
+        top_k=getattr(settings, 'ALPR_PLATE_TOP_K', 3),
+        aspect_range=getattr(settings, 'ALPR_PLATE_ASPECT_RANGE', (1.0, 6.0)),
+    )
+
+
+class Command(BaseCommand):
+    help = 'Compare plate localisation precision and ms/frame against the legacy contour loop'
+
+    def add_arguments(self, parser):
+        parser.add_argument('images', help='Folder of sample images')
+        parser.add_argument('--labels', help='JSON file mapping image file name to a list of [x, y, w, h] plate boxes')
+        parser.add_argument('--iou', type=float, default=0.5, help='IoU needed for a box to count as a hit')
+        parser.add_argument('--repeat', type=int, default=3, help='Timing runs per image')
+
+    def handle(self, *args, **options):
+        names = sorted(name for name in os.listdir(options['images']) if name.lower().endswith(IMAGE_EXTENSIONS))
+        if not names:
+            raise CommandError(f"No images found in {options['images']}")
+        labels = {}
+        if options['labels']:
+            with open(options['labels']) as f:
+                labels = json.load(f)
+
+        methods = {
+            'legacy': legacy_boxes,
+            'vectorized': vectorized_boxes,
+        }
+        for method, locate in methods.items():
+            timings = []
+            returned = hits = found = 0
+            for name in names:
+                image = cv2.imread(os.path.join(options['images'], name))
+                if image is None:
+                    continue
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    boxes = locate(image)
+                    timings.append(time.perf_counter() - started)
+
+                truth = np.array(labels.get(name, []), dtype=np.float64).reshape(-1, 4)
+                returned += len(boxes)
+                if len(truth):
+                    matched = [box_iou(np.array(box, dtype=np.float64), truth).max() >= options['iou'] for box in boxes]
+                    hits += sum(matched)
+                    found += any(matched)
+
+            line = (f'{method:<11} {np.mean(timings) * 1000:8.2f} ms/frame  '
+                    f'p95 {np.percentile(timings, 95) * 1000:8.2f} ms  candidates/frame {returned / len(names):.2f}')
+            if labels:
+                precision = hits / returned if returned else 0.0
+                line += f'  precision {precision:.3f}  images with plate found {found}/{len(labels)}'
+            self.stdout.write(line)
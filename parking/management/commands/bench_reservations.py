@@ -0,0 +1,110 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from parking.models import ParkingLot, ParkingSpot, Reservation, Vehicle
+from parking.reservations import ReservationConflict, book_spot, free_spots, overlapping_reservations
+
+INDEX_NAME = 'reservation_spot_interval'
+
+
+class Command(BaseCommand):
+    help = 'Time interval availability search and booking against synthetic reservations (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reservations', type=int, default=100000)
+        parser.add_argument('--spots', type=int, default=200)
+        parser.add_argument('--days', type=int, default=365, help='Period the reservations are spread over')
+        parser.add_argument('--queries', type=int, default=50)
+
+    def timed(self, label, func, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            result = func()
+        elapsed = (time.perf_counter() - started) / repeat * 1000
+        self.stdout.write(f'{label:<42} {elapsed:9.2f} ms')
+        return result
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        with transaction.atomic():
+            self.populate(rng, options)
+            lot = self.lot
+            origin = timezone.now() + timedelta(days=1)
+            intervals = []
+            for _ in range(options['queries']):
+                start = origin + timedelta(minutes=rng.randrange(options['days'] * 24 * 60))
+                intervals.append((start, start + timedelta(hours=rng.randint(1, 6))))
+            queries = iter(intervals * 3)
+
+            def set_based():
+                start, end = next(queries)
+                return len(free_spots(start, end, lot))
+
+            def per_spot():
+                # What the old reserve_spot check costs when repeated for every spot
+                start, end = next(queries)
+                return sum(
+                    not overlapping_reservations(start, end).filter(parking_spot_id=spot_id).exists()
+                    for spot_id in self.spot_ids
+                )
+
+            self.stdout.write(f'{options["reservations"]} reservations over {len(self.spot_ids)} spots')
+            start, end = intervals[0]
+            self.stdout.write(free_spots(start, end, lot).explain())
+            free = self.timed('free_spots, one query (indexed)', set_based, options['queries'])
+            legacy = self.timed('one exists() per spot (indexed)', per_spot, options['queries'])
+            self.stdout.write(f'  free spots per interval: {free} vs {legacy}')
+
+            bookings = iter(intervals)
+
+            def book():
+                start, end = next(bookings)
+                spot = ParkingSpot(pk=rng.choice(self.spot_ids), spot_number='')
+                try:
+                    book_spot(self.user, self.vehicle, spot, start, end)
+                except ReservationConflict:
+                    pass
+
+            self.timed('book_spot (indexed)', book, options['queries'])
+
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP INDEX {INDEX_NAME}')
+            self.timed('free_spots, one query (no index)', set_based, options['queries'])
+            transaction.set_rollback(True)
+
+    def populate(self, rng, options):
+        started = time.perf_counter()
+        self.user = User.objects.create(username=f'bench-reservations-{time.time_ns()}')
+        self.vehicle = Vehicle.objects.create(
+            user=self.user, license_plate=f'BENCH{time.time_ns() % 10 ** 9}', vehicle_type='car',
+            brand='Bench', model='Bench', color='Grey',
+        )
+        self.lot = ParkingLot.objects.create(
+            name='Benchmark lot', total_spots=options['spots'], location='-'
+        )
+        spots = ParkingSpot.objects.bulk_create(
+            ParkingSpot(parking_lot=self.lot, spot_number=str(i)) for i in range(options['spots'])
+        )
+        self.spot_ids = [spot.pk for spot in spots]
+
+        origin = timezone.now() + timedelta(days=1)
+        statuses = ['pending', 'confirmed', 'confirmed', 'cancelled', 'completed']
+        reservations = []
+        for _ in range(options['reservations']):
+            start = origin + timedelta(minutes=rng.randrange(options['days'] * 24 * 60))
+            reservations.append(Reservation(
+                user=self.user,
+                vehicle=self.vehicle,
+                parking_spot_id=rng.choice(self.spot_ids),
+                start_time=start,
+                end_time=start + timedelta(hours=rng.randint(1, 8)),
+                status=rng.choice(statuses),
+            ))
+        Reservation.objects.bulk_create(reservations, batch_size=2000)
+        self.stdout.write(f'Populated in {time.perf_counter() - started:.1f}s')
@@ -0,0 +1,74 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Only recognition and forecasting processes should ever load these
+HEAVY_MODULES = ('numpy', 'pandas', 'sklearn', 'scipy', 'joblib', 'cv2', 'easyocr', 'torch', 'torchvision')
+
+# Runs in a fresh interpreter: set Django up and load everything a web worker loads
+WEB_WORKER = '''
+import importlib, json, resource, sys
+import django
+django.setup()
+from django.conf import settings
+from django.urls import get_resolver
+get_resolver().url_patterns
+for application in (settings.WSGI_APPLICATION, getattr(settings, 'ASGI_APPLICATION', None)):
+    if application:
+        importlib.import_module(application.rsplit('.', 1)[0])
+print(json.dumps({
+    'modules': sorted(sys.modules),
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+'''
+
+
+def parse_importtime(stderr):
+    """{top-level package: cumulative microseconds} from `python -X importtime` output."""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name.rstrip()
+        # Only count outermost imports so nested ones are not added twice
+        if name.startswith(' ' * 2):
+            continue
+        package = name.strip().split('.')[0]
+        totals[package] = totals.get(package, 0) + int(cumulative)
+    return totals
+
+
+class Command(BaseCommand):
+    help = 'Import what a web worker imports in a fresh process; fail if heavy ML/vision modules are loaded'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10, help='Slowest top-level imports to list')
+        parser.add_argument('--max-rss', type=float, help='Also fail above this many MiB of RSS')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE))
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', WEB_WORKER],
+            capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+        )
+        if result.returncode:
+            raise CommandError(f'Web worker imports failed:\n{result.stderr[-2000:]}')
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        rss = report['max_rss_kb'] / 1024
+
+        timings = parse_importtime(result.stderr)
+        self.stdout.write(f'Total import time: {sum(timings.values()) / 1e6:.2f}s, RSS after setup: {rss:.1f} MiB')
+        for package, micros in sorted(timings.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f'  {package:<24} {micros / 1000:8.1f} ms')
+
+        loaded = sorted(set(report['modules']) & set(HEAVY_MODULES))
+        if loaded:
+            raise CommandError(f'Heavy modules imported by web workers: {", ".join(loaded)}')
+        if options['max_rss'] and rss > options['max_rss']:
+            raise CommandError(f'Web worker RSS {rss:.1f} MiB is above {options["max_rss"]} MiB')
+        self.stdout.write(self.style.SUCCESS('Web import graph is free of heavy modules'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from parking.query_plans import hot_queries, indexes_used, prefer_indexes, seed
+
+
+class Command(BaseCommand):
+    help = 'Seed data in a rolled-back transaction and fail if hot queries stop using their indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000, help='Rows seeded per table')
+        parser.add_argument('--verbose-plans', action='store_true')
+
+    def handle(self, *args, **options):
+        # The same checks run in parking.tests.QueryPlanTests
+        failures = []
+        with transaction.atomic():
+            prefer_indexes()
+            for label, queryset, indexes in hot_queries(seed(options['rows'])):
+                used, plan = indexes_used(queryset, indexes)
+                self.stdout.write(f'{"ok" if used else "FAIL":<5} {label}: {", ".join(used) or plan}')
+                if options['verbose_plans']:
+                    self.stdout.write(plan)
+                if not used:
+                    failures.append(label)
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(f'{len(failures)} queries no longer use their index: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS('All hot queries use their indexes'))
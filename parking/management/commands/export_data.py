@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from parking.exports import EXPORTS, STREAMS, export_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream sessions, plate logs or analytics to CSV or NDJSON without loading them into memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(STREAMS), default='csv')
+        parser.add_argument('--since', help='First date to include (YYYY-MM-DD)')
+        parser.add_argument('--until', help='Last date to include (YYYY-MM-DD)')
+        parser.add_argument('--output', help='File to write, defaults to stdout')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        dates = {}
+        for name in ('since', 'until'):
+            if options[name]:
+                try:
+                    dates[name] = parse_date(options[name])
+                except ValueError:
+                    dates[name] = None
+                if dates[name] is None:
+                    raise CommandError(f'--{name} must be a date (YYYY-MM-DD)')
+
+        header, rows = export_rows(options['dataset'], chunk_size=options['chunk_size'], **dates)
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in STREAMS[options['format']](header, rows):
+                output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
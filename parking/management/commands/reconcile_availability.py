@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from parking.availability import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Rebuild live availability counters from the spots table and report any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lot', type=int, action='append', dest='lot_ids', help='Only reconcile this lot id (repeatable)')
+
+    def handle(self, *args, **options):
+        drift = reconcile(options['lot_ids'])
+        for lot_id, changes in sorted(drift.items()):
+            for key, (stored, actual) in changes.items():
+                self.stdout.write(f'Lot {lot_id} {key}: {stored} -> {actual}')
+        self.stdout.write(self.style.SUCCESS(f'Reconciled availability, {len(drift)} lots had drifted'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from parking.rollups import run_rollup
+
+
+class Command(BaseCommand):
+    help = 'Roll parking sessions up into daily and hourly ParkingAnalytics rows, only for days whose sessions changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute every day instead of only changed ones')
+        parser.add_argument('--since', help='Recompute every day from this date (YYYY-MM-DD)')
+        parser.add_argument('--lot', type=int, action='append', dest='lot_ids', help='Only roll up this lot id (repeatable)')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = parse_date(options['since'])
+            except ValueError:
+                since = None
+            if since is None:
+                raise CommandError('--since must be a date (YYYY-MM-DD)')
+
+        touched = run_rollup(full=options['full'], since=since, lot_ids=options['lot_ids'])
+        for lot_id, days in sorted(touched.items()):
+            self.stdout.write(f'Lot {lot_id}: {days} days')
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled up {sum(touched.values())} days across {len(touched)} lots'
+        ))
@@ -0,0 +1,154 @@
+import multiprocessing
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from parking.metrics import render_alpr_stats, serve_metrics
+
+# Spawned shards import this module to unpickle run_shard before Django is set
+# up, so models may only be imported inside functions.
+
+
+def run_shard(camera_ids, sources, options, stop_event, stats_queue):
+    # Runs in a spawned child process, so Django has to be set up again
+    import django
+    django.setup()
+    from parking.models import Camera
+    from parking.pipeline import RecognitionPipeline
+
+    # The parent owns Ctrl-C and tells every shard to stop through stop_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+
+    cameras = list(Camera.objects.filter(pk__in=camera_ids).select_related('parking_lot'))
+    pipeline = RecognitionPipeline(
+        cameras,
+        sources=sources,
+        queue_size=options['queue_size'],
+        ocr_workers=options['ocr_workers'],
+        buffer_size=options['buffer_size'],
+    )
+    pipeline.start()
+    try:
+        while not stop_event.wait(options['stats_interval']):
+            stats_queue.put((multiprocessing.current_process().name, pipeline.stats()))
+    finally:
+        pipeline.shutdown()
+        stats_queue.put((multiprocessing.current_process().name, pipeline.stats()))
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Run license plate recognition for every active camera, sharded across worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(),
+                            help='Number of worker processes cameras are sharded across')
+        parser.add_argument('--camera', type=int, action='append', dest='camera_ids',
+                            help='Only run this camera id (repeatable)')
+        parser.add_argument('--clip', help='Replay this video file for every camera instead of its RTSP stream')
+        parser.add_argument('--queue-size', type=int, default=32, help='Capacity of each stage queue')
+        parser.add_argument('--ocr-workers', type=int, default=4, help='OCR threads per process')
+        parser.add_argument('--buffer-size', type=int, default=8, help='Frames buffered per camera')
+        parser.add_argument('--stats-interval', type=float, default=10.0, help='Seconds between stats reports')
+        parser.add_argument('--duration', type=float, help='Stop after this many seconds')
+        parser.add_argument('--metrics-port', type=int,
+                            help='Serve pipeline counters as Prometheus text on this port at /metrics')
+        parser.add_argument('--metrics-host', default='127.0.0.1',
+                            help='Address the metrics server binds; 0.0.0.0 exposes it, so also set METRICS_TOKEN')
+
+    def handle(self, *args, **options):
+        from parking.models import Camera
+
+        cameras = Camera.objects.filter(status='active')
+        if options['camera_ids']:
+            cameras = cameras.filter(pk__in=options['camera_ids'])
+        camera_ids = list(cameras.order_by('pk').values_list('pk', flat=True))
+        if not camera_ids:
+            raise CommandError('No active cameras to run')
+
+        processes = max(1, min(options['processes'], len(camera_ids)))
+        shards = [camera_ids[i::processes] for i in range(processes)]
+        sources = {camera_id: options['clip'] for camera_id in camera_ids} if options['clip'] else {}
+
+        pipeline_options = {
+            key: options[key] for key in ('queue_size', 'ocr_workers', 'buffer_size', 'stats_interval')
+        }
+
+        # Children must not inherit open database connections
+        connections.close_all()
+        context = multiprocessing.get_context('spawn')
+        stop_event = context.Event()
+        stats_queue = context.Queue()
+        workers = [
+            context.Process(
+                target=run_shard,
+                args=(shard, sources, pipeline_options, stop_event, stats_queue),
+                name=f'alpr-{i}',
+            )
+            for i, shard in enumerate(shards)
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f'Running {len(camera_ids)} cameras across {processes} processes')
+
+        started = time.monotonic()
+        latest = {}
+        server = None
+        if options['metrics_port']:
+            # Shards report every --stats-interval seconds; the latest reports are served
+            server = serve_metrics(options['metrics_port'], lambda: render_alpr_stats(dict(latest)),
+                                   host=options['metrics_host'], token=getattr(settings, 'METRICS_TOKEN', ''))
+            self.stdout.write(f"Serving metrics on {options['metrics_host']}:{options['metrics_port']}/metrics")
+        previous_handler = signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+        try:
+            while any(worker.is_alive() for worker in workers):
+                if options['duration'] and time.monotonic() - started >= options['duration']:
+                    stop_event.set()
+                try:
+                    name, stats = stats_queue.get(timeout=1.0)
+                except Exception:
+                    continue
+                latest[name] = stats
+                self.report(name, stats, time.monotonic() - started)
+        except KeyboardInterrupt:
+            self.stdout.write('Shutting down, draining pipelines...')
+            stop_event.set()
+        finally:
+            signal.signal(signal.SIGTERM, previous_handler)
+            if server is not None:
+                server.shutdown()
+            for worker in workers:
+                worker.join()
+            while not stats_queue.empty():
+                name, stats = stats_queue.get()
+                latest[name] = stats
+
+        failed = [worker for worker in workers if worker.exitcode != 0]
+        if len(failed) == len(workers):
+            raise CommandError(f'Every shard exited with an error (exit codes {[w.exitcode for w in failed]})')
+        for worker in failed:
+            self.stderr.write(f'Shard {worker.name} exited with code {worker.exitcode}')
+
+        elapsed = time.monotonic() - started
+        frames = sum(stats['detect']['processed'] for stats in latest.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {frames} frames in {elapsed:.1f}s ({frames / elapsed:.1f} frames/s)'
+        ))
+
+    def report(self, name, stats, elapsed):
+        capture = stats['capture']
+        self.stdout.write(
+            f"[{name} {elapsed:.0f}s] read={capture['frames_read']} dropped={capture['frames_dropped']} "
+            f"reconnects={capture['reconnects']}"
+        )
+        for stage in ('detect', 'ocr', 'persist'):
+            stage_stats = stats[stage]
+            self.stdout.write(
+                f"  {stage:<8} depth={stage_stats['queue_depth']}/{stage_stats['queue_size']} "
+                f"processed={stage_stats['processed']} errors={stage_stats['errors']} "
+                f"avg={stage_stats['avg_ms']:.1f}ms max={stage_stats['max_ms']:.1f}ms"
+            )
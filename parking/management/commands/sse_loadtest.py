@@ -0,0 +1,132 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from parking.models import ParkingSpot
+
+
+class Command(BaseCommand):
+    help = 'Open many availability stream subscribers against a running ASGI server and measure delivery'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Stream URL, e.g. http://127.0.0.1:8000/stream/parking-lots/1/')
+        parser.add_argument('--clients', type=int, default=1000)
+        parser.add_argument('--duration', type=float, default=30.0)
+        parser.add_argument('--ramp', type=float, default=5.0, help='Seconds over which clients connect')
+        parser.add_argument('--flips', type=float, default=2.0,
+                            help='Spot status changes per second made in the streamed lot (0 to disable)')
+        parser.add_argument('--user', required=True, help='Username the clients stream as (the stream needs a login)')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('Only plain http:// stream URLs are supported')
+        lot_id = int(url.path.rstrip('/').rsplit('/', 1)[-1])
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['user']}")
+        # Every client shares one session, created in the database the server reads
+        login = Client()
+        login.force_login(user)
+        self.cookie = f"{settings.SESSION_COOKIE_NAME}={login.cookies[settings.SESSION_COOKIE_NAME].value}"
+        self.stats = {'connected': 0, 'failed': 0, 'snapshot_latency': [], 'deltas': 0, 'delivery_latency': []}
+
+        stop = threading.Event()
+        flipper = threading.Thread(target=self.flip_spots, args=(lot_id, options['flips'], stop), daemon=True)
+        if options['flips']:
+            flipper.start()
+        try:
+            asyncio.run(self.run_clients(url, options))
+        finally:
+            stop.set()
+            if flipper.is_alive():
+                flipper.join()
+
+        stats = self.stats
+        self.stdout.write(f"clients connected {stats['connected']}/{options['clients']}, failed {stats['failed']}")
+        if stats['snapshot_latency']:
+            latency = np.array(stats['snapshot_latency']) * 1000
+            self.stdout.write(f'snapshot latency  p50 {np.percentile(latency, 50):.1f} ms  p95 {np.percentile(latency, 95):.1f} ms')
+        self.stdout.write(f"deltas received {stats['deltas']}")
+        if stats['delivery_latency']:
+            latency = np.array(stats['delivery_latency']) * 1000
+            self.stdout.write(
+                f'delivery latency  p50 {np.percentile(latency, 50):.1f} ms  p95 {np.percentile(latency, 95):.1f} ms  '
+                f'max {latency.max():.1f} ms'
+            )
+
+    async def run_clients(self, url, options):
+        deadline = time.monotonic() + options['ramp'] + options['duration']
+        clients = []
+        for i in range(options['clients']):
+            clients.append(asyncio.create_task(self.client(url, deadline)))
+            if options['ramp']:
+                await asyncio.sleep(options['ramp'] / options['clients'])
+        await asyncio.gather(*clients)
+
+    async def client(self, url, deadline):
+        started = time.monotonic()
+        try:
+            reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+        except OSError:
+            self.stats['failed'] += 1
+            return
+        # HTTP/1.0 keeps the body unchunked, so SSE lines can be read directly
+        writer.write(
+            f'GET {url.path} HTTP/1.0\r\nHost: {url.netloc}\r\nAccept: text/event-stream\r\n'
+            f'Cookie: {self.cookie}\r\n\r\n'.encode()
+        )
+        event = None
+        try:
+            status_line = (await asyncio.wait_for(reader.readline(), max(deadline - time.monotonic(), 0.1))).split()
+            if len(status_line) < 2 or status_line[1] != b'200':
+                self.stats['failed'] += 1
+                return
+            self.stats['connected'] += 1
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                line = await asyncio.wait_for(reader.readline(), remaining)
+                if not line:
+                    break
+                line = line.decode().rstrip('\r\n')
+                if line.startswith('event: '):
+                    event = line[7:]
+                elif line.startswith('data: '):
+                    if event == 'snapshot' and started is not None:
+                        self.stats['snapshot_latency'].append(time.monotonic() - started)
+                        started = None
+                    elif event == 'delta':
+                        self.stats['deltas'] += 1
+                        self.stats['delivery_latency'].append(time.time() - json.loads(line[6:])['sent_at'])
+        except (asyncio.TimeoutError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    def flip_spots(self, lot_id, rate, stop):
+        spots = list(ParkingSpot.objects.filter(parking_lot_id=lot_id).exclude(status='maintenance'))
+        if not spots:
+            return
+        original = {spot.pk: spot.status for spot in spots}
+        try:
+            while not stop.wait(1.0 / rate):
+                spot = random.choice(spots)
+                spot.status = 'occupied' if spot.status == 'available' else 'available'
+                spot.save()
+        finally:
+            for spot in spots:
+                if spot.status != original[spot.pk]:
+                    spot.status = original[spot.pk]
+                    spot.save()
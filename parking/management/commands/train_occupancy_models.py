@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from parking.forecasting import GLOBAL_MODEL, get_model_registry
+from parking.models import ParkingAnalytics
+
+
+class Command(BaseCommand):
+    help = 'Train and persist occupancy models for every lot with analytics history (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lot', type=int, action='append', dest='lot_ids', help='Only train this lot id (repeatable)')
+        parser.add_argument('--stale', action='store_true',
+                            help='Only retrain models whose analytics changed since they were trained')
+
+    def handle(self, *args, **options):
+        registry = get_model_registry()
+        if options['stale']:
+            lot_ids = registry.stale_models()
+        else:
+            lot_ids = options['lot_ids'] or [
+                *ParkingAnalytics.objects.values_list('parking_lot_id', flat=True).distinct(),
+                GLOBAL_MODEL,
+            ]
+        for lot_id in lot_ids:
+            started = time.perf_counter()
+            model = registry.train(lot_id)
+            if model is None:
+                self.stdout.write(f'Lot {lot_id}: no analytics history, skipped')
+                continue
+            self.stdout.write(f'Lot {lot_id}: trained in {(time.perf_counter() - started) * 1000:.0f} ms')
+        self.stdout.write(self.style.SUCCESS(f'Models saved to {registry.model_dir}'))
@@ -0,0 +1,360 @@
+import hmac
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def format_labels(names, values, extra=''):
+    pairs = [
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_value(value):
+    return repr(float(value)) if value != float('inf') else '+Inf'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def render(self):
+        with self.lock:
+            values = sorted(self.values.items())
+        return self.header() + [
+            f'{self.name}{format_labels(self.labels, labels)} {format_value(value)}' for labels, value in values
+        ]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, labels=()):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, labels=()):
+        with self.lock:
+            self.values[labels] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        with self.lock:
+            state = self.values.get(labels)
+            if state is None:
+                # Per-bucket (not cumulative) counts, then sum and count
+                state = self.values[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self):
+        with self.lock:
+            values = sorted((labels, list(state)) for labels, state in self.values.items())
+        lines = self.header()
+        for labels, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                bucket = format_labels(self.labels, labels, 'le="%s"' % bound)
+                lines.append(f'{self.name}_bucket{bucket} {cumulative}')
+            bucket = format_labels(self.labels, labels, 'le="+Inf"')
+            lines.append(f'{self.name}_bucket{bucket} {state[-1]}')
+            lines.append(f'{self.name}_sum{format_labels(self.labels, labels)} {format_value(state[-2])}')
+            lines.append(f'{self.name}_count{format_labels(self.labels, labels)} {state[-1]}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        return '\n'.join(line for metric in self.metrics for line in metric.render()) + '\n'
+
+
+# Metrics of this process. Under several workers each keeps its own, so
+# scrape every worker (or run one) for complete numbers.
+REGISTRY = Registry()
+REQUEST_LATENCY = REGISTRY.add(Histogram(
+    'http_request_duration_seconds', 'Time from middleware entry to response, per view',
+    ('view', 'method', 'status'),
+))
+REQUEST_QUERIES = REGISTRY.add(Histogram(
+    'http_request_queries', 'SQL queries per sampled request', ('view',), QUERY_BUCKETS,
+))
+REQUEST_QUERY_SECONDS = REGISTRY.add(Histogram(
+    'http_request_query_seconds', 'Time spent in SQL per sampled request', ('view',),
+))
+DUPLICATE_QUERIES = REGISTRY.add(Counter(
+    'http_request_duplicate_queries_total', 'Repeats of an identical SQL statement within one sampled request',
+    ('view',),
+))
+N_PLUS_ONE = REGISTRY.add(Counter(
+    'http_requests_n_plus_one_total', 'Sampled requests repeating one SQL statement METRICS_N_PLUS_ONE_THRESHOLD '
+    'times or more', ('view',),
+))
+RENDER_SECONDS = REGISTRY.add(Histogram(
+    'http_response_render_seconds', 'Time rendering template and DRF responses after the view returned', ('view',),
+))
+SERIALIZE_SECONDS = REGISTRY.add(Histogram(
+    'http_response_serialize_seconds', 'Time building serializer .data per request', ('view',),
+))
+SLOW_REQUESTS = REGISTRY.add(Counter(
+    'http_slow_requests_total', 'Requests slower than METRICS_SLOW_REQUEST_SECONDS', ('view',),
+))
+
+
+class QueryRecorder:
+    """execute_wrapper that counts and times every statement by its SQL text."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = {}  # sql -> [executions, seconds]
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            statement = self.statements.get(sql)
+            if statement is None:
+                self.statements[sql] = [1, elapsed]
+            else:
+                statement[0] += 1
+                statement[1] += elapsed
+
+
+@contextmanager
+def timed_serialization(request):
+    """Add the time spent in the block to the request's serialization total, recorded by MetricsMiddleware."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        # Serializers see DRF's Request; the middleware sees the HttpRequest inside it
+        request = getattr(request, '_request', request)
+        if request is not None:
+            request._metrics_serialize_seconds = (
+                getattr(request, '_metrics_serialize_seconds', None) or 0.0
+            ) + time.perf_counter() - started
+
+
+def add_query_recorder(recorder):
+    connection.execute_wrappers.append(recorder)
+
+
+def remove_query_recorder(recorder):
+    connection.execute_wrappers.remove(recorder)
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unresolved'
+
+
+class MetricsMiddleware:
+    """
+    Records latency, SQL, serialization and render time per view into REGISTRY.
+
+    Latency is recorded for every request. SQL is only recorded for a
+    METRICS_SAMPLE_RATE share of them, through a connection execute_wrapper.
+    Requests over METRICS_SLOW_REQUEST_SECONDS are logged, with their most
+    expensive statements when sampled. Runs natively under both WSGI and ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.sample_rate = getattr(settings, 'METRICS_SAMPLE_RATE', 1.0)
+        self.slow_seconds = getattr(settings, 'METRICS_SLOW_REQUEST_SECONDS', 1.0)
+        self.n_plus_one_threshold = getattr(settings, 'METRICS_N_PLUS_ONE_THRESHOLD', 5)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = self.start(request)
+        started = time.perf_counter()
+        if recorder is not None:
+            with connection.execute_wrapper(recorder):
+                response = self.get_response(request)
+        else:
+            response = self.get_response(request)
+        return self.finish(request, response, time.perf_counter() - started, recorder)
+
+    async def __acall__(self, request):
+        recorder = self.start(request)
+        started = time.perf_counter()
+        if recorder is None:
+            response = await self.get_response(request)
+        else:
+            # Queries run on the request's thread-sensitive sync thread, which has its own connection
+            await sync_to_async(add_query_recorder)(recorder)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(remove_query_recorder)(recorder)
+        return self.finish(request, response, time.perf_counter() - started, recorder)
+
+    def start(self, request):
+        request._metrics_view_done = None
+        request._metrics_serialize_seconds = None
+        return QueryRecorder() if random.random() < self.sample_rate else None
+
+    def finish(self, request, response, elapsed, recorder):
+        finished = time.perf_counter()
+        view = view_label(request)
+        REQUEST_LATENCY.observe(elapsed, (view, request.method, str(response.status_code)))
+        if request._metrics_view_done is not None:
+            RENDER_SECONDS.observe(finished - request._metrics_view_done, (view,))
+        if request._metrics_serialize_seconds is not None:
+            SERIALIZE_SECONDS.observe(request._metrics_serialize_seconds, (view,))
+        if recorder is not None:
+            REQUEST_QUERIES.observe(recorder.count, (view,))
+            REQUEST_QUERY_SECONDS.observe(recorder.seconds, (view,))
+            repeats = [executions for executions, _ in recorder.statements.values() if executions > 1]
+            if repeats:
+                DUPLICATE_QUERIES.inc(sum(repeats) - len(repeats), (view,))
+                if max(repeats) >= self.n_plus_one_threshold:
+                    N_PLUS_ONE.inc(1, (view,))
+        if elapsed >= self.slow_seconds:
+            SLOW_REQUESTS.inc(1, (view,))
+            self.log_slow(request, response, view, elapsed, recorder)
+        return response
+
+    def process_template_response(self, request, response):
+        # Called after the view and just before the response is rendered
+        request._metrics_view_done = time.perf_counter()
+        return response
+
+    def log_slow(self, request, response, view, elapsed, recorder):
+        message = f"Slow request: {request.method} {request.path} ({view}) {response.status_code} {elapsed * 1000:.0f}ms"
+        if recorder is None:
+            logger.warning('%s (SQL not sampled)', message)
+            return
+        lines = [f"{message}, {recorder.count} queries in {recorder.seconds * 1000:.0f}ms"]
+        costly = sorted(recorder.statements.items(), key=lambda item: item[1][1], reverse=True)
+        for sql, (executions, seconds) in costly[:5]:
+            lines.append(f"  {executions}x {seconds * 1000:.1f}ms  {sql[:500]}")
+        logger.warning('\n'.join(lines))
+
+
+def render_alpr_stats(shards):
+    """Prometheus text for the ALPR pipeline from {shard name: RecognitionPipeline.stats()}."""
+    registry = Registry()
+    frames = registry.add(Counter('alpr_frames_read_total', 'Frames read from cameras', ('shard',)))
+    dropped = registry.add(Counter('alpr_frames_dropped_total', 'Frames dropped by full capture buffers', ('shard',)))
+    reconnects = registry.add(Counter('alpr_capture_reconnects_total', 'Camera stream reconnects', ('shard',)))
+    processed = registry.add(Counter('alpr_stage_processed_total', 'Items handled per stage', ('shard', 'stage')))
+    errors = registry.add(Counter('alpr_stage_errors_total', 'Item failures per stage', ('shard', 'stage')))
+    seconds = registry.add(Counter('alpr_stage_seconds_total', 'Time spent handling items per stage',
+                                   ('shard', 'stage')))
+    slowest = registry.add(Gauge('alpr_stage_max_seconds', 'Slowest item per stage', ('shard', 'stage')))
+    depth = registry.add(Gauge('alpr_stage_queue_depth', 'Items waiting per stage', ('shard', 'stage')))
+    detections = registry.add(Counter('alpr_detections_total', 'Plate logs written', ('shard',)))
+    spooled = registry.add(Counter('alpr_detections_spooled_total', 'Plate logs spooled to disk', ('shard',)))
+    ocr_batches = registry.add(Counter('alpr_ocr_batches_total', 'OCR micro-batches run', ('shard',)))
+    ocr_items = registry.add(Counter('alpr_ocr_items_total', 'Plate crops read by OCR', ('shard',)))
+    ocr_seconds = registry.add(Counter('alpr_ocr_seconds_total', 'Time spent running OCR batches', ('shard',)))
+    for shard, stats in sorted(shards.items()):
+        capture = stats['capture']
+        frames.inc(capture['frames_read'], (shard,))
+        dropped.inc(capture['frames_dropped'], (shard,))
+        reconnects.inc(capture['reconnects'], (shard,))
+        for stage in ('capture', 'detect', 'ocr', 'persist'):
+            stage_stats = stats[stage]
+            processed.inc(stage_stats['processed'], (shard, stage))
+            errors.inc(stage_stats['errors'], (shard, stage))
+            seconds.inc(stage_stats['total_seconds'], (shard, stage))
+            slowest.set(stage_stats['max_ms'] / 1000, (shard, stage))
+            if 'queue_depth' in stage_stats:
+                depth.set(stage_stats['queue_depth'], (shard, stage))
+        detections.inc(stats['writer']['written'], (shard,))
+        spooled.inc(stats['writer']['spooled'], (shard,))
+        ocr_batches.inc(stats['ocr_engine']['batches'], (shard,))
+        ocr_items.inc(stats['ocr_engine']['items'], (shard,))
+        ocr_seconds.inc(stats['ocr_engine']['busy_seconds'], (shard,))
+    return registry.render()
+
+
+def serve_metrics(port, render, host='127.0.0.1', token=''):
+    """
+    Serve render() as Prometheus text on /metrics from a daemon thread; returns the server.
+
+    Only local scrapers can reach it unless `host` says otherwise, and with a
+    `token` requests need "Authorization: Bearer <token>", as for the web /metrics.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            if token and not hmac.compare_digest(self.headers.get('Authorization', ''), f'Bearer {token}'):
+                self.send_error(403, 'Missing or wrong metrics token')
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
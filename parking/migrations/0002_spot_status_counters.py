@@ -0,0 +1,38 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_counters(apps, schema_editor):
+    ParkingSpot = apps.get_model('parking', 'ParkingSpot')
+    SpotStatusCounter = apps.get_model('parking', 'SpotStatusCounter')
+    rows = ParkingSpot.objects.values('parking_lot_id', 'status', 'is_handicap', 'is_ev_charging').annotate(
+        count=models.Count('id')
+    )
+    SpotStatusCounter.objects.bulk_create([SpotStatusCounter(**row) for row in rows])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpotStatusCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('available', 'Available'), ('occupied', 'Occupied'), ('reserved', 'Reserved'), ('maintenance', 'Maintenance')], max_length=20)),
+                ('is_handicap', models.BooleanField(default=False)),
+                ('is_ev_charging', models.BooleanField(default=False)),
+                ('count', models.IntegerField(default=0)),
+                ('parking_lot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_counters', to='parking.parkinglot')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('parking_lot', 'status', 'is_handicap', 'is_ev_charging'), name='unique_spot_status_counter')],
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
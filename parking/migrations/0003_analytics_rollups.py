@@ -0,0 +1,60 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def remove_duplicate_days(apps, schema_editor):
+    # Keep the newest hand-entered row for each lot and day
+    ParkingAnalytics = apps.get_model('parking', 'ParkingAnalytics')
+    latest = ParkingAnalytics.objects.values('parking_lot_id', 'date').annotate(
+        keep=models.Max('id'), rows=models.Count('id')
+    ).filter(rows__gt=1)
+    for row in latest:
+        ParkingAnalytics.objects.filter(parking_lot_id=row['parking_lot_id'], date=row['date']).exclude(
+            id=row['keep']
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0002_spot_status_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParkingAnalyticsHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('total_vehicles', models.IntegerField()),
+                ('peak_occupancy', models.IntegerField()),
+                ('average_occupancy', models.FloatField()),
+                ('revenue', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(remove_duplicate_days, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='parkinganalytics',
+            constraint=models.UniqueConstraint(fields=('parking_lot', 'date'), name='unique_parking_analytics_day'),
+        ),
+        migrations.AddField(
+            model_name='parkinganalyticshourly',
+            name='parking_lot',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_analytics', to='parking.parkinglot'),
+        ),
+        migrations.AddConstraint(
+            model_name='parkinganalyticshourly',
+            constraint=models.UniqueConstraint(fields=('parking_lot', 'hour'), name='unique_parking_analytics_hour'),
+        ),
+    ]
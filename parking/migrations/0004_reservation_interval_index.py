@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0003_analytics_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['parking_spot', 'status', 'start_time', 'end_time'], name='reservation_spot_interval'),
+        ),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:41
+
+from django.db import migrations, models
+
+
+def complete_duplicate_sessions(apps, schema_editor):
+    # Keep each vehicle's newest active session; older ones end when the next one started
+    ParkingSession = apps.get_model('parking', 'ParkingSession')
+    ParkingSpot = apps.get_model('parking', 'ParkingSpot')
+    SpotStatusCounter = apps.get_model('parking', 'SpotStatusCounter')
+    vehicles = ParkingSession.objects.filter(status='active').values('vehicle_id').annotate(
+        rows=models.Count('id')
+    ).filter(rows__gt=1).values_list('vehicle_id', flat=True)
+    freed = set()
+    for vehicle_id in vehicles:
+        sessions = list(ParkingSession.objects.filter(vehicle_id=vehicle_id, status='active').order_by('-start_time', '-id'))
+        newer = sessions[0]
+        for session in sessions[1:]:
+            session.status = 'completed'
+            session.end_time = session.end_time or newer.start_time
+            session.save(update_fields=['status', 'end_time'])
+            freed.add(session.parking_spot_id)
+            newer = session
+    # Free the spots nothing parks in any more; historical models send no signals, so recount their lots
+    still_used = set(ParkingSession.objects.filter(status='active', parking_spot_id__in=freed).values_list(
+        'parking_spot_id', flat=True
+    ))
+    spots = ParkingSpot.objects.filter(id__in=freed - still_used, status='occupied')
+    lot_ids = set(spots.values_list('parking_lot_id', flat=True))
+    spots.update(status='available')
+    SpotStatusCounter.objects.filter(parking_lot_id__in=lot_ids).delete()
+    rows = ParkingSpot.objects.filter(parking_lot_id__in=lot_ids).values(
+        'parking_lot_id', 'status', 'is_handicap', 'is_ev_charging'
+    ).annotate(count=models.Count('id'))
+    SpotStatusCounter.objects.bulk_create([SpotStatusCounter(**row) for row in rows])
+
+
+def renumber_duplicate_spots(apps, schema_editor):
+    # The oldest spot keeps its number; the others get the next free suffix, e.g. A1 -> A1-2
+    ParkingSpot = apps.get_model('parking', 'ParkingSpot')
+    duplicates = ParkingSpot.objects.values('parking_lot_id', 'spot_number').annotate(
+        keep=models.Min('id'), rows=models.Count('id')
+    ).filter(rows__gt=1)
+    for row in duplicates:
+        taken = set(ParkingSpot.objects.filter(parking_lot_id=row['parking_lot_id']).values_list('spot_number', flat=True))
+        spots = ParkingSpot.objects.filter(parking_lot_id=row['parking_lot_id'], spot_number=row['spot_number']).exclude(
+            id=row['keep']
+        ).order_by('id')
+        suffix = 1
+        for spot in spots:
+            number = row['spot_number']
+            while number in taken:
+                suffix += 1
+                number = f"{row['spot_number'][:10 - len(str(suffix)) - 1]}-{suffix}"
+            taken.add(number)
+            spot.spot_number = number
+            spot.save(update_fields=['spot_number'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0004_reservation_interval_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='licenseplatelog',
+            index=models.Index(fields=['license_plate', 'timestamp'], name='plate_log_plate_time'),
+        ),
+        migrations.AddIndex(
+            model_name='licenseplatelog',
+            index=models.Index(condition=models.Q(('processed', False)), fields=['timestamp'], name='plate_log_unprocessed'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingsession',
+            index=models.Index(fields=['vehicle', 'status'], name='session_vehicle_status'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingsession',
+            index=models.Index(fields=['start_time'], name='session_start_time'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingsession',
+            index=models.Index(fields=['updated_at'], name='session_updated_at'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingspot',
+            index=models.Index(fields=['status', 'parking_lot'], name='spot_status_lot'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingspot',
+            index=models.Index(fields=['parking_lot', 'updated_at'], name='spot_lot_updated'),
+        ),
+        migrations.RunPython(complete_duplicate_sessions, migrations.RunPython.noop),
+        migrations.RunPython(renumber_duplicate_spots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='parkingsession',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'active')), fields=('vehicle',), name='one_active_session_per_vehicle'),
+        ),
+        migrations.AddConstraint(
+            model_name='parkingspot',
+            constraint=models.UniqueConstraint(fields=('parking_lot', 'spot_number'), name='unique_spot_number_per_lot'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0005_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehicle',
+            name='is_electric',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='vehicle',
+            name='needs_handicap_spot',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:58
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0006_vehicle_spot_needs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='licenseplatelog',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name='licenseplatelog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddConstraint(
+            model_name='licenseplatelog',
+            constraint=models.UniqueConstraint(fields=('camera', 'idempotency_key'), name='unique_plate_log_idempotency_key'),
+        ),
+    ]
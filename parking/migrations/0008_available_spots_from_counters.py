@@ -0,0 +1,34 @@
+# Generated by Django 5.1.7 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+
+def resync_available_spots(apps, schema_editor):
+    # Lots were created with a hand-entered count and then counted up again
+    # for every spot added, so recount them from the spots
+    ParkingLot = apps.get_model('parking', 'ParkingLot')
+    ParkingSpot = apps.get_model('parking', 'ParkingSpot')
+    available = dict(
+        ParkingSpot.objects.filter(status='available').values('parking_lot_id').annotate(count=models.Count('id'))
+        .values_list('parking_lot_id', 'count')
+    )
+    for lot in ParkingLot.objects.all():
+        if lot.available_spots != available.get(lot.pk, 0):
+            lot.available_spots = available.get(lot.pk, 0)
+            lot.save(update_fields=['available_spots'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0007_gate_event_idempotency'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='parkinglot',
+            name='available_spots',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(resync_available_spots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0008_available_spots_from_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupDirtyDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('parking_lot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dirty_rollup_days', to='parking.parkinglot')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('parking_lot', 'date'), name='unique_rollup_dirty_day')],
+            },
+        ),
+    ]
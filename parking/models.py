@@ -5,7 +5,8 @@ from django.utils import timezone
 class ParkingLot(models.Model):
     name = models.CharField(max_length=100)
     total_spots = models.IntegerField()
-    available_spots = models.IntegerField()
+    # Kept equal to the lot's available spots by the spot signals; starts at 0 like the spot counters
+    available_spots = models.IntegerField(default=0, editable=False)
     location = models.CharField(max_length=200)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -29,9 +30,39 @@ class ParkingSpot(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # status='available', alone or within a lot
+            models.Index(fields=['status', 'parking_lot'], name='spot_status_lot'),
+            # Live availability stream polls recently changed spots per lot
+            models.Index(fields=['parking_lot', 'updated_at'], name='spot_lot_updated'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['parking_lot', 'spot_number'], name='unique_spot_number_per_lot'),
+        ]
+
     def __str__(self):
         return f"{self.parking_lot.name} - Spot {self.spot_number}"
 
+class SpotStatusCounter(models.Model):
+    """Live count of a lot's spots per status, handicap and EV combination."""
+    parking_lot = models.ForeignKey(ParkingLot, on_delete=models.CASCADE, related_name='status_counters')
+    status = models.CharField(max_length=20, choices=ParkingSpot.SPOT_STATUS)
+    is_handicap = models.BooleanField(default=False)
+    is_ev_charging = models.BooleanField(default=False)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['parking_lot', 'status', 'is_handicap', 'is_ev_charging'],
+                name='unique_spot_status_counter',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.parking_lot.name} - {self.status}: {self.count}"
+
 class Vehicle(models.Model):
     VEHICLE_TYPES = (
         ('car', 'Car'),
@@ -46,6 +77,9 @@ class Vehicle(models.Model):
     brand = models.CharField(max_length=50)
     model = models.CharField(max_length=50)
     color = models.CharField(max_length=30)
+    # Used by the spot allocator to pick handicap and EV charging spots
+    needs_handicap_spot = models.BooleanField(default=False)
+    is_electric = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -68,6 +102,19 @@ class ParkingSession(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['vehicle', 'status'], name='session_vehicle_status'),
+            models.Index(fields=['start_time'], name='session_start_time'),
+            # Incremental analytics rollups scan sessions changed since the last run
+            models.Index(fields=['updated_at'], name='session_updated_at'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['vehicle'], condition=models.Q(status='active'), name='one_active_session_per_vehicle'
+            ),
+        ]
+
     def __str__(self):
         return f"{self.vehicle.license_plate} - {self.parking_spot.spot_number}"
 
@@ -88,6 +135,12 @@ class Reservation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Overlap checks: spot and status by equality, then the interval bounds
+            models.Index(fields=['parking_spot', 'status', 'start_time', 'end_time'], name='reservation_spot_interval'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.vehicle.license_plate}"
 
@@ -100,6 +153,50 @@ class ParkingAnalytics(models.Model):
     revenue = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['parking_lot', 'date'], name='unique_parking_analytics_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.parking_lot.name} - {self.date}"
+
+class ParkingAnalyticsHourly(models.Model):
+    """Hourly buckets written by the rollup_analytics command alongside the daily rows."""
+    parking_lot = models.ForeignKey(ParkingLot, on_delete=models.CASCADE, related_name='hourly_analytics')
+    hour = models.DateTimeField()
+    total_vehicles = models.IntegerField()
+    peak_occupancy = models.IntegerField()
+    average_occupancy = models.FloatField()
+    revenue = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['parking_lot', 'hour'], name='unique_parking_analytics_hour'),
+        ]
+
+    def __str__(self):
+        return f"{self.parking_lot.name} - {self.hour}"
+
+class RollupWatermark(models.Model):
+    """Session updated_at up to which a rollup has already been processed."""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} - {self.value}"
+
+class RollupDirtyDay(models.Model):
+    """A lot and day to roll up again that no remaining session points at, e.g. after a delete."""
+    parking_lot = models.ForeignKey(ParkingLot, on_delete=models.CASCADE, related_name='dirty_rollup_days')
+    date = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['parking_lot', 'date'], name='unique_rollup_dirty_day'),
+        ]
+
     def __str__(self):
         return f"{self.parking_lot.name} - {self.date}"
 
@@ -133,8 +230,21 @@ class LicensePlateLog(models.Model):
     log_type = models.CharField(max_length=20, choices=LOG_TYPE)
     confidence = models.FloatField()
     image = models.ImageField(upload_to='license_plates/')
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Defaults to now; devices posting gate events send the time of the read
+    timestamp = models.DateTimeField(default=timezone.now)
     processed = models.BooleanField(default=False)
+    # Client-generated key that makes re-posting a gate event harmless
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['camera', 'idempotency_key'], name='unique_plate_log_idempotency_key'),
+        ]
+        indexes = [
+            models.Index(fields=['license_plate', 'timestamp'], name='plate_log_plate_time'),
+            # Only the backlog of unprocessed logs is ever looked up by this flag
+            models.Index(fields=['timestamp'], condition=models.Q(processed=False), name='plate_log_unprocessed'),
+        ]
 
     def __str__(self):
         return f"{self.license_plate} - {self.log_type} - {self.timestamp}"
@@ -0,0 +1,89 @@
+import threading
+
+import cv2
+from django.conf import settings
+
+
+class MotionGate:
+    """
+    Cheap per-camera change detector run before plate detection.
+
+    Frames are downscaled, blurred and compared against a running-average
+    background inside the region of interest. Only frames where at least
+    `min_changed` of the ROI pixels moved are passed on to the expensive path.
+    `roi` is (x, y, width, height) as fractions of the frame.
+    """
+
+    def __init__(self, roi=None, width=160, threshold=25, min_changed=0.01, learning_rate=0.05):
+        self.roi = roi
+        self.width = width
+        self.threshold = threshold
+        self.min_changed = min_changed
+        self.learning_rate = learning_rate
+        self.background = None
+        self.passed = 0
+        self.skipped = 0
+        self.last_score = 0.0
+
+    def _prepare(self, frame):
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.roi:
+            height, width = frame.shape
+            x, y, w, h = self.roi
+            frame = frame[int(y * height):int((y + h) * height), int(x * width):int((x + w) * width)]
+        height, width = frame.shape
+        if width > self.width:
+            frame = cv2.resize(frame, (self.width, max(1, height * self.width // width)), interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(frame, (5, 5), 0)
+
+    def score(self, frame):
+        # Fraction of ROI pixels that differ from the background model
+        small = self._prepare(frame)
+        if self.background is None or self.background.shape != small.shape:
+            self.background = small.astype('float32')
+            return 1.0
+        diff = cv2.absdiff(small, cv2.convertScaleAbs(self.background))
+        cv2.accumulateWeighted(small, self.background, self.learning_rate)
+        return cv2.countNonZero(cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)[1]) / diff.size
+
+    def should_process(self, frame):
+        self.last_score = self.score(frame)
+        if self.last_score >= self.min_changed:
+            self.passed += 1
+            return True
+        self.skipped += 1
+        return False
+
+    def stats(self):
+        total = self.passed + self.skipped
+        return {
+            'passed': self.passed,
+            'skipped': self.skipped,
+            'pass_ratio': self.passed / total if total else 0.0,
+            'skip_ratio': self.skipped / total if total else 0.0,
+            'last_score': self.last_score,
+        }
+
+
+_gates = {}
+_gates_lock = threading.Lock()
+
+
+def get_motion_gate(camera):
+    with _gates_lock:
+        gate = _gates.get(camera.pk)
+        if gate is None:
+            gate = MotionGate(
+                roi=getattr(settings, 'ALPR_MOTION_ROI', {}).get(camera.pk),
+                threshold=getattr(settings, 'ALPR_MOTION_THRESHOLD', 25),
+                min_changed=getattr(settings, 'ALPR_MOTION_MIN_CHANGE', 0.01),
+            )
+            _gates[camera.pk] = gate
+        return gate
+
+
+def motion_stats():
+    """Skip/pass counters for every camera gated in this process, keyed by camera id."""
+    with _gates_lock:
+        return {camera_id: gate.stats() for camera_id, gate in _gates.items()}
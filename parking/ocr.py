@@ -0,0 +1,145 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import cv2
+from django.conf import settings
+
+
+class OCREngine:
+    """
+    Process-wide OCR engine shared by every camera.
+
+    The EasyOCR model is loaded lazily on first use. Plate crops submitted from
+    any thread are grouped into micro-batches of at most `max_batch_size`
+    crops, waiting no longer than `max_wait` seconds for a batch to fill, and
+    each caller gets its own result back through a Future.
+    """
+
+    def __init__(self, languages=('en',), max_batch_size=16, max_wait=0.02, crop_size=(256, 64), gpu=False):
+        self.languages = list(languages)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.crop_size = crop_size
+        self.gpu = gpu
+        self._reader = None
+        self._reader_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.started_at = None
+        self.batches = 0
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.last_batch_seconds = 0.0
+        self.max_batch_seconds = 0.0
+
+    @property
+    def reader(self):
+        if self._reader is None:
+            with self._reader_lock:
+                if self._reader is None:
+                    import easyocr
+                    self._reader = easyocr.Reader(self.languages, gpu=self.gpu)
+        return self._reader
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._thread_lock:
+                if self._thread is None:
+                    self.started_at = time.time()
+                    self._thread = threading.Thread(target=self._run, name='ocr-batcher', daemon=True)
+                    self._thread.start()
+
+    def submit(self, crop):
+        """Queue one plate crop; the Future resolves to EasyOCR's [(bbox, text, confidence), ...]."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((crop, future))
+        return future
+
+    def recognize(self, crops, timeout=None):
+        futures = [self.submit(crop) for crop in crops]
+        return [future.result(timeout) for future in futures]
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            batch = [(crop, future) for crop, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            crops = [crop for crop, _ in batch]
+            futures = [future for _, future in batch]
+
+            started = time.perf_counter()
+            try:
+                results = self.read_batch(crops)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - started
+
+            with self._stats_lock:
+                self.batches += 1
+                self.items += len(crops)
+                self.busy_seconds += elapsed
+                self.last_batch_seconds = elapsed
+                self.max_batch_seconds = max(self.max_batch_seconds, elapsed)
+
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+    def read_batch(self, crops):
+        # Crops are resized to a common size so EasyOCR can stack them into one batch
+        width, height = self.crop_size
+        resized = [cv2.resize(crop, (width, height)) for crop in crops]
+        return self.reader.readtext_batched(resized, n_width=width, n_height=height, batch_size=len(resized))
+
+    def stats(self):
+        with self._stats_lock:
+            uptime = time.time() - self.started_at if self.started_at else 0.0
+            return {
+                'batches': self.batches,
+                'items': self.items,
+                'queued': self._queue.qsize(),
+                'avg_batch_size': self.items / self.batches if self.batches else 0.0,
+                'avg_batch_ms': self.busy_seconds / self.batches * 1000 if self.batches else 0.0,
+                'last_batch_ms': self.last_batch_seconds * 1000,
+                'max_batch_ms': self.max_batch_seconds * 1000,
+                'items_per_second': self.items / uptime if uptime else 0.0,
+                'busy_items_per_second': self.items / self.busy_seconds if self.busy_seconds else 0.0,
+            }
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_ocr_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = OCREngine(
+                    languages=getattr(settings, 'ALPR_OCR_LANGUAGES', ('en',)),
+                    max_batch_size=getattr(settings, 'ALPR_OCR_MAX_BATCH_SIZE', 16),
+                    max_wait=getattr(settings, 'ALPR_OCR_MAX_WAIT', 0.02),
+                    gpu=getattr(settings, 'ALPR_OCR_GPU', False),
+                )
+    return _engine
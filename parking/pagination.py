@@ -0,0 +1,18 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ViewCursorPagination(CursorPagination):
+    """
+    Keyset pagination ordered by the view's `cursor_ordering`.
+
+    Pages are fetched with a WHERE on the ordering columns rather than an
+    OFFSET, so every page costs the same however deep the client goes.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = '-id'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', self.ordering)
+        return (ordering,) if isinstance(ordering, str) else tuple(ordering)
@@ -0,0 +1,225 @@
+import queue
+import threading
+import time
+
+from django.conf import settings
+
+from .capture import CaptureWorker, camera_stream_url
+from .motion import get_motion_gate
+from .services import LicensePlateRecognition
+from .tracking import get_plate_tracker
+
+
+class StageMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def observe(self, seconds):
+        with self.lock:
+            self.processed += 1
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def error(self):
+        with self.lock:
+            self.errors += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'processed': self.processed,
+                'errors': self.errors,
+                'total_seconds': self.total_seconds,
+                'avg_ms': self.total_seconds / self.processed * 1000 if self.processed else 0.0,
+                'max_ms': self.max_seconds * 1000,
+            }
+
+
+class Stage:
+    """
+    One pipeline stage: `workers` threads taking items from `inbox`, calling
+    `handler(item)` and putting every returned item on `outbox`.
+
+    Puts on a full outbox block, so a slow stage pushes back on the stages
+    before it. `on_idle` is called whenever the inbox stays empty for
+    `idle_interval` seconds.
+    """
+
+    def __init__(self, name, handler, inbox, outbox=None, workers=1, on_idle=None, idle_interval=0.5):
+        self.name = name
+        self.handler = handler
+        self.inbox = inbox
+        self.outbox = outbox
+        self.on_idle = on_idle
+        self.idle_interval = idle_interval
+        self.metrics = StageMetrics()
+        self.stop_event = threading.Event()
+        self.threads = [
+            threading.Thread(target=self._run, name=f'{name}-{i}', daemon=True)
+            for i in range(workers)
+        ]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                item = self.inbox.get(timeout=self.idle_interval)
+            except queue.Empty:
+                if self.on_idle:
+                    self.on_idle()
+                continue
+
+            started = time.perf_counter()
+            try:
+                for result in self.handler(item) or ():
+                    self.outbox.put(result)
+                self.metrics.observe(time.perf_counter() - started)
+            except Exception as e:
+                self.metrics.error()
+                print(f"Error in {self.name} stage: {str(e)}")
+            finally:
+                self.inbox.task_done()
+
+    def stats(self):
+        stats = self.metrics.snapshot()
+        stats['queue_depth'] = self.inbox.qsize()
+        stats['queue_size'] = self.inbox.maxsize
+        return stats
+
+
+class RecognitionPipeline:
+    """
+    Runs capture -> detect -> OCR -> persist for a set of cameras, each stage
+    on its own threads and joined by bounded queues.
+    """
+
+    def __init__(self, cameras, sources=None, queue_size=32, ocr_workers=4, buffer_size=8):
+        self.cameras = {camera.pk: camera for camera in cameras}
+        sources = sources or {}
+        self.recognition = LicensePlateRecognition()
+        self.captures = {
+            camera.pk: CaptureWorker(
+                sources.get(camera.pk) or camera_stream_url(camera),
+                buffer_size=buffer_size,
+                name=f'capture-{camera.pk}',
+            )
+            for camera in cameras
+        }
+        self.frames = queue.Queue(queue_size)
+        self.regions = queue.Queue(queue_size)
+        self.reads = queue.Queue(queue_size)
+        self.capture_stop = threading.Event()
+        self.capture_thread = threading.Thread(target=self._capture, name='capture', daemon=True)
+        self.capture_metrics = StageMetrics()
+        self.expire_interval = getattr(settings, 'ALPR_TRACK_EXPIRE_INTERVAL', 0.5)
+        self.expiry_thread = threading.Thread(target=self._expire_on_timer, name='track-expiry', daemon=True)
+        self.stages = [
+            Stage('detect', self.detect, self.frames, self.regions),
+            Stage('ocr', self.ocr, self.regions, self.reads, workers=ocr_workers),
+            Stage('persist', self.persist, self.reads),
+        ]
+
+    def start(self):
+        for worker in self.captures.values():
+            worker.start()
+        for stage in self.stages:
+            stage.start()
+        self.capture_thread.start()
+        self.expiry_thread.start()
+
+    def shutdown(self, timeout=10.0):
+        """Stop capturing, let queued work drain through every stage, then stop."""
+        self.capture_stop.set()
+        self.capture_thread.join(timeout)
+        self.expiry_thread.join(timeout)
+        for worker in self.captures.values():
+            worker.stop(timeout)
+        for stage in self.stages:
+            stage.inbox.join()
+            stage.stop(timeout)
+        self.expire_tracks(flush=True)
+        self.recognition.writer.close()
+
+    def _capture(self):
+        # Round-robin the per-camera ring buffers into the detect queue
+        while not self.capture_stop.is_set():
+            idle = True
+            for camera_id, worker in self.captures.items():
+                frame_time, frame = worker.buffer.get(timeout=0)
+                if frame is None:
+                    continue
+                idle = False
+                started = time.perf_counter()
+                while not self.capture_stop.is_set():
+                    try:
+                        self.frames.put((camera_id, frame_time, frame), timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                self.capture_metrics.observe(time.perf_counter() - started)
+            if idle:
+                self.capture_stop.wait(0.01)
+
+    def detect(self, item):
+        camera_id, frame_time, frame = item
+        camera = self.cameras[camera_id]
+        # While a vehicle's track is open every frame is read, so a car stopping in the lane is
+        # not learned into the background, its track closed, and logged again when it drives off
+        moved = get_motion_gate(camera).should_process(frame)
+        if not moved and not get_plate_tracker(camera).has_open_tracks():
+            return []
+        regions = self.recognition.find_plate_regions(frame)
+        return [(camera_id, frame_time, regions)] if regions else []
+
+    def ocr(self, item):
+        camera_id, frame_time, regions = item
+        plate_text, confidence, plate_img = self.recognition.read_plate(regions)
+        if plate_text and confidence > 0.5:  # Confidence threshold
+            return [(camera_id, frame_time, plate_text, confidence, plate_img)]
+        return []
+
+    def persist(self, item):
+        camera_id, frame_time, plate_text, confidence, plate_img = item
+        camera = self.cameras[camera_id]
+        for track in get_plate_tracker(camera).observe(plate_text, confidence, plate_img, frame_time):
+            self.recognition.save_detection(camera, *track.best(), track.first_seen)
+
+    def _expire_on_timer(self):
+        # Not left to new frames: a camera that stops sending would keep its tracks open
+        while not self.capture_stop.wait(self.expire_interval):
+            try:
+                self.expire_tracks()
+            except Exception as e:
+                print(f"Error expiring plate tracks: {str(e)}")
+
+    def expire_tracks(self, flush=False):
+        for camera in self.cameras.values():
+            tracker = get_plate_tracker(camera)
+            for track in tracker.flush() if flush else tracker.expire():
+                self.recognition.save_detection(camera, *track.best(), track.first_seen)
+
+    def stats(self):
+        capture = self.capture_metrics.snapshot()
+        capture['frames_read'] = sum(worker.frames_read for worker in self.captures.values())
+        capture['frames_dropped'] = sum(worker.buffer.dropped for worker in self.captures.values())
+        capture['reconnects'] = sum(worker.reconnects for worker in self.captures.values())
+        stats = {'capture': capture}
+        for stage in self.stages:
+            stats[stage.name] = stage.stats()
+        writer = self.recognition.writer
+        stats['writer'] = {'written': writer.written, 'spooled': writer.spooled}
+        stats['ocr_engine'] = self.recognition.ocr.stats()
+        stats['ocr_engine']['busy_seconds'] = self.recognition.ocr.busy_seconds
+        return stats
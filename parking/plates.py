@@ -0,0 +1,274 @@
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Vehicle
+
+# Characters OCR commonly swaps on plates, each mapped to one representative
+CONFUSABLE = str.maketrans({
+    '0': 'O', 'Q': 'O', 'D': 'O',
+    '1': 'I', 'L': 'I',
+    '8': 'B',
+    '5': 'S',
+    '2': 'Z',
+    '6': 'G',
+})
+
+
+def normalize_plate(text):
+    """Upper-case a plate read and drop everything that is not a letter or digit."""
+    return ''.join(c for c in text.upper() if c.isalnum())
+
+
+def one_edit_apart(a, b):
+    """True if a and b differ by at most one insertion, deletion or substitution."""
+    if len(a) > len(b):
+        a, b = b, a
+    if len(b) - len(a) > 1:
+        return False
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:]
+    return a[i:] == b[i + 1:]
+
+
+def edit_distance(a, b, max_distance=None):
+    # Levenshtein distance with a rolling row; with max_distance, stops early
+    # and returns max_distance + 1 once the distance is known to exceed it
+    if max_distance == 1:
+        return 0 if a == b else (1 if one_edit_apart(a, b) else 2)
+    if len(a) < len(b):
+        a, b = b, a
+    if max_distance is not None and len(a) - len(b) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ca != cb),
+            ))
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+PlateMatch = namedtuple('PlateMatch', 'vehicle_id license_plate distance')
+
+
+def segment_bounds(length, parts):
+    return [round(i * length / parts) for i in range(parts + 1)]
+
+
+class PlateIndex:
+    """
+    In-memory index of registered plates for matching OCR reads to vehicles.
+
+    Exact reads are one dict lookup. Other reads are compared on canonical
+    keys, where confusable characters (0/O, 8/B, 1/I, ...) are folded, and
+    match when at most `max_distance` further edits apart.
+
+    Fuzzy candidates come from a pigeonhole segment index rather than a
+    BK-tree. Each key is split into max_distance + 1 segments, and at least
+    one of them survives max_distance edits intact, at most max_distance
+    positions away. So only keys sharing such a segment with the read are
+    compared. A read matching several plates equally well is ambiguous and
+    returns None.
+    """
+
+    def __init__(self, max_distance=1):
+        self.max_distance = max_distance
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.clear()
+
+    def clear(self):
+        self.exact = {}      # normalized plate -> vehicle id
+        self.plates = {}     # vehicle id -> normalized plate
+        self.canonical = {}  # canonical key -> set of normalized plates
+        self.segments = {}   # (key length, segment number, text) -> set of canonical keys
+
+    def segment_keys(self, key):
+        parts = self.max_distance + 1
+        bounds = segment_bounds(len(key), parts)
+        return [(len(key), i, key[bounds[i]:bounds[i + 1]]) for i in range(parts)]
+
+    def _add(self, vehicle_id, license_plate):
+        plate = normalize_plate(license_plate)
+        old = self.plates.get(vehicle_id)
+        if old == plate:
+            return
+        if old is not None:
+            self._remove(vehicle_id)
+        self.exact[plate] = vehicle_id
+        self.plates[vehicle_id] = plate
+        key = plate.translate(CONFUSABLE)
+        if key not in self.canonical:
+            self.canonical[key] = set()
+            for segment in self.segment_keys(key):
+                self.segments.setdefault(segment, set()).add(key)
+        self.canonical[key].add(plate)
+
+    def _remove(self, vehicle_id):
+        plate = self.plates.pop(vehicle_id, None)
+        if plate is None:
+            return
+        self.exact.pop(plate, None)
+        key = plate.translate(CONFUSABLE)
+        plates = self.canonical.get(key)
+        if plates is not None:
+            plates.discard(plate)
+            if not plates:
+                del self.canonical[key]
+                for segment in self.segment_keys(key):
+                    keys = self.segments.get(segment)
+                    if keys is not None:
+                        keys.discard(key)
+                        if not keys:
+                            del self.segments[segment]
+
+    def add(self, vehicle_id, license_plate):
+        with self.lock:
+            self._add(vehicle_id, license_plate)
+
+    def remove(self, vehicle_id):
+        with self.lock:
+            self._remove(vehicle_id)
+
+    def load(self, rows):
+        """Replace the contents with (vehicle id, license plate) rows, building off to the side."""
+        fresh = PlateIndex(self.max_distance)
+        for vehicle_id, license_plate in rows:
+            fresh._add(vehicle_id, license_plate)
+        with self.lock:
+            self.exact, self.plates = fresh.exact, fresh.plates
+            self.canonical, self.segments = fresh.canonical, fresh.segments
+            self.loaded = True
+
+    def __len__(self):
+        return len(self.plates)
+
+    def candidates(self, key):
+        k = self.max_distance
+        found = set()
+        for length in range(max(len(key) - k, 1), len(key) + k + 1):
+            bounds = segment_bounds(length, k + 1)
+            for i in range(k + 1):
+                start, end = bounds[i], bounds[i + 1]
+                for shift in range(-k, k + 1):
+                    if start + shift < 0 or end + shift > len(key):
+                        continue
+                    keys = self.segments.get((length, i, key[start + shift:end + shift]))
+                    if keys:
+                        found.update(keys)
+        return found
+
+    def lookup(self, text, max_distance=None):
+        """Best PlateMatch for an OCR read, or None when nothing (or more than one plate) matches."""
+        plate = normalize_plate(text)
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        with self.lock:
+            vehicle_id = self.exact.get(plate)
+            if vehicle_id is not None:
+                return PlateMatch(vehicle_id, plate, 0)
+
+            key = plate.translate(CONFUSABLE)
+            if key in self.canonical:
+                keys = [(0, key)]
+            elif max_distance:
+                keys = [(edit_distance(key, other, max_distance), other) for other in self.candidates(key)]
+            else:
+                keys = []
+
+            matches = [
+                (distance, candidate)
+                for distance, other in keys if distance <= max_distance
+                for candidate in self.canonical[other]
+            ]
+            if not matches:
+                return None
+            if len(matches) > 1:
+                # Rank by distance after folding confusables, then by raw distance
+                ranked = sorted((distance, edit_distance(plate, candidate), candidate) for distance, candidate in matches)
+                if ranked[0][:2] == ranked[1][:2]:
+                    return None
+                matches = [(ranked[0][0], ranked[0][2])]
+            distance, candidate = matches[0]
+            return PlateMatch(self.exact[candidate], candidate, distance)
+
+
+class VehiclePlateIndex(PlateIndex):
+    """
+    PlateIndex over Vehicle.license_plate, loaded on first lookup.
+
+    Saves in this process update it through signals. Changes made by other
+    processes are picked up by a refresh every `refresh_interval` seconds,
+    which reloads vehicles updated since the last one, and everything when
+    the vehicle count no longer matches (a deletion elsewhere).
+    """
+
+    def __init__(self, max_distance=1, refresh_interval=60.0):
+        super().__init__(max_distance)
+        self.refresh_interval = refresh_interval
+        self.refreshed_at = None
+        self.checked = 0.0
+
+    def reload(self):
+        started = timezone.now()
+        self.load(Vehicle.objects.values_list('id', 'license_plate').iterator(chunk_size=10000))
+        self.refreshed_at = started
+        self.checked = time.monotonic()
+
+    def refresh(self):
+        started = timezone.now()
+        # A small overlap catches rows committed just behind the last refresh
+        changed = Vehicle.objects.filter(updated_at__gte=self.refreshed_at - timedelta(seconds=1))
+        for vehicle_id, license_plate in changed.values_list('id', 'license_plate'):
+            self.add(vehicle_id, license_plate)
+        self.refreshed_at = started
+        self.checked = time.monotonic()
+        if Vehicle.objects.count() != len(self):
+            self.reload()
+
+    def lookup(self, text, max_distance=None):
+        if not self.loaded:
+            self.reload()
+        elif time.monotonic() - self.checked > self.refresh_interval:
+            self.refresh()
+        return super().lookup(text, max_distance)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_plate_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = VehiclePlateIndex(
+                    max_distance=getattr(settings, 'ALPR_PLATE_INDEX_MAX_DISTANCE', 1),
+                    refresh_interval=getattr(settings, 'ALPR_PLATE_INDEX_REFRESH_INTERVAL', 60.0),
+                )
+    return _index
+
+
+def vehicle_saved(vehicle):
+    # Only processes that have loaded the index keep it current
+    if _index is not None and _index.loaded:
+        _index.add(vehicle.pk, vehicle.license_plate)
+
+
+def vehicle_deleted(vehicle):
+    if _index is not None and _index.loaded:
+        _index.remove(vehicle.pk)
@@ -0,0 +1,92 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.utils import timezone
+
+from .models import (
+    Camera, LicensePlateLog, ParkingAnalytics, ParkingLot, ParkingSession, ParkingSpot, Reservation, Vehicle,
+)
+from .reservations import overlapping_reservations
+
+
+def prefer_indexes():
+    # Small seeded tables would otherwise be sequentially scanned; call inside a transaction
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+
+def indexes_used(queryset, indexes):
+    """(names from `indexes` that appear in the query plan, the plan)."""
+    plan = queryset.explain()
+    return [name for name in indexes if name in plan], plan
+
+
+def hot_queries(seed):
+    """(label, queryset, index names any of which the plan should use) for each hot query."""
+    now = timezone.now()
+    lot, vehicle, spot = seed['lot'], seed['vehicle'], seed['spot']
+    return [
+        ('available spots', ParkingSpot.objects.filter(status='available'), ['spot_status_lot']),
+        ('available spots in a lot', ParkingSpot.objects.filter(parking_lot=lot, status='available'),
+         ['spot_status_lot']),
+        ('changed spots in lots', ParkingSpot.objects.filter(parking_lot_id__in=[lot.pk], updated_at__gte=now),
+         ['spot_lot_updated']),
+        ('active session of a vehicle', ParkingSession.objects.filter(vehicle=vehicle, status='active'),
+         ['session_vehicle_status', 'one_active_session_per_vehicle']),
+        ('sessions by start time', ParkingSession.objects.filter(start_time__gte=now - timedelta(days=1)),
+         ['session_start_time']),
+        ('sessions changed since', ParkingSession.objects.filter(updated_at__gte=now), ['session_updated_at']),
+        ('plate history', LicensePlateLog.objects.filter(license_plate='51A00001').order_by('-timestamp'),
+         ['plate_log_plate_time']),
+        ('unprocessed plate logs', LicensePlateLog.objects.filter(processed=False).order_by('timestamp'),
+         ['plate_log_unprocessed']),
+        ('lot analytics for a day', ParkingAnalytics.objects.filter(parking_lot=lot, date=now.date()),
+         ['unique_parking_analytics_day', 'sqlite_autoindex_parking_parkinganalytics']),
+        ('reservation conflicts', overlapping_reservations(now, now + timedelta(hours=1)).filter(parking_spot=spot),
+         ['reservation_spot_interval']),
+    ]
+
+
+def seed(rows):
+    """`rows` rows in every table the hot queries read, returning the objects they filter on."""
+    suffix = time.time_ns()
+    user = User.objects.create(username=f'query-plans-{suffix}')
+    lot = ParkingLot.objects.create(name='Query plan lot', total_spots=rows, location='-')
+    spots = ParkingSpot.objects.bulk_create(
+        ParkingSpot(parking_lot=lot, spot_number=str(i), status='available' if i % 4 else 'occupied')
+        for i in range(rows)
+    )
+    vehicles = Vehicle.objects.bulk_create(
+        Vehicle(user=user, license_plate=f'Q{suffix % 10 ** 8}{i}', vehicle_type='car', brand='-', model='-',
+                color='-')
+        for i in range(rows)
+    )
+    camera = Camera.objects.create(name='Query plan camera', location='-', ip_address='127.0.0.1', parking_lot=lot)
+    now = timezone.now()
+    ParkingSession.objects.bulk_create(
+        ParkingSession(vehicle=vehicles[i], parking_spot=spots[i], start_time=now - timedelta(minutes=i),
+                       status='active' if i % 10 == 0 else 'completed')
+        for i in range(rows)
+    )
+    LicensePlateLog.objects.bulk_create(
+        LicensePlateLog(camera=camera, license_plate=f'51A{i % 500:05d}', log_type='check_in', confidence=0.9,
+                        image='-', processed=i % 20 != 0)
+        for i in range(rows)
+    )
+    ParkingAnalytics.objects.bulk_create(
+        ParkingAnalytics(parking_lot=lot, date=now.date() - timedelta(days=i), total_vehicles=0,
+                         peak_hour_occupancy=0, average_occupancy=0, revenue=0)
+        for i in range(rows)
+    )
+    Reservation.objects.bulk_create(
+        Reservation(user=user, vehicle=vehicles[i], parking_spot=spots[i % 50],
+                    start_time=now + timedelta(hours=i), end_time=now + timedelta(hours=i + 1))
+        for i in range(rows)
+    )
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+    return {'lot': lot, 'vehicle': vehicles[0], 'spot': spots[0]}
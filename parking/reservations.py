@@ -0,0 +1,71 @@
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ParkingSpot, Reservation
+
+# Reservations in these states hold their spot for the interval
+BLOCKING_STATUSES = ('pending', 'confirmed')
+
+
+class ReservationConflict(Exception):
+    pass
+
+
+def parse_interval(start, end):
+    """Parse ISO start/end strings (naive ones in the current timezone); raises ValueError if invalid."""
+    try:
+        start, end = parse_datetime(start or ''), parse_datetime(end or '')
+    except ValueError:
+        start = end = None
+    if start is None or end is None:
+        raise ValueError('start and end must be ISO datetimes')
+    if timezone.is_naive(start):
+        start = timezone.make_aware(start)
+    if timezone.is_naive(end):
+        end = timezone.make_aware(end)
+    if end <= start:
+        raise ValueError('end must be after start')
+    return start, end
+
+
+def overlapping_reservations(start, end):
+    # Served by the (parking_spot, status, start_time, end_time) index
+    return Reservation.objects.filter(status__in=BLOCKING_STATUSES, start_time__lt=end, end_time__gt=start)
+
+
+def free_spots(start, end, lot=None):
+    """
+    Spots with no blocking reservation overlapping [start, end), in one
+    query with a NOT EXISTS anti-join. Spots under maintenance are left out,
+    as are spots not currently available when the interval has started.
+    """
+    spots = ParkingSpot.objects.exclude(status='maintenance')
+    if lot is not None:
+        spots = spots.filter(parking_lot=lot)
+    if start <= timezone.now():
+        spots = spots.filter(status='available')
+    return spots.filter(~Exists(overlapping_reservations(start, end).filter(parking_spot=OuterRef('pk'))))
+
+
+def book_spot(user, vehicle, spot, start, end, status='pending'):
+    """
+    Create a reservation unless it overlaps a blocking one on the same spot.
+
+    The spot row is locked first, so concurrent bookings of one spot check
+    and insert one after another (on SQLite the write lock does the same).
+    Raises ReservationConflict when the spot is taken.
+    """
+    with transaction.atomic():
+        ParkingSpot.objects.select_for_update().get(pk=spot.pk)
+        if overlapping_reservations(start, end).filter(parking_spot=spot).exists():
+            raise ReservationConflict(f'Spot {spot.spot_number} is already reserved for that time')
+        return Reservation.objects.create(
+            user=user,
+            vehicle=vehicle,
+            parking_spot=spot,
+            start_time=start,
+            end_time=end,
+            status=status,
+        )
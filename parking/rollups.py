@@ -0,0 +1,235 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .dashboard import GLOBAL, bump_version
+from .models import (
+    ParkingAnalytics, ParkingAnalyticsHourly, ParkingLot, ParkingSession, RollupDirtyDay, RollupWatermark,
+)
+
+# numpy is imported inside the functions that use it: session signals import
+# this module from web workers to queue dirty days
+
+WATERMARK = 'parking-analytics'
+# Sessions saved while the previous run was reading are picked up again next time
+WATERMARK_OVERLAP = timedelta(minutes=1)
+
+
+def local_day(value):
+    return timezone.localtime(value).date()
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def day_range(first, last):
+    return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+
+def consecutive_runs(days):
+    """Split sorted dates into lists of consecutive days."""
+    runs = []
+    for day in days:
+        if runs and day - runs[-1][-1] == timedelta(days=1):
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+    return runs
+
+
+def mark_dirty(lot_id, start, end=None, now=None):
+    """Queue a session's days for the next rollup; deletes and moves leave no updated_at behind."""
+    if lot_id is None:
+        return
+    days = day_range(local_day(start), local_day(end or now or timezone.now()))
+    RollupDirtyDay.objects.bulk_create(
+        [RollupDirtyDay(parking_lot_id=lot_id, date=day) for day in days], ignore_conflicts=True
+    )
+
+
+def dirty_days(since=None, now=None):
+    """
+    {lot_id: set of dates} whose rollups are out of date: every day touched
+    by a session updated after `since` (all sessions when None), plus every
+    day an active session has been running, as those grow without a save.
+    Days queued by mark_dirty() are added by run_rollup().
+    """
+    now = now or timezone.now()
+    sessions = ParkingSession.objects.exclude(status='cancelled')
+    changed = sessions if since is None else ParkingSession.objects.filter(updated_at__gte=since)
+    days = {}
+    for queryset in (changed, sessions.filter(end_time__isnull=True)):
+        rows = queryset.values_list('parking_spot__parking_lot_id', 'start_time', 'end_time').iterator(chunk_size=2000)
+        for lot_id, start, end in rows:
+            days.setdefault(lot_id, set()).update(day_range(local_day(start), local_day(end or now)))
+    return days
+
+
+def hour_boundaries(days):
+    """Hour bucket edges covering `days`, in epoch seconds, so DST days get 23 or 25 buckets."""
+    import numpy as np
+    edges, bucket_days = [], []
+    for day in days:
+        start = day_start(day).timestamp()
+        end = day_start(day + timedelta(days=1)).timestamp()
+        hours = np.arange(start, end, 3600.0)
+        edges.append(hours)
+        bucket_days.extend([day] * len(hours))
+    edges.append([end])
+    return np.concatenate(edges), bucket_days
+
+
+def sweep_occupancy(starts, ends, edges):
+    """
+    Peak and time-weighted average number of parked cars in each bucket
+    between consecutive `edges`, from session start/end times (epoch seconds).
+
+    Arrivals (+1), departures (-1) and bucket edges (0) are sorted into one
+    event list and cumsummed, so the level is known after every event. A car
+    leaving as another arrives at the same instant is not counted twice.
+    """
+    import numpy as np
+    window_start, window_end = edges[0], edges[-1]
+    starts = np.clip(starts, window_start, window_end)
+    ends = np.clip(ends, window_start, window_end)
+    keep = ends > starts
+    starts, ends = starts[keep], ends[keep]
+
+    times = np.concatenate([ends, edges[:-1], starts])
+    deltas = np.concatenate([np.full(len(ends), -1), np.zeros(len(edges) - 1, dtype=int), np.ones(len(starts), dtype=int)])
+    order = np.lexsort((deltas, times))
+    times, deltas = times[order], deltas[order]
+    levels = np.cumsum(deltas)
+
+    # Every bucket contains its own edge event, which reduceat uses as the group start
+    bucket_starts = np.flatnonzero((order >= len(ends)) & (order < len(ends) + len(edges) - 1))
+    peaks = np.maximum.reduceat(levels, bucket_starts)
+
+    durations = np.diff(np.append(times, window_end))
+    buckets = np.searchsorted(edges, times, side='right') - 1
+    areas = np.bincount(np.clip(buckets, 0, len(edges) - 2), weights=levels * durations, minlength=len(edges) - 1)
+    return peaks, areas / np.diff(edges)
+
+
+def bucket_counts(times, edges, weights=None):
+    import numpy as np
+    buckets = np.searchsorted(edges, times, side='right') - 1
+    inside = (times >= edges[0]) & (times < edges[-1])
+    return np.bincount(buckets[inside], weights=None if weights is None else weights[inside], minlength=len(edges) - 1)
+
+
+def rollup_lot(lot, days, now=None):
+    """Daily and hourly analytics rows for consecutive `days` of one lot."""
+    import numpy as np
+    now = now or timezone.now()
+    edges, bucket_days = hour_boundaries(days)
+    window_start = datetime.fromtimestamp(edges[0], tz=dt_timezone.utc)
+    window_end = datetime.fromtimestamp(edges[-1], tz=dt_timezone.utc)
+
+    rows = list(
+        ParkingSession.objects.filter(parking_spot__parking_lot_id=lot.pk, start_time__lt=window_end)
+        .filter(Q(end_time__gt=window_start) | Q(end_time__isnull=True))
+        .exclude(status='cancelled')
+        .values_list('start_time', 'end_time', 'fee')
+        .iterator(chunk_size=2000)
+    )
+    now_ts = now.timestamp()
+    starts = np.fromiter((start.timestamp() for start, _, _ in rows), dtype=np.float64, count=len(rows))
+    ends = np.fromiter(((end.timestamp() if end else now_ts) for _, end, _ in rows), dtype=np.float64, count=len(rows))
+    fees = np.fromiter((float(fee or 0) for _, _, fee in rows), dtype=np.float64, count=len(rows))
+    paid = np.fromiter((end is not None for _, end, _ in rows), dtype=bool, count=len(rows))
+
+    peaks, averages = sweep_occupancy(starts, ends, edges)
+    arrivals = bucket_counts(starts, edges)
+    revenue = bucket_counts(ends[paid], edges, fees[paid])
+    capacity = max(lot.total_spots, 1)
+
+    hourly = []
+    for i, day in enumerate(bucket_days):
+        hourly.append(ParkingAnalyticsHourly(
+            parking_lot=lot,
+            hour=datetime.fromtimestamp(edges[i], tz=dt_timezone.utc),
+            total_vehicles=int(arrivals[i]),
+            peak_occupancy=int(peaks[i]),
+            average_occupancy=round(float(averages[i]) * 100 / capacity, 2),
+            revenue=Decimal(f'{revenue[i]:.2f}'),
+        ))
+
+    daily = []
+    bucket_days = np.array(bucket_days)
+    hour_seconds = np.diff(edges)
+    for day in days:
+        hours = bucket_days == day
+        daily.append(ParkingAnalytics(
+            parking_lot=lot,
+            date=day,
+            total_vehicles=int(arrivals[hours].sum()),
+            peak_hour_occupancy=int(peaks[hours].max()),
+            average_occupancy=round(float(np.average(averages[hours], weights=hour_seconds[hours])) * 100 / capacity, 2),
+            revenue=Decimal(f'{revenue[hours].sum():.2f}'),
+        ))
+    return daily, hourly
+
+
+def save_rollups(daily, hourly):
+    # Upserts keep reruns idempotent; bulk_create sends no post_save signals
+    ParkingAnalytics.objects.bulk_create(
+        daily, batch_size=500, update_conflicts=True, unique_fields=['parking_lot', 'date'],
+        update_fields=['total_vehicles', 'peak_hour_occupancy', 'average_occupancy', 'revenue'],
+    )
+    ParkingAnalyticsHourly.objects.bulk_create(
+        hourly, batch_size=500, update_conflicts=True, unique_fields=['parking_lot', 'hour'],
+        update_fields=['total_vehicles', 'peak_occupancy', 'average_occupancy', 'revenue'],
+    )
+
+
+def run_rollup(full=False, since=None, lot_ids=None):
+    """
+    Recompute analytics for every lot/day whose sessions changed since the
+    last run, or everything with `full`, or from the date `since`.
+    Returns {lot_id: number of days rolled up}.
+    """
+    started = timezone.now()
+    watermark = RollupWatermark.objects.filter(name=WATERMARK).first()
+    if full or since is not None or watermark is None:
+        changed_since = None
+    else:
+        changed_since = watermark.value - WATERMARK_OVERLAP
+
+    days = dirty_days(changed_since, started)
+    queued = list(RollupDirtyDay.objects.values_list('id', 'parking_lot_id', 'date'))
+    for _, lot_id, day in queued:
+        days.setdefault(lot_id, set()).add(day)
+    if since is not None:
+        days = {lot_id: {day for day in lot_days if day >= since} for lot_id, lot_days in days.items()}
+    if lot_ids:
+        days = {lot_id: lot_days for lot_id, lot_days in days.items() if lot_id in lot_ids}
+
+    touched = {}
+    for lot in ParkingLot.objects.filter(pk__in=[lot_id for lot_id, lot_days in days.items() if lot_days]):
+        for run in consecutive_runs(sorted(days[lot.pk])):
+            daily, hourly = rollup_lot(lot, run, started)
+            with transaction.atomic():
+                save_rollups(daily, hourly)
+            touched[lot.pk] = touched.get(lot.pk, 0) + len(run)
+
+    # Only the rows read above; days queued during this run wait for the next one
+    RollupDirtyDay.objects.filter(
+        id__in=[pk for pk, lot_id, day in queued if day in days.get(lot_id, ())]
+    ).delete()
+
+    if touched:
+        from .forecasting import get_model_registry
+        registry = get_model_registry()
+        for lot_id in touched:
+            registry.invalidate(lot_id)
+        bump_version(GLOBAL)
+
+    # A partial run must not move the watermark past lots it skipped
+    if not lot_ids and since is None:
+        RollupWatermark.objects.update_or_create(name=WATERMARK, defaults={'value': started})
+    return touched
@@ -1,65 +1,205 @@
 from rest_framework import serializers
+from rest_framework.serializers import LIST_SERIALIZER_KWARGS, LIST_SERIALIZER_KWARGS_REMOVE
 from .models import ParkingLot, ParkingSpot, Vehicle, ParkingSession, Reservation, ParkingAnalytics, Camera, LicensePlateLog
 from django.contrib.auth.models import User
+from .availability import summarize
+from .metrics import timed_serialization
 
-class UserSerializer(serializers.ModelSerializer):
+
+def parse_expand(value):
+    """Turn 'camera.parking_lot,vehicle' into {'camera': {'parking_lot': {}}, 'vehicle': {}}."""
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in path.strip().split('.'):
+            if name:
+                node = node.setdefault(name, {})
+    return tree
+
+
+def requested_expansions(request):
+    if request is None:
+        return {}
+    return parse_expand(request.query_params.get('expand', ''))
+
+
+def requested_fields(request):
+    if request is None or not request.query_params.get('fields'):
+        return None
+    return {name.strip() for name in request.query_params['fields'].split(',') if name.strip()}
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with timed_serialization(self.context.get('request')):
+            return super().data
+
+
+class ExpandableModelSerializer(serializers.ModelSerializer):
+    """
+    ModelSerializer that renders relations as IDs unless they are asked for
+    with ?expand=, e.g. ?expand=camera.parking_lot. The top-level serializer
+    also honours ?fields=id,status to return only those fields. Building
+    .data is timed into the request's metrics, for single objects and lists.
+
+    `expandable_fields` maps a field name to (serializer class, kwargs) used
+    when it is expanded. `prefetch` lists lookups the serializer itself reads
+    so views can prefetch them for every place it is nested.
+    """
+    expandable_fields = {}
+    prefetch = []
+
+    def __init__(self, *args, **kwargs):
+        expand = kwargs.pop('expand', None)
+        super().__init__(*args, **kwargs)
+        only = None
+        if expand is None:
+            # Only the top-level serializer reads the request
+            request = self.context.get('request')
+            expand = requested_expansions(request)
+            only = requested_fields(request)
+            if only is not None:
+                for name in set(self.fields) - only:
+                    self.fields.pop(name)
+        for name, nested in expand.items():
+            if name not in self.expandable_fields:
+                continue
+            serializer_class, options = self.expandable_fields[name]
+            # Reverse relations are not part of fields='__all__', so they only appear when expanded
+            if name in self.fields or (options.get('many') and (only is None or name in only)):
+                self.fields[name] = serializer_class(read_only=True, expand=nested, **options)
+
+    @property
+    def data(self):
+        with timed_serialization(self.context.get('request')):
+            return super().data
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        # DRF's, with a TimedListSerializer around the child
+        list_kwargs = {}
+        for key in LIST_SERIALIZER_KWARGS_REMOVE:
+            value = kwargs.pop(key, None)
+            if value is not None:
+                list_kwargs[key] = value
+        list_kwargs['child'] = cls(*args, **kwargs)
+        list_kwargs.update({key: value for key, value in kwargs.items() if key in LIST_SERIALIZER_KWARGS})
+        return TimedListSerializer(*args, **list_kwargs)
+
+    @classmethod
+    def related_lookups(cls, expand, prefix=''):
+        """Return (select_related, prefetch_related) lookups needed to render `expand` without extra queries."""
+        select, prefetch = [], [prefix + lookup for lookup in cls.prefetch]
+        model = cls.Meta.model
+        for name, nested in expand.items():
+            if name not in cls.expandable_fields:
+                continue
+            serializer_class, options = cls.expandable_fields[name]
+            field = model._meta.get_field(name)
+            lookup = prefix + name
+            if options.get('many') or field.many_to_many or field.one_to_many:
+                prefetch.append(lookup)
+                # Anything under a prefetched relation has to be prefetched too
+                nested_select, nested_prefetch = serializer_class.related_lookups(nested, lookup + '__')
+                prefetch.extend(nested_select + nested_prefetch)
+            else:
+                select.append(lookup)
+                nested_select, nested_prefetch = serializer_class.related_lookups(nested, lookup + '__')
+                select.extend(nested_select)
+                prefetch.extend(nested_prefetch)
+        return select, prefetch
+
+
+class UserSerializer(ExpandableModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'first_name', 'last_name')
 
-class VehicleSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
-    
+class VehicleSerializer(ExpandableModelSerializer):
+    expandable_fields = {
+        'user': (UserSerializer, {}),
+    }
+
     class Meta:
         model = Vehicle
         fields = '__all__'
+        read_only_fields = ('user',)
 
-class ParkingSpotSerializer(serializers.ModelSerializer):
+class ParkingSpotSerializer(ExpandableModelSerializer):
     class Meta:
         model = ParkingSpot
         fields = '__all__'
 
-class ParkingLotSerializer(serializers.ModelSerializer):
-    spots = ParkingSpotSerializer(many=True, read_only=True)
-    
+class ParkingLotSerializer(ExpandableModelSerializer):
+    availability = serializers.SerializerMethodField()
+    expandable_fields = {
+        'spots': (ParkingSpotSerializer, {'many': True}),
+    }
+    prefetch = ['status_counters']
+
     class Meta:
         model = ParkingLot
         fields = '__all__'
 
-class ParkingSessionSerializer(serializers.ModelSerializer):
-    vehicle = VehicleSerializer(read_only=True)
-    parking_spot = ParkingSpotSerializer(read_only=True)
-    
+    def get_availability(self, obj):
+        # Uses prefetched status_counters when the queryset provides them
+        return summarize(obj.status_counters.all())
+
+# Spots can expand back to their lot once ParkingLotSerializer exists
+ParkingSpotSerializer.expandable_fields = {
+    'parking_lot': (ParkingLotSerializer, {}),
+}
+
+class ParkingSessionSerializer(ExpandableModelSerializer):
+    expandable_fields = {
+        'vehicle': (VehicleSerializer, {}),
+        'parking_spot': (ParkingSpotSerializer, {}),
+    }
+
     class Meta:
         model = ParkingSession
         fields = '__all__'
+        read_only_fields = ('vehicle', 'parking_spot')
+
+class ReservationSerializer(ExpandableModelSerializer):
+    expandable_fields = {
+        'user': (UserSerializer, {}),
+        'vehicle': (VehicleSerializer, {}),
+        'parking_spot': (ParkingSpotSerializer, {}),
+    }
 
-class ReservationSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
-    vehicle = VehicleSerializer(read_only=True)
-    parking_spot = ParkingSpotSerializer(read_only=True)
-    
     class Meta:
         model = Reservation
         fields = '__all__'
+        read_only_fields = ('user', 'vehicle', 'parking_spot')
+
+class ParkingAnalyticsSerializer(ExpandableModelSerializer):
+    expandable_fields = {
+        'parking_lot': (ParkingLotSerializer, {}),
+    }
 
-class ParkingAnalyticsSerializer(serializers.ModelSerializer):
-    parking_lot = ParkingLotSerializer(read_only=True)
-    
     class Meta:
         model = ParkingAnalytics
         fields = '__all__'
+        read_only_fields = ('parking_lot',)
+
+class CameraSerializer(ExpandableModelSerializer):
+    expandable_fields = {
+        'parking_lot': (ParkingLotSerializer, {}),
+    }
 
-class CameraSerializer(serializers.ModelSerializer):
-    parking_lot = ParkingLotSerializer(read_only=True)
-    
     class Meta:
         model = Camera
         fields = '__all__'
+        read_only_fields = ('parking_lot',)
+
+class LicensePlateLogSerializer(ExpandableModelSerializer):
+    expandable_fields = {
+        'camera': (CameraSerializer, {}),
+    }
 
-class LicensePlateLogSerializer(serializers.ModelSerializer):
-    camera = CameraSerializer(read_only=True)
-    
     class Meta:
         model = LicensePlateLog
-        fields = '__all__' 
\ No newline at end of file
+        fields = '__all__'
+        read_only_fields = ('camera',)
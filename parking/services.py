@@ -1,132 +1,142 @@
-import cv2
-import numpy as np
-import easyocr
-from datetime import datetime
-import os
+from datetime import datetime, timezone as dt_timezone
+
 from django.conf import settings
+from django.db import IntegrityError
 from .models import Camera, LicensePlateLog, ParkingSession, Vehicle
+from .allocation import NoFreeSpot, get_allocator, start_session
+from .candidates import edge_contours, score_plate_candidates
+from .plates import get_plate_index
+from .motion import get_motion_gate
+from .tracking import get_plate_tracker
+from .writer import PlateLogWriter
 
 class LicensePlateRecognition:
-    def __init__(self):
-        self.reader = easyocr.Reader(['en'])
+    def __init__(self, writer=None):
+        # capture and ocr load the vision stack, so they are only imported once recognition runs
+        from .ocr import get_ocr_engine
+        self.ocr = get_ocr_engine()
+        self.writer = writer or PlateLogWriter(on_saved=self.process_license_plate_logs)
         
     def preprocess_image(self, image):
-        # Convert to grayscale
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # Apply bilateral filter to remove noise while keeping edges sharp
-        gray = cv2.bilateralFilter(gray, 11, 17, 17)
-        
-        # Edge detection
-        edged = cv2.Canny(gray, 30, 200)
-        
-        # Find contours
-        contours, _ = cv2.findContours(edged.copy(), cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        contours = sorted(contours, key=cv2.contourArea, reverse=True)[:10]
-        
-        return gray, contours
+        return edge_contours(image)
     
-    def detect_license_plate(self, image):
-        gray, contours = self.preprocess_image(image)
-        
-        for contour in contours:
-            peri = cv2.arcLength(contour, True)
-            approx = cv2.approxPolyDP(contour, 0.018 * peri, True)
-            
-            if len(approx) == 4:
-                x, y, w, h = cv2.boundingRect(contour)
-                plate_img = gray[y:y+h, x:x+w]
+    def locate_plates(self, image):
+        # Score every contour at once and keep only the most plate-like boxes
+        gray, edged, contours = self.preprocess_image(image)
+        boxes = score_plate_candidates(
+            edged, contours,
+            top_k=getattr(settings, 'ALPR_PLATE_TOP_K', 3),
+            aspect_range=getattr(settings, 'ALPR_PLATE_ASPECT_RANGE', (1.0, 6.0)),
+        )
+        return gray, boxes
+    
+    def find_plate_regions(self, image):
+        gray, boxes = self.locate_plates(image)
+        return [gray[y:y+h, x:x+w] for x, y, w, h in boxes]
+    
+    def read_plate(self, plate_imgs):
+        # OCR all plate regions in one batch and keep the first valid read, best candidate first
+        for plate_img, results in zip(plate_imgs, self.ocr.recognize(plate_imgs)):
+            if results:
+                text = results[0][1]
+                confidence = results[0][2]
                 
-                # OCR on the plate region
-                results = self.reader.readtext(plate_img)
+                # Clean up the text (remove spaces and special characters)
+                text = ''.join(c for c in text if c.isalnum())
                 
-                if results:
-                    text = results[0][1]
-                    confidence = results[0][2]
-                    
-                    # Clean up the text (remove spaces and special characters)
-                    text = ''.join(c for c in text if c.isalnum())
-                    
-                    if len(text) >= 5:  # Minimum length for a license plate
-                        return text, confidence, plate_img
+                if len(text) >= 5:  # Minimum length for a license plate
+                    return text, confidence, plate_img
         
         return None, None, None
     
-    def process_frame(self, camera):
+    def detect_license_plate(self, image):
+        return self.read_plate(self.find_plate_regions(image))
+    
+    def process_frame(self, camera, timeout=1.0):
         try:
-            # Connect to camera stream
-            cap = cv2.VideoCapture(f'rtsp://{camera.ip_address}:{camera.port}')
+            # Read the next frame from the camera's persistent capture worker
+            from .capture import get_capture_worker
+            worker = get_capture_worker(camera)
+            frame_time, frame = worker.read(timeout)
+            tracker = get_plate_tracker(camera)
             
-            if not cap.isOpened():
+            if frame is None:
+                # Close tracks even while the camera sends nothing
+                for track in tracker.expire():
+                    self.save_detection(camera, *track.best(), track.first_seen)
                 return False
             
-            ret, frame = cap.read()
-            if not ret:
-                return False
+            ready = []
             
-            # Detect license plate
-            plate_text, confidence, plate_img = self.detect_license_plate(frame)
-            
-            if plate_text and confidence > 0.5:  # Confidence threshold
-                # Save the plate image
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                filename = f'plate_{timestamp}.jpg'
-                filepath = os.path.join(settings.MEDIA_ROOT, 'license_plates', filename)
-                os.makedirs(os.path.dirname(filepath), exist_ok=True)
-                cv2.imwrite(filepath, plate_img)
-                
-                # Create log entry
-                log = LicensePlateLog.objects.create(
-                    camera=camera,
-                    license_plate=plate_text,
-                    confidence=confidence,
-                    image=f'license_plates/{filename}'
-                )
+            # Skip the expensive path when nothing moved in the lane, unless a
+            # vehicle is being tracked; a car stopped there must keep its track
+            moved = get_motion_gate(camera).should_process(frame)
+            if moved or tracker.has_open_tracks():
+                # Detect license plate
+                plate_text, confidence, plate_img = self.detect_license_plate(frame)
                 
-                # Process the log
-                self.process_license_plate_log(log)
+                if plate_text and confidence > 0.5:  # Confidence threshold
+                    ready = tracker.observe(plate_text, confidence, plate_img, frame_time)
+            
+            # Log each vehicle passage once, after voting across its frames
+            for track in ready + tracker.expire(frame_time):
+                self.save_detection(camera, *track.best(), track.first_seen)
             
-            cap.release()
             return True
             
         except Exception as e:
             print(f"Error processing camera {camera.name}: {str(e)}")
             return False
     
+    def save_detection(self, camera, plate_text, confidence, plate_img, frame_time=None):
+        # The writer saves the image and log in the background and then calls
+        # process_license_plate_logs with the created rows. The log keeps the
+        # frame's capture time, which sessions and fees are computed from
+        timestamp = datetime.fromtimestamp(frame_time, tz=dt_timezone.utc) if frame_time else None
+        self.writer.submit(camera, plate_text, confidence, plate_img, timestamp)
+    
+    def process_license_plate_logs(self, logs):
+        for log in logs:
+            self.process_license_plate_log(log)
+    
     def process_license_plate_log(self, log):
         if log.processed:
             return
         
-        # Find the vehicle
-        try:
-            vehicle = Vehicle.objects.get(license_plate=log.license_plate)
+        # Match the read against registered plates, tolerating OCR confusions
+        match = get_plate_index().lookup(log.license_plate)
+        if match is None:
+            print(f"Vehicle not found for license plate: {log.license_plate}")
+            return
+        
+        if log.log_type == 'check_in':
+            # Allocate a spot suited to the vehicle and open its session
+            vehicle = Vehicle.objects.only('id', 'user', 'needs_handicap_spot', 'is_electric').get(pk=match.vehicle_id)
+            try:
+                start_session(vehicle, log.camera.parking_lot_id, log.timestamp)
+            except NoFreeSpot:
+                print(f"No free spot for license plate: {log.license_plate}")
+            except IntegrityError:
+                print(f"Vehicle already has an active session: {log.license_plate}")
+        elif log.log_type == 'check_out':
+            # End active parking session
+            active_session = ParkingSession.objects.filter(
+                vehicle_id=match.vehicle_id,
+                status='active'
+            ).first()
             
-            if log.log_type == 'check_in':
-                # Create new parking session
-                ParkingSession.objects.create(
-                    vehicle=vehicle,
-                    parking_spot=camera.parking_lot.spots.filter(status='available').first(),
-                    start_time=log.timestamp
-                )
-            elif log.log_type == 'check_out':
-                # End active parking session
-                active_session = ParkingSession.objects.filter(
-                    vehicle=vehicle,
-                    status='active'
-                ).first()
+            if active_session:
+                active_session.end_time = log.timestamp
+                active_session.status = 'completed'
                 
-                if active_session:
-                    active_session.end_time = log.timestamp
-                    active_session.status = 'completed'
-                    
-                    # Calculate fee
-                    duration = active_session.end_time - active_session.start_time
-                    hours = duration.total_seconds() / 3600
-                    active_session.fee = round(hours * 2, 2)  # $2 per hour
-                    active_session.save()
-            
-            log.processed = True
-            log.save()
-            
-        except Vehicle.DoesNotExist:
-            print(f"Vehicle not found for license plate: {log.license_plate}") 
\ No newline at end of file
+                # Calculate fee
+                duration = active_session.end_time - active_session.start_time
+                hours = duration.total_seconds() / 3600
+                active_session.fee = round(hours * 2, 2)  # $2 per hour
+                active_session.save()
+                
+                # Hand the spot back to the allocator
+                get_allocator().release(active_session.parking_spot_id)
+        
+        log.processed = True
+        log.save()
@@ -0,0 +1,112 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .availability import record_transition, spot_key
+from .dashboard import GLOBAL, bump_version
+from .http_cache import lot_changed
+from .plates import vehicle_deleted, vehicle_saved
+from .rollups import mark_dirty
+from .models import ParkingAnalytics, ParkingLot, ParkingSession, ParkingSpot, Reservation, Vehicle
+
+AVAILABILITY_FIELDS = ('parking_lot_id', 'status', 'is_handicap', 'is_ev_charging')
+ROLLUP_FIELDS = ('parking_spot_id', 'start_time', 'end_time', 'status')
+
+
+@receiver([post_save, post_delete], sender=ParkingAnalytics)
+def invalidate_occupancy_model(sender, instance, **kwargs):
+    from .forecasting import get_model_registry
+    get_model_registry().invalidate(instance.parking_lot_id)
+    bump_version(GLOBAL)
+
+
+@receiver([post_save, post_delete], sender=ParkingSession)
+def invalidate_session_dashboard(sender, instance, **kwargs):
+    if ParkingSession.vehicle.is_cached(instance):
+        user_id = instance.vehicle.user_id
+    else:
+        user_id = Vehicle.objects.filter(pk=instance.vehicle_id).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        bump_version(f'user:{user_id}')
+
+
+def spot_lot_id(spot_id):
+    return ParkingSpot.objects.filter(pk=spot_id).values_list('parking_lot_id', flat=True).first()
+
+
+@receiver(post_init, sender=ParkingSession)
+def remember_session_days(sender, instance, **kwargs):
+    loaded = all(field in instance.__dict__ for field in ROLLUP_FIELDS)
+    instance._rollup_key = tuple(getattr(instance, field) for field in ROLLUP_FIELDS) if instance.pk and loaded else None
+
+
+@receiver(post_save, sender=ParkingSession)
+def queue_moved_session_days(sender, instance, created, **kwargs):
+    # The rollup finds the session's new days by updated_at, but not the ones it left
+    old = getattr(instance, '_rollup_key', None)
+    instance._rollup_key = tuple(getattr(instance, field) for field in ROLLUP_FIELDS)
+    if created or old is None:
+        return
+    spot_id, start, end, status = old
+    moved = spot_id != instance.parking_spot_id or start != instance.start_time
+    # Ending an active session keeps its days within what dirty_days() already covers
+    end_changed = end is not None and end != instance.end_time
+    if status != 'cancelled' and (moved or end_changed):
+        mark_dirty(spot_lot_id(spot_id), start, end)
+
+
+@receiver(post_delete, sender=ParkingSession)
+def queue_deleted_session_days(sender, instance, origin=None, **kwargs):
+    # A deleted lot takes its analytics with it
+    if isinstance(origin, ParkingLot) or getattr(origin, 'model', None) is ParkingLot:
+        return
+    if instance.status != 'cancelled':
+        mark_dirty(spot_lot_id(instance.parking_spot_id), instance.start_time, instance.end_time)
+
+
+@receiver([post_save, post_delete], sender=Reservation)
+@receiver([post_save, post_delete], sender=Vehicle)
+def invalidate_user_dashboard(sender, instance, **kwargs):
+    bump_version(f'user:{instance.user_id}')
+
+
+@receiver([post_save, post_delete], sender=ParkingLot)
+def invalidate_lot_responses(sender, instance, **kwargs):
+    lot_changed(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=ParkingSpot)
+def invalidate_spot_responses(sender, instance, **kwargs):
+    lot_changed(instance.parking_lot_id)
+
+
+@receiver(post_init, sender=ParkingSpot)
+def remember_spot_state(sender, instance, **kwargs):
+    # Deferred fields would cost a query each; such spots are left to reconcile
+    loaded = all(field in instance.__dict__ for field in AVAILABILITY_FIELDS)
+    instance._availability_key = spot_key(instance) if instance.pk and loaded else None
+
+
+@receiver(post_save, sender=ParkingSpot)
+def update_spot_counters(sender, instance, created, **kwargs):
+    new_key = spot_key(instance)
+    if created or instance._availability_key is not None:
+        record_transition(None if created else instance._availability_key, new_key)
+    instance._availability_key = new_key
+
+
+@receiver(post_delete, sender=ParkingSpot)
+def remove_spot_counters(sender, instance, origin=None, **kwargs):
+    # Deleting a lot cascades to its counters too; recreating them here would point at the deleted lot
+    if isinstance(origin, ParkingLot) or getattr(origin, 'model', None) is ParkingLot:
+        return
+    record_transition(instance._availability_key or spot_key(instance), None)
+
+
+@receiver(post_save, sender=Vehicle)
+def index_vehicle_plate(sender, instance, **kwargs):
+    vehicle_saved(instance)
+
+
+@receiver(post_delete, sender=Vehicle)
+def unindex_vehicle_plate(sender, instance, **kwargs):
+    vehicle_deleted(instance)
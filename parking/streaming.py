@@ -0,0 +1,269 @@
+import asyncio
+import json
+import time
+import traceback
+from datetime import timedelta
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections
+from django.db.models import Count
+from django.http.cookie import parse_cookie
+from django.utils import timezone
+
+from .availability import summarize_rows
+from .models import ParkingLot, ParkingSpot
+
+SPOT_FIELDS = ('id', 'parking_lot_id', 'spot_number', 'status', 'is_handicap', 'is_ev_charging', 'updated_at')
+
+
+def spot_state(row):
+    return {
+        'spot_number': row['spot_number'],
+        'status': row['status'],
+        'is_handicap': row['is_handicap'],
+        'is_ev_charging': row['is_ev_charging'],
+    }
+
+
+def format_event(event, data, event_id=None):
+    message = f'event: {event}\n'
+    if event_id is not None:
+        message += f'id: {event_id}\n'
+    return (message + f'data: {json.dumps(data)}\n\n').encode()
+
+
+class LotChannel:
+    def __init__(self, lot_id, spots):
+        self.lot_id = lot_id
+        self.spots = spots
+        self.sequence = 0
+        self.subscribers = set()
+
+    def availability(self):
+        return summarize_rows(
+            (spot['status'], spot['is_handicap'], spot['is_ev_charging'], 1) for spot in self.spots.values()
+        )
+
+    def snapshot(self):
+        return format_event('snapshot', {
+            'parking_lot': self.lot_id,
+            'spots': self.spots,
+            'availability': self.availability(),
+        }, self.sequence)
+
+
+class AvailabilityBroker:
+    """
+    In-memory fan-out of spot status changes to SSE subscribers, per process.
+
+    One poller per process reads spots changed since its last pass, only for
+    lots somebody is watching, so database load does not grow with the
+    number of subscribers. Changes within one `poll_interval` are coalesced
+    into a single delta per lot. That delta is serialized once and queued for
+    every subscriber. A subscriber whose queue is full gets a fresh snapshot
+    instead of the deltas it missed. Deleted spots are found by comparing
+    spot counts and sent as null.
+    """
+
+    def __init__(self, poll_interval=1.0, queue_size=16):
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.channels = {}
+        self.watermark = None
+        self.poller = None
+        self.lock = asyncio.Lock()
+
+    async def subscribe(self, lot_id):
+        async with self.lock:
+            channel = self.channels.get(lot_id)
+            if channel is None:
+                spots = await sync_to_async(self.load_spots)(lot_id)
+                if spots is None:
+                    return None
+                channel = self.channels[lot_id] = LotChannel(lot_id, spots)
+            queue = asyncio.Queue(self.queue_size)
+            queue.put_nowait(channel.snapshot())
+            channel.subscribers.add(queue)
+            if self.poller is None or self.poller.done():
+                self.watermark = timezone.now()
+                self.poller = asyncio.create_task(self.poll())
+            return queue
+
+    def unsubscribe(self, lot_id, queue):
+        channel = self.channels.get(lot_id)
+        if channel is not None:
+            channel.subscribers.discard(queue)
+            if not channel.subscribers:
+                del self.channels[lot_id]
+
+    def load_spots(self, lot_id):
+        if not ParkingLot.objects.filter(pk=lot_id).exists():
+            return None
+        return {
+            row['id']: spot_state(row)
+            for row in ParkingSpot.objects.filter(parking_lot_id=lot_id).values(*SPOT_FIELDS)
+        }
+
+    def changed_spots(self, lot_ids, since):
+        # A small overlap guards against rows committed just behind the watermark
+        return list(
+            ParkingSpot.objects.filter(parking_lot_id__in=lot_ids, updated_at__gte=since - timedelta(seconds=1))
+            .values(*SPOT_FIELDS)
+        )
+
+    def spot_ids(self, lot_ids):
+        return {
+            lot_id: set(ParkingSpot.objects.filter(parking_lot_id=lot_id).values_list('id', flat=True))
+            for lot_id in lot_ids
+        }
+
+    def spot_counts(self, lot_ids):
+        return dict(
+            ParkingSpot.objects.filter(parking_lot_id__in=lot_ids).values('parking_lot_id')
+            .annotate(count=Count('id')).values_list('parking_lot_id', 'count')
+        )
+
+    def load_changes(self, known, since):
+        """
+        (changed spot rows, {lot_id: current spot ids} for lots that lost spots),
+        given {lot_id: spot ids the channel knows}.
+        """
+        lot_ids = list(known)
+        rows = self.changed_spots(lot_ids, since)
+        for row in rows:
+            known.get(row['parking_lot_id'], set()).add(row['id'])
+        counts = self.spot_counts(lot_ids)
+        # Only lots whose count no longer matches pay for listing their ids
+        shrunk = [lot_id for lot_id, ids in known.items() if len(ids) != counts.get(lot_id, 0)]
+        return rows, self.spot_ids(shrunk) if shrunk else {}
+
+    async def poll(self):
+        while self.channels:
+            await asyncio.sleep(self.poll_interval)
+            known = {lot_id: set(channel.spots) for lot_id, channel in self.channels.items()}
+            if not known:
+                break
+            started = timezone.now()
+            try:
+                rows, remaining = await sync_to_async(self.load_changes)(known, self.watermark)
+            except Exception:
+                # Keep the watermark so the next pass retries the same window
+                print(f"Error polling spot changes, retrying:\n{traceback.format_exc()}")
+                await sync_to_async(close_old_connections)()
+                continue
+            self.watermark = started
+            self.publish(rows, remaining)
+
+    def publish(self, rows, remaining=None):
+        changes = {}
+        for row in rows:
+            channel = self.channels.get(row['parking_lot_id'])
+            if channel is None:
+                continue
+            state = spot_state(row)
+            if channel.spots.get(row['id']) != state:
+                channel.spots[row['id']] = state
+                changes.setdefault(channel.lot_id, {})[row['id']] = state
+        for lot_id, ids in (remaining or {}).items():
+            channel = self.channels.get(lot_id)
+            if channel is None:
+                continue
+            for spot_id in set(channel.spots) - ids:
+                del channel.spots[spot_id]
+                changes.setdefault(lot_id, {})[spot_id] = None
+
+        for lot_id, spots in changes.items():
+            channel = self.channels[lot_id]
+            channel.sequence += 1
+            message = format_event('delta', {
+                'parking_lot': lot_id,
+                'spots': spots,
+                'availability': channel.availability(),
+                'sent_at': time.time(),
+            }, channel.sequence)
+            for queue in channel.subscribers:
+                try:
+                    queue.put_nowait(message)
+                except asyncio.QueueFull:
+                    # Too far behind: replace the backlog with a fresh snapshot
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(channel.snapshot())
+
+
+broker = AvailabilityBroker(
+    poll_interval=getattr(settings, 'AVAILABILITY_STREAM_POLL_INTERVAL', 1.0),
+    queue_size=getattr(settings, 'AVAILABILITY_STREAM_QUEUE_SIZE', 16),
+)
+
+
+class SessionRequest:
+    # Just enough of a request for django.contrib.auth.get_user()
+    def __init__(self, session):
+        self.session = session
+
+
+def session_user(scope):
+    """The user logged in through the session cookie of an ASGI request, or AnonymousUser."""
+    cookies = {}
+    for name, value in scope.get('headers', []):
+        if name == b'cookie':
+            cookies.update(parse_cookie(value.decode('latin-1')))
+    engine = import_module(settings.SESSION_ENGINE)
+    session = engine.SessionStore(cookies.get(settings.SESSION_COOKIE_NAME))
+    user = get_user(SessionRequest(session))
+    close_old_connections()
+    return user
+
+
+async def respond(send, status, body):
+    await send({'type': 'http.response.start', 'status': status, 'headers': [(b'content-type', b'text/plain')]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def availability_stream(scope, receive, send, lot_id):
+    """ASGI handler streaming a snapshot and then deltas for one lot as Server-Sent Events."""
+    # Served outside Django's middleware, so check the login like parking_lot_detail does
+    user = await sync_to_async(session_user)(scope)
+    if not user.is_authenticated:
+        return await respond(send, 401, b'Authentication required')
+
+    queue = await broker.subscribe(lot_id)
+    if queue is None:
+        return await respond(send, 404, b'Parking lot not found')
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+
+    async def wait_for_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    disconnected = asyncio.create_task(wait_for_disconnect())
+    heartbeat = getattr(settings, 'AVAILABILITY_STREAM_HEARTBEAT', 15.0)
+    try:
+        while not disconnected.done():
+            next_message = asyncio.create_task(queue.get())
+            done, _ = await asyncio.wait({next_message, disconnected}, timeout=heartbeat,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if next_message in done:
+                await send({'type': 'http.response.body', 'body': next_message.result(), 'more_body': True})
+            else:
+                next_message.cancel()
+                if not disconnected.done():
+                    await send({'type': 'http.response.body', 'body': b': keep-alive\n\n', 'more_body': True})
+    except OSError:
+        pass
+    finally:
+        disconnected.cancel()
+        broker.unsubscribe(lot_id, queue)
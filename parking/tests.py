@@ -1,3 +1,776 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import motion, query_plans, tracking
+from .allocation import SpotAllocator, get_allocator, start_session
+from .availability import lot_availability
+from .capture import CaptureWorker, FrameRingBuffer, SyntheticFrameSource
+from .forecasting import get_model_registry
+from .metrics import REQUEST_QUERIES, SERIALIZE_SECONDS, serve_metrics
+from .models import (
+    Camera, LicensePlateLog, ParkingAnalytics, ParkingLot, ParkingSession, ParkingSpot, Reservation,
+    SpotStatusCounter, Vehicle,
+)
+from .ocr import OCREngine
+from .pipeline import RecognitionPipeline
+from .plates import PlateIndex
+from .reservations import ReservationConflict, book_spot, free_spots, overlapping_reservations
+from .rollups import local_day, run_rollup
+from .tracking import PlateTracker
+from .writer import PlateLogWriter
+
+# Analytics writes mark occupancy models stale and the ALPR writer spools and
+# saves plate images to disk; keep all of it out of the source tree
+TEST_FILES = tempfile.mkdtemp(prefix='parking-tests-')
+isolated_files = override_settings(
+    OCCUPANCY_MODEL_DIR=os.path.join(TEST_FILES, 'ml_models'),
+    ALPR_WRITER_SPOOL=os.path.join(TEST_FILES, 'spool', 'plate_logs.jsonl'),
+    MEDIA_ROOT=os.path.join(TEST_FILES, 'media'),
+)
+
+
+def setUpModule():
+    isolated_files.enable()
+
+
+def tearDownModule():
+    isolated_files.disable()
+    shutil.rmtree(TEST_FILES, ignore_errors=True)
+
+
+class ExpandQueryCountTests(TestCase):
+    """?expand= renders related rows from select/prefetch, so queries do not grow with the page."""
+
+    cases = [
+        ('/api/api/parking-lots/', 'spots'),
+        ('/api/api/parking-spots/', 'parking_lot'),
+        ('/api/api/vehicles/', 'user'),
+        ('/api/api/parking-sessions/', 'vehicle.user,parking_spot.parking_lot'),
+        ('/api/api/reservations/', 'user,vehicle,parking_spot.parking_lot'),
+        ('/api/api/analytics/', 'parking_lot'),
+    ]
+
+    def setUp(self):
+        self.user = User.objects.create_user('expand', password='-')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.rows = 0
+
+    def add_rows(self, count):
+        now = timezone.now()
+        for _ in range(count):
+            i = self.rows
+            self.rows += 1
+            lot = ParkingLot.objects.create(name=f'Lot {i}', total_spots=1, location='-')
+            spot = ParkingSpot.objects.create(parking_lot=lot, spot_number='1')
+            vehicle = Vehicle.objects.create(user=self.user, license_plate=f'EXP{i}', vehicle_type='car',
+                                             brand='-', model='-', color='-')
+            ParkingSession.objects.create(vehicle=vehicle, parking_spot=spot, start_time=now)
+            Reservation.objects.create(user=self.user, vehicle=vehicle, parking_spot=spot,
+                                       start_time=now + timedelta(hours=1), end_time=now + timedelta(hours=2))
+            ParkingAnalytics.objects.create(parking_lot=lot, date=now.date(), total_vehicles=1,
+                                            peak_hour_occupancy=1, average_occupancy=1.0, revenue=Decimal('1'))
+
+    def queries(self, url):
+        # Cached responses would skip the queries being counted
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content[:200])
+        return len(context), len(response.json()['results'])
+
+    def test_lots_expand_their_spots(self):
+        self.add_rows(2)
+        lots = self.client.get('/api/api/parking-lots/').json()['results']
+        self.assertNotIn('spots', lots[0])
+        lots = self.client.get('/api/api/parking-lots/?expand=spots').json()['results']
+        self.assertEqual([[spot['spot_number'] for spot in lot['spots']] for lot in lots], [['1'], ['1']])
+        lot = self.client.get(f"/api/api/parking-lots/{lots[0]['id']}/?expand=spots").json()
+        self.assertEqual(len(lot['spots']), 1)
+
+    def test_queries_do_not_grow_with_rows(self):
+        self.add_rows(1)
+        single = {}
+        for path, expand in self.cases:
+            url = f'{path}?expand={expand}'
+            single[url], rows = self.queries(url)
+            self.assertEqual(rows, 1, url)
+
+        self.add_rows(9)
+        for url, expected in single.items():
+            with self.subTest(url=url):
+                count, rows = self.queries(url)
+                self.assertEqual(rows, 10)
+                self.assertEqual(count, expected)
+
+
+class DateFilterTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('filters', password='-'))
+
+    def test_impossible_dates_are_rejected(self):
+        for value in ('2024-02-30', '2024-13-45', '2024-01-01T25:00', 'yesterday'):
+            for url in ('/api/api/parking-sessions/', '/api/api/analytics/'):
+                with self.subTest(url=url, value=value):
+                    response = self.client.get(url, {'since': value})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('since', response.json())
+
+    def test_valid_dates_filter(self):
+        response = self.client.get('/api/api/parking-sessions/', {'since': '2024-02-29', 'until': '2024-03-01T12:00+00:00'})
+        self.assertEqual(response.status_code, 200)
+
+
+class ExportStreamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('export', password='-', is_staff=True)
+        lot = ParkingLot.objects.create(name='Export', total_spots=1, location='-')
+        spot = ParkingSpot.objects.create(parking_lot=lot, spot_number='1')
+        vehicle = Vehicle.objects.create(user=self.user, license_plate='EXPORT', vehicle_type='car',
+                                         brand='-', model='-', color='-')
+        ParkingSession.objects.bulk_create(
+            ParkingSession(vehicle=vehicle, parking_spot=spot, start_time=timezone.now(), status='completed')
+            for _ in range(1200)
+        )
+
+    async def test_asgi_export_is_an_async_stream(self):
+        from django.test import AsyncClient
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        response = await client.get('/api/api/export/sessions/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        # Several chunks of rows, not one buffered body
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(b''.join(chunks).count(b'\n'), 1201)
+
+    def test_wsgi_export_streams(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/api/api/export/sessions/', {'format': 'ndjson'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.is_async)
+        self.assertEqual(b''.join(response.streaming_content).count(b'\n'), 1200)
+
+
+class QueryPlanTests(TestCase):
+    """Hot queries keep using their indexes (manage.py check_query_plans prints the plans)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seed = query_plans.seed(2000)
+
+    def test_hot_queries_use_their_indexes(self):
+        query_plans.prefer_indexes()
+        for label, queryset, indexes in query_plans.hot_queries(self.seed):
+            with self.subTest(label):
+                used, plan = query_plans.indexes_used(queryset, indexes)
+                self.assertTrue(used, f'expected one of {indexes}: {plan}')
+
+
+class ImportGraphTests(SimpleTestCase):
+    """Web workers never load the ML and vision stack (manage.py check_import_graph prints the import times)."""
+
+    def test_web_workers_skip_heavy_modules(self):
+        call_command('check_import_graph', stdout=StringIO())
+
+
+class SpotAllocatorTests(TransactionTestCase):
+    """Real commits, so concurrent allocations go through the database checks and not one test transaction."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('allocator', password='-')
+        self.lot = ParkingLot.objects.create(name='Allocator', total_spots=30, location='-')
+        for i in range(30):
+            ParkingSpot.objects.create(parking_lot=self.lot, spot_number=str(i), is_ev_charging=i % 3 == 0)
+
+    def test_parallel_allocations_never_share_a_spot(self):
+        allocator = SpotAllocator()
+        results, errors = [], []
+
+        def worker():
+            try:
+                for _ in range(6):
+                    results.append(allocator.allocate(self.lot.pk))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        spot_ids = [spot_id for spot_id in results if spot_id is not None]
+        # 48 requests for 30 spots: every spot handed out exactly once, the rest told the lot is full
+        self.assertEqual(len(spot_ids), 30)
+        self.assertEqual(len(set(spot_ids)), 30)
+        self.assertEqual(ParkingSpot.objects.filter(parking_lot=self.lot, status='occupied').count(), 30)
+        self.assertEqual(lot_availability(self.lot.pk)['available_spots'], 0)
+
+    def test_allocators_in_other_processes_never_share_a_spot(self):
+        # Each allocator loads the same free set, like two workers would
+        first, second = SpotAllocator(), SpotAllocator()
+        spot_ids = []
+        for _ in range(15):
+            spot_ids.append(first.allocate(self.lot.pk))
+            spot_ids.append(second.allocate(self.lot.pk))
+        self.assertNotIn(None, spot_ids)
+        self.assertEqual(len(set(spot_ids)), 30)
+        self.assertIsNone(first.allocate(self.lot.pk))
+        self.assertIsNone(second.allocate(self.lot.pk))
+
+    def test_end_session_releases_the_spot(self):
+        vehicle = Vehicle.objects.create(user=self.user, license_plate='ALLOC1', vehicle_type='car',
+                                         brand='-', model='-', color='-')
+        session = start_session(vehicle, self.lot.pk, timezone.now())
+        spot = ParkingSpot.objects.get(pk=session.parking_spot_id)
+        self.assertEqual(spot.status, 'occupied')
+        self.assertEqual(lot_availability(self.lot.pk)['available_spots'], 29)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(f'/api/api/parking-sessions/{session.pk}/end_session/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'completed')
+        spot.refresh_from_db()
+        self.assertEqual(spot.status, 'available')
+        self.assertEqual(lot_availability(self.lot.pk)['available_spots'], 30)
+
+        # The freed spot can be handed out again
+        claimed = [get_allocator().allocate(self.lot.pk, is_electric=spot.is_ev_charging) for _ in range(30)]
+        self.assertIn(spot.pk, claimed)
+
+    def test_ending_a_session_twice_keeps_the_next_session_spot(self):
+        first, second = [
+            Vehicle.objects.create(user=self.user, license_plate=f'TWICE{i}', vehicle_type='car',
+                                   brand='-', model='-', color='-')
+            for i in range(2)
+        ]
+        allocator = SpotAllocator()
+        session = start_session(first, self.lot.pk, timezone.now(), allocator=allocator)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = f'/api/api/parking-sessions/{session.pk}/end_session/'
+        self.assertEqual(client.post(url).status_code, 200)
+        fee = ParkingSession.objects.get(pk=session.pk).fee
+
+        # Take every other spot, so the next vehicle is sure to get the one just freed
+        others = ParkingSpot.objects.filter(parking_lot=self.lot, status='available').exclude(pk=session.parking_spot_id)
+        for spot in others:
+            self.assertTrue(allocator.claim(spot.pk, self.lot.pk, (spot.is_handicap, spot.is_ev_charging)))
+        next_session = start_session(second, self.lot.pk, timezone.now(), allocator=allocator)
+        self.assertEqual(next_session.parking_spot_id, session.parking_spot_id)
+
+        self.assertEqual(client.post(url).status_code, 400)
+        self.assertEqual(ParkingSpot.objects.get(pk=session.parking_spot_id).status, 'occupied')
+        self.assertEqual(ParkingSession.objects.get(pk=session.pk).fee, fee)
+
+
+class ReservationBookingTests(TransactionTestCase):
+    def setUp(self):
+        self.lot = ParkingLot.objects.create(name='Bookings', total_spots=1, location='-')
+        self.spot = ParkingSpot.objects.create(parking_lot=self.lot, spot_number='1')
+        self.users = [User.objects.create_user(f'booking{i}', password='-') for i in range(2)]
+        self.vehicles = [
+            Vehicle.objects.create(user=user, license_plate=f'BOOK{i}', vehicle_type='car', brand='-', model='-', color='-')
+            for i, user in enumerate(self.users)
+        ]
+
+    def test_last_spot_is_booked_once(self):
+        start = timezone.now() + timedelta(hours=1)
+        end = start + timedelta(hours=2)
+        ready = threading.Barrier(2)
+        booked, conflicts, errors = [], [], []
+
+        def slow_overlaps(*args):
+            # Both threads would check before either inserts, were the check not serialized
+            time.sleep(0.2)
+            return overlapping_reservations(*args)
+
+        def worker(i):
+            try:
+                ready.wait()
+                booked.append(book_spot(self.users[i], self.vehicles[i], self.spot, start, end))
+            except ReservationConflict as e:
+                conflicts.append(e)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        with mock.patch('parking.reservations.overlapping_reservations', slow_overlaps):
+            threads = [threading.Thread(target=worker, args=(i,)) for i in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(booked), 1)
+        self.assertEqual(len(conflicts), 1)
+        self.assertEqual(Reservation.objects.filter(parking_spot=self.spot).count(), 1)
+        self.assertFalse(free_spots(start, end, self.lot).exists())
+
+
+class GateEventTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('gate', password='-', is_staff=True)
+        lot = ParkingLot.objects.create(name='Gate', total_spots=2, location='-')
+        self.camera = Camera.objects.create(name='Gate', location='-', ip_address='127.0.0.1', parking_lot=lot)
+        for i in range(2):
+            ParkingSpot.objects.create(parking_lot=lot, spot_number=str(i))
+        Vehicle.objects.create(user=self.user, license_plate='51A12345', vehicle_type='car',
+                               brand='-', model='-', color='-')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, events):
+        return self.client.post('/api/api/gate-events/bulk/', json.dumps({'events': events}),
+                                content_type='application/json')
+
+    def events(self, log_type):
+        return [
+            {'idempotency_key': f'{log_type}-1', 'camera': self.camera.pk, 'license_plate': '51A12345',
+             'log_type': log_type, 'confidence': 0.9},
+            {'idempotency_key': f'{log_type}-bad', 'camera': self.camera.pk, 'log_type': log_type},
+        ]
+
+    def test_check_in_and_out(self):
+        results = self.post(self.events('check_in')).json()['results']
+        self.assertEqual(results[0]['outcome'], 'checked_in')
+        self.assertEqual(results[1]['status'], 'rejected')
+        self.assertEqual(self.post(self.events('check_in')).json()['results'][0]['status'], 'duplicate')
+        results = self.post(self.events('check_out')).json()['results']
+        self.assertEqual(results[0]['outcome'], 'checked_out')
+        self.assertFalse(ParkingSession.objects.filter(status='active').exists())
+
+    def test_repeated_conflicts_reject_the_batch(self):
+        with mock.patch('parking.gate_events._ingest', side_effect=IntegrityError('conflict')) as ingest:
+            response = self.post(self.events('check_in'))
+        self.assertEqual(ingest.call_count, 2)
+        self.assertEqual(response.status_code, 200)
+        first, invalid = response.json()['results']
+        self.assertEqual(first['status'], 'rejected')
+        self.assertIn('non_field_errors', first['errors'])
+        # Validation errors are still reported as such
+        self.assertIn('license_plate', invalid['errors'])
+
+
+class MetricsViewTests(TestCase):
+    def test_needs_staff_without_a_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.client.force_login(User.objects.create_user('metrics', password='-'))
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.client.force_login(User.objects.create_user('metrics-staff', password='-', is_staff=True))
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def observed(self, histogram):
+        # The registry is process-wide, so compare counts before and after a request
+        return list(histogram.values.get(('parkinglot-list',), [0, 0.0, 0])[-2:])
+
+    @override_settings(METRICS_SLOW_REQUEST_SECONDS=0, METRICS_SAMPLE_RATE=1.0)
+    def test_serializer_time_and_slow_requests_are_recorded(self):
+        self.client.force_login(User.objects.create_user('metrics-lots', password='-'))
+        ParkingLot.objects.create(name='Metrics', total_spots=1, location='-')
+        # Cached lot data would skip the serializer
+        cache.clear()
+        _, before = self.observed(SERIALIZE_SECONDS)
+        with self.assertLogs('parking.metrics', 'WARNING') as logs:
+            response = self.client.get('/api/api/parking-lots/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.observed(SERIALIZE_SECONDS)[1], before + 1)
+        self.assertIn('Slow request: GET /api/api/parking-lots/', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    @override_settings(METRICS_SAMPLE_RATE=1.0)
+    async def test_asgi_requests_record_their_sql(self):
+        from django.test import AsyncClient
+        client = AsyncClient()
+        await client.aforce_login(await User.objects.acreate(username='metrics-async'))
+        queries_before, requests_before = self.observed(REQUEST_QUERIES)
+        response = await client.get('/api/api/parking-lots/')
+        self.assertEqual(response.status_code, 200)
+        queries, requests = self.observed(REQUEST_QUERIES)
+        # Sampled, and the queries that ran on the sync thread were seen
+        self.assertEqual(requests, requests_before + 1)
+        self.assertGreater(queries, queries_before)
+
+    def test_alpr_server_is_local_and_checks_the_token(self):
+        server = serve_metrics(0, lambda: 'alpr_up 1\n', token='secret')
+        try:
+            host, port = server.server_address
+            self.assertEqual(host, '127.0.0.1')
+            with self.assertRaises(HTTPError) as error:
+                urlopen(f'http://127.0.0.1:{port}/metrics', timeout=5)
+            self.assertEqual(error.exception.code, 403)
+            request = Request(f'http://127.0.0.1:{port}/metrics', headers={'Authorization': 'Bearer secret'})
+            self.assertEqual(urlopen(request, timeout=5).read(), b'alpr_up 1\n')
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class SpotCounterTests(TestCase):
+    def setUp(self):
+        self.lot = ParkingLot.objects.create(name='Counters', total_spots=3, location='-')
+        self.spots = [ParkingSpot.objects.create(parking_lot=self.lot, spot_number=str(i)) for i in range(3)]
+
+    def test_spot_changes_move_counters(self):
+        spot = self.spots[0]
+        spot.status = 'maintenance'
+        spot.save()
+        self.spots[1].delete()
+        availability = lot_availability(self.lot.pk)
+        self.assertEqual(availability['available_spots'], 1)
+        self.assertEqual(availability['by_status']['maintenance'], 1)
+        self.assertEqual(availability['total_spots'], 2)
+
+    def test_deleting_a_lot_leaves_no_counters(self):
+        self.lot.delete()
+        self.assertFalse(SpotStatusCounter.objects.exists())
+        lot = ParkingLot.objects.create(name='Counters', total_spots=1, location='-')
+        ParkingSpot.objects.create(parking_lot=lot, spot_number='1')
+        ParkingLot.objects.filter(pk=lot.pk).delete()
+        self.assertFalse(SpotStatusCounter.objects.exists())
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('etags', password='-'))
+        self.lot = ParkingLot.objects.create(name='ETags', total_spots=2, location='-')
+        self.spots = [ParkingSpot.objects.create(parking_lot=self.lot, spot_number=str(i)) for i in range(2)]
+
+    def test_unchanged_lot_answers_304(self):
+        for url in (f'/api/api/parking-lots/{self.lot.pk}/', f'/api/api/parking-lots/{self.lot.pk}/availability/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertNotIn('Last-Modified', response.headers)
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_deleted_spot_changes_the_etag(self):
+        url = f'/api/api/parking-lots/{self.lot.pk}/'
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.spots[0].delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_deleted_lot_is_404_not_304(self):
+        etags = {}
+        for url in (f'/api/api/parking-lots/{self.lot.pk}/', f'/api/api/parking-lots/{self.lot.pk}/availability/'):
+            etags[url] = self.client.get(url)['ETag']
+        # Without invalidation, as when another worker deleted it
+        ParkingLot.objects.filter(pk=self.lot.pk).delete()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+
+class OccupancyPredictionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('predict', password='-'))
+        self.lot = ParkingLot.objects.create(name='Predict', total_spots=1, location='-')
+        today = timezone.now().date()
+        for i in range(10):
+            ParkingAnalytics.objects.create(parking_lot=self.lot, date=today - timedelta(days=i), total_vehicles=1,
+                                            peak_hour_occupancy=1, average_occupancy=50.0, revenue=Decimal('1'))
+
+    def test_missing_model_is_not_fitted_in_the_request(self):
+        registry = get_model_registry()
+        url = f'/api/api/parking-lots/{self.lot.pk}/predict_occupancy/'
+        with mock.patch('parking.forecasting.fit_occupancy_model') as fit, \
+                mock.patch.object(registry, 'train_in_background') as train_in_background:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 400)
+        fit.assert_not_called()
+        train_in_background.assert_called_once_with(self.lot.pk)
+        self.assertIn(self.lot.pk, registry.stale_models())
+
+        # What the background thread or `train_occupancy_models --stale` does
+        registry.train(self.lot.pk)
+        self.assertNotIn(self.lot.pk, registry.stale_models())
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertAlmostEqual(response.json()['predicted_occupancy'], 50.0)
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('rollups', password='-')
+        self.lot = ParkingLot.objects.create(name='Rollups', total_spots=2, location='-')
+        self.spot = ParkingSpot.objects.create(parking_lot=self.lot, spot_number='1')
+        vehicle = Vehicle.objects.create(user=user, license_plate='ROLLUP', vehicle_type='car',
+                                         brand='-', model='-', color='-')
+        start = timezone.now() - timedelta(days=3)
+        self.session = ParkingSession.objects.create(vehicle=vehicle, parking_spot=self.spot, start_time=start,
+                                                     end_time=start + timedelta(hours=1), status='completed', fee='2.00')
+        self.day = local_day(start)
+        run_rollup(full=True)
+
+    def arrivals(self, day):
+        return ParkingAnalytics.objects.get(parking_lot=self.lot, date=day).total_vehicles
+
+    def test_deleted_session_days_are_rolled_up_again(self):
+        self.assertEqual(self.arrivals(self.day), 1)
+        self.session.delete()
+        run_rollup()
+        self.assertEqual(self.arrivals(self.day), 0)
+
+    def test_moved_session_days_are_rolled_up_again(self):
+        self.session.start_time += timedelta(days=1)
+        self.session.end_time += timedelta(days=1)
+        self.session.save()
+        run_rollup()
+        self.assertEqual(self.arrivals(self.day), 0)
+        self.assertEqual(self.arrivals(self.day + timedelta(days=1)), 1)
+
+
+class PlateLogWriterTests(TransactionTestCase):
+    """Real commits: SQLite only checks foreign keys when the transaction commits."""
+
+    def setUp(self):
+        lot = ParkingLot.objects.create(name='Writer', total_spots=1, location='-')
+        self.camera = Camera.objects.create(name='Writer', location='-', ip_address='127.0.0.1', parking_lot=lot)
+        self.spool = os.path.join(tempfile.mkdtemp(dir=TEST_FILES), 'plate_logs.jsonl')
+        self.writer = PlateLogWriter(spool_path=self.spool, flush_interval=60)
+        self.plate = np.zeros((20, 60, 3), dtype=np.uint8)
+
+    def tearDown(self):
+        self.writer.close()
+
+    def test_logs_keep_the_capture_time(self):
+        captured = timezone.now() - timedelta(minutes=10)
+        self.writer.submit(self.camera, '51A12345', 0.9, self.plate, captured)
+        # While the database is down the row waits in the spool
+        with mock.patch('parking.writer.LicensePlateLog.objects.bulk_create', side_effect=OperationalError('down')):
+            self.writer.flush()
+        self.assertFalse(LicensePlateLog.objects.exists())
+        self.writer.flush()
+        self.assertEqual(LicensePlateLog.objects.get().timestamp, captured)
+
+    def test_rejected_rows_do_not_block_the_spool(self):
+        captured = timezone.now().isoformat()
+        records = [
+            {'camera_id': self.camera.pk if i != 2 else 999999, 'license_plate': f'51A0000{i}', 'confidence': 0.9,
+             'image': '', 'timestamp': captured}
+            for i in range(5)
+        ]
+        self.writer.spool(records)
+        self.writer.replay_spool()
+        self.assertEqual(sorted(LicensePlateLog.objects.values_list('license_plate', flat=True)),
+                         ['51A00000', '51A00001', '51A00003', '51A00004'])
+        self.assertFalse(os.path.exists(self.spool))
+        self.assertFalse(os.path.exists(self.spool + '.replaying'))
+        with open(self.spool + '.rejected') as f:
+            rejected = [json.loads(line) for line in f]
+        self.assertEqual([record['license_plate'] for record in rejected], ['51A00002'])
+
+        # Later rows are not held up by the rejected one
+        self.writer.spool(records[:1])
+        self.writer.replay_spool()
+        self.assertEqual(LicensePlateLog.objects.count(), 5)
+
+
+class CaptureWorkerTests(SimpleTestCase):
+    def test_full_buffer_drops_the_oldest_frame(self):
+        buffer = FrameRingBuffer(maxlen=3)
+        for i in range(5):
+            buffer.put(i, timestamp=float(i))
+        self.assertEqual(buffer.dropped, 2)
+        self.assertEqual([buffer.get(0)[1] for _ in range(3)], [2, 3, 4])
+        self.assertEqual(buffer.get(0), (None, None))
+
+    def test_reconnects_after_failures_and_end_of_stream(self):
+        opened = []
+        done = threading.Event()
+
+        def open_source():
+            opened.append(1)
+            if len(opened) == 1:
+                # The first attempt cannot connect at all
+                source = SyntheticFrameSource([])
+                source.release()
+                return source
+            if len(opened) <= 3:
+                start = (len(opened) - 2) * 5
+                return SyntheticFrameSource(range(start, start + 5))
+            done.set()
+            return SyntheticFrameSource([])
+
+        worker = CaptureWorker(open_source, buffer_size=4, min_backoff=0.01, max_backoff=0.02)
+        with mock.patch('builtins.print'):
+            worker.start()
+            self.assertTrue(done.wait(5))
+            worker.stop(5)
+
+        self.assertFalse(worker.is_alive())
+        self.assertGreaterEqual(worker.reconnects, 3)
+        self.assertEqual(worker.frames_read, 10)
+        # Nobody read, so only the newest frames are left
+        self.assertEqual(worker.buffer.dropped, 6)
+        self.assertEqual([worker.read(0)[1] for _ in range(4)], [6, 7, 8, 9])
+
+
+class OCREngineTests(SimpleTestCase):
+    def setUp(self):
+        self.engine = OCREngine(max_batch_size=4, max_wait=0.2)
+        self.batches = []
+
+        def read_batch(crops):
+            self.batches.append(len(crops))
+            return [[(None, f'PLATE{crop}', 0.9)] for crop in crops]
+
+        self.engine.read_batch = read_batch
+
+    def test_crops_are_micro_batched(self):
+        results = self.engine.recognize(range(10), timeout=5)
+        self.assertEqual([result[0][1] for result in results], [f'PLATE{i}' for i in range(10)])
+        self.assertEqual(self.batches, [4, 4, 2])
+        self.assertEqual(self.engine.stats()['items'], 10)
+
+    def test_a_failed_batch_fails_each_caller(self):
+        self.engine.read_batch = mock.Mock(side_effect=RuntimeError('model crashed'))
+        futures = [self.engine.submit(i) for i in range(3)]
+        for future in futures:
+            with self.assertRaises(RuntimeError):
+                future.result(5)
+
+
+class PlateTrackerTests(SimpleTestCase):
+    def test_reads_of_one_passage_are_logged_once(self):
+        tracker = PlateTracker(max_distance=2, gap=3.0, min_votes=3)
+        ready = []
+        for i, text in enumerate(['51A-12345', '51A12845', '51a 12345', '51A12345', '51A12345']):
+            ready += tracker.observe(text, 0.9, None, timestamp=100 + i * 0.2)
+        ready += tracker.observe('30F88888', 0.8, None, timestamp=101)
+
+        # Emitted on the third agreeing read; later reads join the same track
+        self.assertEqual(len(ready), 1)
+        self.assertEqual(ready[0].best()[0], '51A12345')
+        self.assertEqual(ready[0].first_seen, 100)
+        self.assertEqual(len(ready[0].reads), 5)
+
+        # The other plate never reached min_votes and is logged when it expires, once
+        expired = tracker.expire(timestamp=110)
+        self.assertEqual([track.best()[0] for track in expired], ['30F88888'])
+        self.assertEqual(tracker.expire(timestamp=120), [])
+        self.assertEqual(tracker.flush(), [])
+
+    def test_a_later_passage_is_a_new_track(self):
+        tracker = PlateTracker(max_distance=2, gap=3.0, min_votes=2)
+        first = tracker.observe('51A12345', 0.9, None, timestamp=100) + tracker.observe('51A12345', 0.9, None, timestamp=101)
+        second = tracker.observe('51A12345', 0.9, None, timestamp=110) + tracker.observe('51A12345', 0.9, None, timestamp=111)
+        self.assertEqual(len(first), 1)
+        self.assertEqual(len(second), 1)
+        self.assertIsNot(first[0], second[0])
+
+
+@override_settings(ALPR_TRACK_GAP=3.0, ALPR_TRACK_MIN_VOTES=3, ALPR_TRACK_EXPIRE_INTERVAL=0.05)
+class TrackExpiryTests(TestCase):
+    def setUp(self):
+        lot = ParkingLot.objects.create(name='Lane', total_spots=1, location='-')
+        self.camera = Camera.objects.create(name='Lane', location='-', ip_address='127.0.0.1', parking_lot=lot)
+        # Trackers and gates are per process and keyed by camera id, which test databases reuse
+        for registry in (tracking._trackers, motion._gates):
+            registry.pop(self.camera.pk, None)
+            self.addCleanup(registry.pop, self.camera.pk, None)
+        self.pipeline = RecognitionPipeline([self.camera], sources={self.camera.pk: lambda: None})
+        self.pipeline.recognition.writer = mock.Mock()
+        self.pipeline.recognition.find_plate_regions = lambda frame: [frame] if frame.any() else []
+        self.pipeline.recognition.read_plate = lambda regions: ('51A12345', 0.9, None)
+
+    def run_frame(self, frame_time, frame):
+        for regions in self.pipeline.detect((self.camera.pk, frame_time, frame)):
+            for read in self.pipeline.ocr(regions):
+                self.pipeline.persist(read)
+
+    def logged(self):
+        return [call.args[1] for call in self.pipeline.recognition.writer.submit.call_args_list]
+
+    def test_car_stopped_in_the_lane_is_logged_once(self):
+        empty = np.zeros((120, 160), dtype=np.uint8)
+        parked, leaving = empty.copy(), empty.copy()
+        parked[40:80, 40:120] = 255
+        leaving[40:80, 0:80] = 255
+        started = time.time() - 60
+        self.run_frame(started, empty)
+        # Long enough for the motion gate to learn the car into its background
+        for i in range(80):
+            self.run_frame(started + 1 + i * 0.1, parked)
+        self.run_frame(started + 10, leaving)
+        self.pipeline.expire_tracks()
+        self.assertEqual(self.logged(), ['51A12345'])
+
+    def test_tracks_expire_without_new_frames(self):
+        with override_settings(ALPR_TRACK_GAP=0.2):
+            tracking._trackers.pop(self.camera.pk, None)
+            self.pipeline.persist((self.camera.pk, time.time(), '51A12345', 0.9, None))
+            self.assertEqual(self.logged(), [])
+            self.pipeline.expiry_thread.start()
+            try:
+                for _ in range(100):
+                    if self.logged():
+                        break
+                    time.sleep(0.05)
+            finally:
+                self.pipeline.capture_stop.set()
+                self.pipeline.expiry_thread.join(5)
+        self.assertEqual(self.logged(), ['51A12345'])
+
+
+class PlateIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = PlateIndex(max_distance=1)
+        self.index.load([(1, '51A-12345'), (2, '30F-88888')])
+
+    def test_exact_and_confusable_reads(self):
+        self.assertEqual(self.index.lookup('51a 12345'), (1, '51A12345', 0))
+        # 5/S and 0/O are folded before comparing
+        self.assertEqual(self.index.lookup('S1A12345'), (1, '51A12345', 0))
+        self.assertEqual(self.index.lookup('3OF88888'), (2, '30F88888', 0))
+
+    def test_fuzzy_reads(self):
+        self.assertEqual(self.index.lookup('51A12346'), (1, '51A12345', 1))
+        self.assertEqual(self.index.lookup('51A1234'), (1, '51A12345', 1))
+        self.assertIsNone(self.index.lookup('51A12399'))
+        self.assertIsNone(self.index.lookup('99Z00000'))
+
+    def test_ambiguous_reads_match_nothing(self):
+        self.index.add(3, '51A12347')
+        self.assertIsNone(self.index.lookup('51A12346'))
+        self.index.remove(3)
+        self.assertEqual(self.index.lookup('51A12346'), (1, '51A12345', 1))
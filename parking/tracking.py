@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+from .plates import edit_distance, normalize_plate
+
+
+class PlateTrack:
+    """All reads believed to belong to one vehicle passing one camera."""
+
+    def __init__(self, text, confidence, plate_img, timestamp):
+        self.reads = []
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.emitted = False
+        self.add(text, confidence, plate_img, timestamp)
+
+    def add(self, text, confidence, plate_img, timestamp):
+        self.reads.append((text, confidence, plate_img))
+        self.last_seen = max(self.last_seen, timestamp)
+
+    def votes(self):
+        # Confidence-weighted vote per distinct string
+        scores = defaultdict(float)
+        for text, confidence, _ in self.reads:
+            scores[text] += confidence
+        return scores
+
+    def best(self):
+        """Return (text, confidence, plate_img) for the winning string."""
+        scores = self.votes()
+        text = max(scores, key=scores.get)
+        reads = [read for read in self.reads if read[0] == text]
+        confidence = sum(read[1] for read in reads) / len(reads)
+        plate_img = max(reads, key=lambda read: read[1])[2]
+        return text, confidence, plate_img
+
+    def agreeing_reads(self):
+        return sum(1 for text, _, _ in self.reads if text == self.best()[0])
+
+    def matches(self, text, max_distance):
+        candidates = {read[0] for read in self.reads}
+        return any(edit_distance(text, candidate) <= max_distance for candidate in candidates)
+
+
+class PlateTracker:
+    """
+    Clusters plate reads from one camera so each vehicle passage is logged once.
+
+    Reads are matched to an open track when their normalized text is within
+    `max_distance` edits of a previous read and they arrive within `gap`
+    seconds of the track's last read. A track is emitted as soon as
+    `min_votes` reads agree on the same string, or when it expires without
+    having reached that, and is never emitted twice. Callers should expire()
+    on a timer too, since a camera that stops sending frames never calls
+    observe() to close its tracks.
+    """
+
+    def __init__(self, max_distance=2, gap=3.0, min_votes=3):
+        self.max_distance = max_distance
+        self.gap = gap
+        self.min_votes = min_votes
+        self.tracks = []
+        self.lock = threading.Lock()
+
+    def observe(self, text, confidence, plate_img, timestamp=None):
+        """Add a read and return the tracks that became ready to log."""
+        timestamp = timestamp or time.time()
+        text = normalize_plate(text)
+        with self.lock:
+            ready = self._expire(timestamp)
+            for track in self.tracks:
+                if track.matches(text, self.max_distance):
+                    track.add(text, confidence, plate_img, timestamp)
+                    break
+            else:
+                track = PlateTrack(text, confidence, plate_img, timestamp)
+                self.tracks.append(track)
+
+            if not track.emitted and track.agreeing_reads() >= self.min_votes:
+                track.emitted = True
+                ready.append(track)
+            return ready
+
+    def has_open_tracks(self):
+        with self.lock:
+            return bool(self.tracks)
+
+    def expire(self, timestamp=None):
+        """Close tracks not seen for `gap` seconds and return those never emitted."""
+        with self.lock:
+            return self._expire(timestamp or time.time())
+
+    def _expire(self, timestamp):
+        ready = []
+        open_tracks = []
+        for track in self.tracks:
+            if timestamp - track.last_seen > self.gap:
+                if not track.emitted:
+                    track.emitted = True
+                    ready.append(track)
+            else:
+                open_tracks.append(track)
+        self.tracks = open_tracks
+        return ready
+
+    def flush(self):
+        with self.lock:
+            ready = [track for track in self.tracks if not track.emitted]
+            for track in ready:
+                track.emitted = True
+            self.tracks = []
+            return ready
+
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+def get_plate_tracker(camera):
+    with _trackers_lock:
+        tracker = _trackers.get(camera.pk)
+        if tracker is None:
+            tracker = PlateTracker(
+                max_distance=getattr(settings, 'ALPR_TRACK_MAX_DISTANCE', 2),
+                gap=getattr(settings, 'ALPR_TRACK_GAP', 3.0),
+                min_votes=getattr(settings, 'ALPR_TRACK_MIN_VOTES', 3),
+            )
+            _trackers[camera.pk] = tracker
+        return tracker
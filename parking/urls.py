@@ -9,9 +9,11 @@ router.register(r'vehicles', views.VehicleViewSet, basename='vehicle')
 router.register(r'parking-sessions', views.ParkingSessionViewSet, basename='parking-session')
 router.register(r'reservations', views.ReservationViewSet, basename='reservation')
 router.register(r'analytics', views.ParkingAnalyticsViewSet)
+router.register(r'gate-events', views.GateEventViewSet, basename='gate-event')
 
 urlpatterns = [
     # API URLs
+    path('api/export/<str:dataset>/', views.export_data, name='export_data'),
     path('api/', include(router.urls)),
     
     # Frontend URLs
@@ -1,85 +1,158 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 from .models import ParkingLot, ParkingSpot, Vehicle, ParkingSession, Reservation, ParkingAnalytics
 from .serializers import (
     ParkingLotSerializer, ParkingSpotSerializer, VehicleSerializer,
-    ParkingSessionSerializer, ReservationSerializer, ParkingAnalyticsSerializer
+    ParkingSessionSerializer, ReservationSerializer, ParkingAnalyticsSerializer,
+    requested_expansions
 )
-from sklearn.ensemble import RandomForestRegressor
-import pandas as pd
-import numpy as np
+from .allocation import get_allocator
+from .forecasting import get_model_registry
+from .gate_events import ingest
+from .metrics import CONTENT_TYPE, REGISTRY
+from .availability import lot_availability, summarize, with_availability
+from .dashboard import dashboard_context
+from .http_cache import LOTS, conditional_data, conditional_page, lot_scope
+from .exports import CONTENT_TYPES, EXPORTS, STREAMS, async_stream, export_rows
+from .reservations import ReservationConflict, book_spot, free_spots, parse_interval
 from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, StreamingHttpResponse, Http404
+from django.utils.dateparse import parse_date
 from django.contrib import messages
 from datetime import timedelta
+import hmac
 import json
 
 # Create your views here.
 
-class ParkingLotViewSet(viewsets.ModelViewSet):
+class ExpandableViewSetMixin:
+    """Select/prefetch exactly the relations the serializer renders for the requested ?expand=."""
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        select, prefetch = self.get_serializer_class().related_lookups(requested_expansions(self.request))
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+class ParkingLotViewSet(ExpandableViewSetMixin, viewsets.ModelViewSet):
     queryset = ParkingLot.objects.all()
     serializer_class = ParkingLotSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = 'id'
+
+    # Reads answer 304 or cached data while the lots and spots are unchanged
+    def list(self, request, *args, **kwargs):
+        return conditional_data(request, LOTS, lambda: super(ParkingLotViewSet, self).list(request, *args, **kwargs).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        # 404 (and permission checks) come before any 304
+        parking_lot = self.get_object()
+        build = lambda: self.get_serializer(parking_lot).data
+        return conditional_data(request, lot_scope(parking_lot.pk), build)
 
     @action(detail=True, methods=['get'])
     def availability(self, request, pk=None):
         parking_lot = self.get_object()
-        return Response({
-            'total_spots': parking_lot.total_spots,
-            'available_spots': parking_lot.available_spots,
-            'occupancy_rate': (parking_lot.total_spots - parking_lot.available_spots) / parking_lot.total_spots * 100
-        })
+        # Read from the live per-status counters instead of scanning spots
+        return conditional_data(
+            request, lot_scope(parking_lot.pk), lambda: summarize(parking_lot.status_counters.all()),
+        )
+
+    @action(detail=True, methods=['get'])
+    def free_spots(self, request, pk=None):
+        # Spots with no pending/confirmed reservation overlapping ?start=&end=
+        parking_lot = self.get_object()
+        try:
+            start, end = parse_interval(request.query_params.get('start'), request.query_params.get('end'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        spots = free_spots(start, end, parking_lot)
+        page = self.paginate_queryset(spots)
+        serializer = ParkingSpotSerializer(page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['get'])
     def predict_occupancy(self, request, pk=None):
         parking_lot = self.get_object()
-        # Get historical data
-        historical_data = ParkingAnalytics.objects.filter(parking_lot=parking_lot)
+        # Served from the per-lot model; a missing one is trained in the background, not in this request
+        next_day, predicted_occupancy = get_model_registry().predict_next_day(parking_lot.pk)
         
-        if not historical_data.exists():
-            return Response({'error': 'Not enough historical data for prediction'}, 
+        if predicted_occupancy is None:
+            return Response({'error': 'No prediction yet: not enough historical data, or the model is still training'},
                           status=status.HTTP_400_BAD_REQUEST)
         
-        # Prepare data for prediction
-        df = pd.DataFrame(list(historical_data.values()))
-        df['date'] = pd.to_datetime(df['date'])
-        df['day_of_week'] = df['date'].dt.dayofweek
-        df['month'] = df['date'].dt.month
-        
-        # Train model
-        X = df[['day_of_week', 'month']]
-        y = df['average_occupancy']
+        return Response({
+            'date': next_day,
+            'predicted_occupancy': predicted_occupancy
+        })
+
+    @action(detail=False, methods=['get'])
+    def forecast(self, request):
+        # Forecast many lots over the next N days in one call
+        try:
+            days = min(max(int(request.query_params.get('days', 7)), 1), 90)
+            requested = [int(pk) for pk in request.query_params.get('lots', '').split(',') if pk]
+        except ValueError:
+            return Response({'error': 'days and lots must be integers'}, status=status.HTTP_400_BAD_REQUEST)
         
-        model = RandomForestRegressor(n_estimators=100)
-        model.fit(X, y)
+        lots = self.get_queryset()
+        if requested:
+            lots = lots.filter(pk__in=requested)
+        lot_ids = list(lots.values_list('pk', flat=True))
         
-        # Predict for next day
-        next_day = timezone.now().date() + timezone.timedelta(days=1)
-        prediction_data = np.array([[next_day.weekday(), next_day.month]])
-        predicted_occupancy = model.predict(prediction_data)[0]
+        start = timezone.now().date() + timedelta(days=1)
+        dates = [start + timedelta(days=i) for i in range(days)]
+        per_lot = request.query_params.get('model') == 'lot'
+        forecasts = get_model_registry().forecast(lot_ids, dates, per_lot=per_lot)
         
         return Response({
-            'date': next_day,
-            'predicted_occupancy': predicted_occupancy
+            'dates': dates,
+            'forecasts': [
+                {'parking_lot': lot_id, 'predicted_occupancy': forecasts[lot_id]}
+                for lot_id in lot_ids if lot_id in forecasts
+            ]
         })
 
-class ParkingSpotViewSet(viewsets.ModelViewSet):
+class ParkingSpotViewSet(ExpandableViewSetMixin, viewsets.ModelViewSet):
     queryset = ParkingSpot.objects.all()
     serializer_class = ParkingSpotSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = 'id'
+    filter_fields = {
+        'lot': 'parking_lot',
+        'status': 'status',
+        'is_handicap': 'is_handicap',
+        'is_ev_charging': 'is_ev_charging',
+    }
 
     @action(detail=False, methods=['get'])
     def available_spots(self, request):
-        spots = self.get_queryset().filter(status='available')
-        serializer = self.get_serializer(spots, many=True)
-        return Response(serializer.data)
+        def build():
+            spots = self.filter_queryset(self.get_queryset()).filter(status='available')
+            page = self.paginate_queryset(spots)
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data).data
+        return conditional_data(request, LOTS, build)
 
-class VehicleViewSet(viewsets.ModelViewSet):
+class VehicleViewSet(ExpandableViewSetMixin, viewsets.ModelViewSet):
     serializer_class = VehicleSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = '-id'
+    filter_fields = {
+        'vehicle_type': 'vehicle_type',
+    }
 
     def get_queryset(self):
         return Vehicle.objects.filter(user=self.request.user)
@@ -87,9 +160,16 @@ class VehicleViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class ParkingSessionViewSet(viewsets.ModelViewSet):
+class ParkingSessionViewSet(ExpandableViewSetMixin, viewsets.ModelViewSet):
     serializer_class = ParkingSessionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = ('-start_time', '-id')
+    date_field = 'start_time'
+    filter_fields = {
+        'lot': 'parking_spot__parking_lot',
+        'status': 'status',
+        'vehicle': 'vehicle',
+    }
 
     def get_queryset(self):
         return ParkingSession.objects.filter(vehicle__user=self.request.user)
@@ -97,30 +177,48 @@ class ParkingSessionViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         vehicle = get_object_or_404(Vehicle, id=self.request.data['vehicle_id'], user=self.request.user)
         spot = get_object_or_404(ParkingSpot, id=self.request.data['spot_id'])
-        serializer.save(vehicle=vehicle, parking_spot=spot, start_time=timezone.now())
+        # Occupy the spot first so two sessions cannot start on it
+        if not get_allocator().claim(spot.pk, spot.parking_lot_id, (spot.is_handicap, spot.is_ev_charging)):
+            raise ValidationError({'spot_id': 'This spot is not available.'})
+        try:
+            with transaction.atomic():
+                serializer.save(vehicle=vehicle, parking_spot=spot, start_time=timezone.now())
+        except IntegrityError:
+            get_allocator().release(spot.pk)
+            raise ValidationError({'vehicle_id': 'This vehicle already has an active session.'})
 
     @action(detail=True, methods=['post'])
     def end_session(self, request, pk=None):
         session = self.get_object()
-        session.end_time = timezone.now()
-        session.status = 'completed'
-        session.save()
-        
-        # Calculate fee (example: $2 per hour)
-        duration = session.end_time - session.start_time
-        hours = duration.total_seconds() / 3600
-        session.fee = round(hours * 2, 2)
-        session.save()
+        with transaction.atomic():
+            # Locked and re-checked, so a session is only ended once; its spot may already belong to another
+            session = ParkingSession.objects.select_for_update().get(pk=session.pk)
+            if session.status != 'active':
+                return Response({'error': 'This session has already ended.'}, status=status.HTTP_400_BAD_REQUEST)
+            session.end_time = timezone.now()
+            session.status = 'completed'
+
+            # Calculate fee (example: $2 per hour)
+            duration = session.end_time - session.start_time
+            hours = duration.total_seconds() / 3600
+            session.fee = round(hours * 2, 2)
+            session.save()
         
-        # Update parking spot status
-        session.parking_spot.status = 'available'
-        session.parking_spot.save()
+        # Hand the spot back to the allocator
+        get_allocator().release(session.parking_spot_id)
         
         return Response(self.get_serializer(session).data)
 
-class ReservationViewSet(viewsets.ModelViewSet):
+class ReservationViewSet(ExpandableViewSetMixin, viewsets.ModelViewSet):
     serializer_class = ReservationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = ('-start_time', '-id')
+    date_field = 'start_time'
+    filter_fields = {
+        'lot': 'parking_spot__parking_lot',
+        'status': 'status',
+        'vehicle': 'vehicle',
+    }
 
     def get_queryset(self):
         return Reservation.objects.filter(user=self.request.user)
@@ -128,112 +226,137 @@ class ReservationViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         vehicle = get_object_or_404(Vehicle, id=self.request.data['vehicle_id'], user=self.request.user)
         spot = get_object_or_404(ParkingSpot, id=self.request.data['spot_id'])
-        serializer.save(user=self.request.user, vehicle=vehicle, parking_spot=spot)
+        data = serializer.validated_data
+        if data['end_time'] <= data['start_time']:
+            raise ValidationError({'end_time': 'Must be after start_time.'})
+        try:
+            serializer.instance = book_spot(
+                self.request.user, vehicle, spot, data['start_time'], data['end_time'],
+                status=data.get('status', 'pending'),
+            )
+        except ReservationConflict as e:
+            raise ValidationError({'spot_id': str(e)})
 
-class ParkingAnalyticsViewSet(viewsets.ModelViewSet):
+class ParkingAnalyticsViewSet(ExpandableViewSetMixin, viewsets.ModelViewSet):
     queryset = ParkingAnalytics.objects.all()
     serializer_class = ParkingAnalyticsSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = ('-date', '-id')
+    date_field = 'date'
+    filter_fields = {
+        'lot': 'parking_lot',
+    }
 
     @action(detail=False, methods=['get'])
     def daily_stats(self, request):
         today = timezone.now().date()
-        stats = self.get_queryset().filter(date=today)
-        serializer = self.get_serializer(stats, many=True)
-        return Response(serializer.data)
+        stats = self.filter_queryset(self.get_queryset()).filter(date=today)
+        page = self.paginate_queryset(stats)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+class GateEventViewSet(viewsets.ViewSet):
+    """Batches of check-in/check-out events from cameras that read plates on-device."""
+    permission_classes = [permissions.IsAdminUser]
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        # Accepts {"events": [...]} or a bare list
+        events = request.data.get('events') if isinstance(request.data, dict) else request.data
+        if not isinstance(events, list) or not events:
+            raise ValidationError({'events': 'Must be a non-empty list.'})
+        max_batch = getattr(settings, 'GATE_EVENTS_MAX_BATCH', 5000)
+        if len(events) > max_batch:
+            raise ValidationError({'events': f'At most {max_batch} events per request.'})
+        results = ingest(events)
+        counts = {}
+        for result in results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+        return Response({'counts': counts, 'results': results})
+
+@login_required
+def export_data(request, dataset):
+    """Stream a whole dataset as CSV or NDJSON, e.g. /api/export/sessions/?format=ndjson&since=2024-01-01"""
+    if not request.user.is_staff:
+        return HttpResponseForbidden('Exports are only available to staff')
+    if dataset not in EXPORTS:
+        raise Http404('Unknown dataset')
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in STREAMS:
+        return HttpResponseBadRequest('format must be csv or ndjson')
+
+    dates = {}
+    for name in ('since', 'until'):
+        if request.GET.get(name):
+            try:
+                dates[name] = parse_date(request.GET[name])
+            except ValueError:
+                dates[name] = None
+            if dates[name] is None:
+                return HttpResponseBadRequest(f'{name} must be a date (YYYY-MM-DD)')
+
+    header, rows = export_rows(dataset, **dates)
+    chunks = STREAMS[export_format](header, rows)
+    if isinstance(request, ASGIRequest):
+        # ASGI would otherwise drain a sync iterator into a list before sending anything
+        chunks = async_stream(chunks)
+    response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{export_format}"'
+    return response
+
+def metrics(request):
+    """Prometheus text for this process's request metrics."""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponseForbidden('Missing or wrong metrics token')
+    elif not settings.DEBUG and not request.user.is_staff:
+        # Without a token only staff can see route names and query counts
+        return HttpResponseForbidden('Metrics need a staff login or METRICS_TOKEN')
+    return HttpResponse(REGISTRY.render(), content_type=CONTENT_TYPE)
 
 def home(request):
-    parking_lots = ParkingLot.objects.all()
-    return render(request, 'home.html', {'parking_lots': parking_lots})
+    # The lot list is a cached fragment keyed by the lots' ETag
+    return conditional_page(request, LOTS, lambda etag: render(request, 'home.html', {
+        'parking_lots': with_availability(ParkingLot.objects.all()), 'lots_etag': etag,
+        'fragment_timeout': getattr(settings, 'HTTP_CACHE_TIMEOUT', 300),
+    }))
 
 @login_required
 def dashboard(request):
-    # Get user's active sessions
-    active_sessions = ParkingSession.objects.filter(
-        vehicle__user=request.user,
-        status='active'
-    )
-    
-    # Get user's upcoming reservations
-    upcoming_reservations = Reservation.objects.filter(
-        user=request.user,
-        start_time__gte=timezone.now(),
-        status='confirmed'
-    ).order_by('start_time')[:5]
-    
-    # Get user's vehicles
-    vehicles = Vehicle.objects.filter(user=request.user)
-    
-    # Calculate total spent
-    total_spent = ParkingSession.objects.filter(
-        vehicle__user=request.user,
-        status='completed'
-    ).aggregate(total=models.Sum('fee'))['total'] or 0
-    
-    # Get recent sessions
-    recent_sessions = ParkingSession.objects.filter(
-        vehicle__user=request.user
-    ).order_by('-start_time')[:5]
-    
-    # Prepare chart data
-    last_7_days = [timezone.now().date() - timedelta(days=i) for i in range(6, -1, -1)]
-    chart_data = []
-    chart_labels = []
-    
-    for date in last_7_days:
-        analytics = ParkingAnalytics.objects.filter(
-            parking_lot__in=ParkingLot.objects.all(),
-            date=date
-        ).aggregate(avg_occupancy=models.Avg('average_occupancy'))
-        
-        chart_data.append(float(analytics['avg_occupancy'] or 0))
-        chart_labels.append(date.strftime('%Y-%m-%d'))
-    
-    context = {
-        'active_sessions_count': active_sessions.count(),
-        'upcoming_reservations_count': upcoming_reservations.count(),
-        'vehicles_count': vehicles.count(),
-        'total_spent': total_spent,
-        'recent_sessions': recent_sessions,
-        'upcoming_reservations': upcoming_reservations,
-        'chart_data': json.dumps(chart_data),
-        'chart_labels': json.dumps(chart_labels),
-    }
-    
+    # Totals, recent sessions and reservations are cached per user, the chart globally
+    context = dashboard_context(request.user)
+    context['chart_data'] = json.dumps(context['chart_data'])
+    context['chart_labels'] = json.dumps(context['chart_labels'])
     return render(request, 'dashboard.html', context)
 
 @login_required
 def parking_lot_detail(request, pk):
+    # Looked up before the ETag check so a deleted lot is a 404, not a 304
     parking_lot = get_object_or_404(ParkingLot, pk=pk)
-    spots = parking_lot.spots.all()
-    
-    # Get AI prediction for next day
-    historical_data = ParkingAnalytics.objects.filter(parking_lot=parking_lot)
-    prediction = None
-    
-    if historical_data.exists():
-        df = pd.DataFrame(list(historical_data.values()))
-        df['date'] = pd.to_datetime(df['date'])
-        df['day_of_week'] = df['date'].dt.dayofweek
-        df['month'] = df['date'].dt.month
-        
-        X = df[['day_of_week', 'month']]
-        y = df['average_occupancy']
-        
-        model = RandomForestRegressor(n_estimators=100)
-        model.fit(X, y)
-        
-        next_day = timezone.now().date() + timedelta(days=1)
-        prediction_data = np.array([[next_day.weekday(), next_day.month]])
-        prediction = model.predict(prediction_data)[0]
-    
-    context = {
-        'parking_lot': parking_lot,
-        'spots': spots,
-        'prediction': prediction
-    }
-    
-    return render(request, 'parking_lot_detail.html', context)
+    registry = get_model_registry()
+
+    def render_page(etag):
+        spots = parking_lot.spots.all()
+
+        # Get AI prediction for next day
+        next_day, prediction = registry.predict_next_day(parking_lot.pk)
+
+        context = {
+            'parking_lot': parking_lot,
+            # Counted from the spots, like the live stream that updates it
+            'availability': lot_availability(parking_lot.pk),
+            'spots': spots,
+            'prediction': prediction,
+            'lot_etag': etag,
+            'fragment_timeout': getattr(settings, 'HTTP_CACHE_TIMEOUT', 300),
+        }
+        return render(request, 'parking_lot_detail.html', context)
+
+    # The prediction changes with the day and whenever the lot's model is retrained
+    return conditional_page(
+        request, lot_scope(parking_lot.pk), render_page, timezone.localdate(), registry.model_version(parking_lot.pk),
+    )
 
 @login_required
 def reserve_spot(request):
@@ -246,31 +369,26 @@ def reserve_spot(request):
         spot = get_object_or_404(ParkingSpot, id=spot_id)
         vehicle = get_object_or_404(Vehicle, id=vehicle_id, user=request.user)
         
-        # Check if spot is available for the requested time
-        conflicting_reservations = Reservation.objects.filter(
-            parking_spot=spot,
-            status='confirmed',
-            start_time__lt=end_time,
-            end_time__gt=start_time
-        )
-        
-        if conflicting_reservations.exists():
+        try:
+            start_time, end_time = parse_interval(start_time, end_time)
+            book_spot(request.user, vehicle, spot, start_time, end_time)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return redirect('reserve_spot')
+        except ReservationConflict:
             messages.error(request, 'This spot is not available for the selected time period.')
             return redirect('reserve_spot')
         
-        reservation = Reservation.objects.create(
-            user=request.user,
-            vehicle=vehicle,
-            parking_spot=spot,
-            start_time=start_time,
-            end_time=end_time,
-            status='pending'
-        )
-        
         messages.success(request, 'Reservation request submitted successfully.')
         return redirect('dashboard')
     
-    available_spots = ParkingSpot.objects.filter(status='available')
+    # With ?start=&end= only spots free for that whole interval are listed
+    try:
+        start_time, end_time = parse_interval(request.GET.get('start'), request.GET.get('end'))
+        available_spots = free_spots(start_time, end_time)
+    except ValueError:
+        available_spots = ParkingSpot.objects.filter(status='available')
+    available_spots = available_spots.select_related('parking_lot')
     vehicles = Vehicle.objects.filter(user=request.user)
     
     context = {
@@ -294,9 +412,8 @@ def end_session(request, session_id):
         session.fee = round(hours * 2, 2)
         session.save()
         
-        # Update parking spot status
-        session.parking_spot.status = 'available'
-        session.parking_spot.save()
+        # Hand the spot back to the allocator
+        get_allocator().release(session.parking_spot_id)
         
         messages.success(request, f'Parking session ended. Fee: ${session.fee}')
     else:
@@ -0,0 +1,281 @@
+import json
+import os
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+import cv2
+from django.conf import settings
+from django.db import DatabaseError, DataError, IntegrityError, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import LicensePlateLog
+
+
+def plate_image_name(camera_id, timestamp=None):
+    # Microseconds plus a random suffix so reads within the same second never collide
+    timestamp = timestamp or timezone.now()
+    return f"license_plates/plate_{camera_id}_{timestamp.strftime('%Y%m%d_%H%M%S_%f')}_{uuid.uuid4().hex[:8]}.jpg"
+
+
+def write_plate_image(name, plate_img):
+    ok, encoded = cv2.imencode('.jpg', plate_img)
+    if not ok:
+        raise ValueError(f'Could not encode plate image {name}')
+    filepath = os.path.join(settings.MEDIA_ROOT, name)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    with open(filepath, 'wb') as f:
+        f.write(encoded.tobytes())
+
+
+_local_locks = {}
+
+
+@contextmanager
+def file_lock(path, blocking=True):
+    """
+    Exclusive lock on `path` across threads and processes. Yields False when
+    `blocking` is off and someone else holds it. Without fcntl it only
+    serializes threads of this process.
+    """
+    if fcntl is None:
+        lock = _local_locks.setdefault(path, threading.Lock())
+        acquired = lock.acquire(blocking)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                lock.release()
+        return
+    with open(path, 'a') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class PlateLogWriter:
+    """
+    Collects detections and writes them off the recognition thread.
+
+    Plate images are encoded and written on a thread pool. Log rows are
+    inserted with bulk_create in one transaction whenever `batch_size`
+    detections are pending or every `flush_interval` seconds. If the database
+    fails, or more than `max_pending` rows are waiting, rows are appended to a
+    JSON-lines spool file and replayed on the next successful flush. Rows the
+    database rejects on replay (say, for a deleted camera) are moved to
+    `<spool>.rejected` instead of blocking the rest. `on_saved` receives each
+    list of created logs.
+
+    Every run_alpr process shares the spool: appends and the move aside for
+    a replay take `<spool>.lock`, and only the process holding
+    `<spool>.replay.lock` replays, so no row is replayed twice.
+    """
+
+    def __init__(self, on_saved=None, batch_size=None, flush_interval=None, max_pending=None,
+                 image_workers=None, spool_path=None):
+        self.on_saved = on_saved
+        self.batch_size = batch_size or getattr(settings, 'ALPR_WRITER_BATCH_SIZE', 50)
+        self.flush_interval = flush_interval or getattr(settings, 'ALPR_WRITER_FLUSH_INTERVAL', 1.0)
+        self.max_pending = max_pending or getattr(settings, 'ALPR_WRITER_MAX_PENDING', 1000)
+        self.spool_path = spool_path or getattr(
+            settings, 'ALPR_WRITER_SPOOL', os.path.join(settings.BASE_DIR, 'spool', 'plate_logs.jsonl')
+        )
+        self.image_pool = ThreadPoolExecutor(
+            image_workers or getattr(settings, 'ALPR_WRITER_IMAGE_WORKERS', 4),
+            thread_name_prefix='plate-images',
+        )
+        self.pending = []
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.written = 0
+        self.spooled = 0
+
+    def _ensure_started(self):
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name='plate-log-writer', daemon=True)
+                    self.thread.start()
+
+    def submit(self, camera, plate_text, confidence, plate_img, timestamp=None):
+        """Queue a detection; `timestamp` is when the plate was captured, not when the row gets written."""
+        self._ensure_started()
+        timestamp = timestamp or timezone.now()
+        image = plate_image_name(camera.pk, timestamp)
+        record = {
+            'camera_id': camera.pk,
+            'license_plate': plate_text,
+            'confidence': float(confidence),
+            'image': image,
+            # A string so the record can be spooled as JSON
+            'timestamp': timestamp.isoformat(),
+        }
+        future = self.image_pool.submit(write_plate_image, image, plate_img)
+        with self.lock:
+            if len(self.pending) >= self.max_pending:
+                spill = True
+            else:
+                spill = False
+                self.pending.append((record, future))
+                full = len(self.pending) >= self.batch_size
+        if spill:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error writing plate image {image}: {str(e)}")
+                record['image'] = ''
+            self.spool([record])
+        elif full:
+            self.wakeup.set()
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Keep writing; a dead writer thread would silently drop every later detection
+                print(f"Error flushing plate logs:\n{traceback.format_exc()}")
+        connection.close()
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                pending, self.pending = self.pending, []
+
+            records = []
+            for record, future in pending:
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Error writing plate image {record['image']}: {str(e)}")
+                    record['image'] = ''
+                records.append(record)
+
+            if records and not self.save(records):
+                self.spool(records)
+                return
+            self.replay_spool()
+
+    def save(self, records):
+        try:
+            self._insert(records)
+        except DatabaseError as e:
+            print(f"Error saving {len(records)} plate logs, spooling to disk: {str(e)}")
+            return False
+        return True
+
+    def _insert(self, records):
+        logs = []
+        for record in records:
+            fields = dict(record)
+            # Rows spooled before capture times were recorded fall back to the insert time
+            if fields.get('timestamp'):
+                fields['timestamp'] = parse_datetime(fields['timestamp'])
+            else:
+                fields.pop('timestamp', None)
+            logs.append(LicensePlateLog(**fields))
+        with transaction.atomic():
+            logs = LicensePlateLog.objects.bulk_create(logs)
+        self.written += len(logs)
+        if self.on_saved:
+            try:
+                self.on_saved(logs)
+            except Exception as e:
+                print(f"Error processing saved plate logs: {str(e)}")
+
+    def _replay_batch(self, records):
+        """
+        Save `records`, halving batches the database rejects until the bad rows
+        are isolated and moved to the rejected file. Returns how many leading
+        records are done; fewer than all means the database is unavailable.
+        """
+        try:
+            self._insert(records)
+        except (IntegrityError, DataError) as e:
+            if len(records) == 1:
+                self.reject(records[0], e)
+                return 1
+            middle = len(records) // 2
+            done = self._replay_batch(records[:middle])
+            if done < middle:
+                return done
+            return middle + self._replay_batch(records[middle:])
+        except DatabaseError as e:
+            print(f"Error replaying {len(records)} spooled plate logs: {str(e)}")
+            return 0
+        return len(records)
+
+    def reject(self, record, error):
+        print(f"Moving spooled plate log to {self.spool_path}.rejected: {str(error)}")
+        with open(self.spool_path + '.rejected', 'a') as f:
+            f.write(json.dumps(dict(record, error=str(error))) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def spool(self, records):
+        os.makedirs(os.path.dirname(self.spool_path), exist_ok=True)
+        with file_lock(self.spool_path + '.lock'), open(self.spool_path, 'a') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.spooled += len(records)
+
+    def replay_spool(self):
+        replaying = self.spool_path + '.replaying'
+        if not os.path.exists(self.spool_path) and not os.path.exists(replaying):
+            return
+        with file_lock(self.spool_path + '.replay.lock', blocking=False) as locked:
+            if locked:
+                self._replay(replaying)
+
+    def _replay(self, replaying):
+        # Only the replay lock holder touches `replaying`
+        if not os.path.exists(replaying):
+            # Move the spool aside first so new spills during the replay are not lost
+            with file_lock(self.spool_path + '.lock'):
+                if not os.path.exists(self.spool_path):
+                    return
+                os.replace(self.spool_path, replaying)
+        with open(replaying) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        for start in range(0, len(records), self.batch_size):
+            batch = records[start:start + self.batch_size]
+            done = self._replay_batch(batch)
+            if done < len(batch):
+                # Keep what is left for the next attempt
+                with open(replaying + '.tmp', 'w') as f:
+                    for record in records[start + done:]:
+                        f.write(json.dumps(record) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(replaying + '.tmp', replaying)
+                return
+        os.remove(replaying)
+
+    def close(self):
+        self.stop_event.set()
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+        self.image_pool.shutdown()
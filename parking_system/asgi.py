@@ -2,15 +2,30 @@
 ASGI config for parking_system project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests to ``/stream/parking-lots/<id>/`` are served as Server-Sent Events
+streams of spot availability; everything else goes to Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
 
 import os
+import re
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'parking_system.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from parking.streaming import availability_stream  # noqa: E402  (needs Django set up)
+
+STREAM_PATH = re.compile(r'^/stream/parking-lots/(?P<lot_id>\d+)/?$')
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+        match = STREAM_PATH.match(scope['path'])
+        if match:
+            return await availability_stream(scope, receive, send, int(match['lot_id']))
+    return await django_application(scope, receive, send)
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'parking.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -78,13 +79,50 @@ WSGI_APPLICATION = 'parking_system.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# SQLite by default; set DB_ENGINE=postgresql (and DB_NAME, DB_USER, ...) for production
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+SQLITE_OPTIONS = {
+    # WAL lets readers run alongside the single writer; NORMAL only fsyncs at checkpoints in WAL mode
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA mmap_size=268435456;'
+        'PRAGMA temp_store=MEMORY;'
+    ),
+    'timeout': 20,  # Seconds to wait for the write lock (busy_timeout)
+    # Take the write lock at BEGIN so read-then-write transactions queue instead of failing with "database is locked"
+    'transaction_mode': 'IMMEDIATE',
 }
 
+if DB_ENGINE == 'postgresql':
+    DB_POOL = os.environ.get('DB_POOL', '').lower() in ('1', 'true', 'yes')
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'parking'),
+            'USER': os.environ.get('DB_USER', 'parking'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            # Pooled connections go back to the pool after each request, otherwise they are kept open
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            # Needs psycopg[pool]
+            'OPTIONS': {'pool': {'min_size': 2, 'max_size': int(os.environ.get('DB_POOL_SIZE', 10))}} if DB_POOL else {},
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': SQLITE_OPTIONS,
+            # A file rather than shared-cache memory, so threaded tests wait on the write lock like production
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -141,6 +179,11 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'parking.pagination.ViewCursorPagination',
+    'PAGE_SIZE': 50,
+    'DEFAULT_FILTER_BACKENDS': [
+        'parking.filters.QueryParamFilterBackend',
+    ],
 }
 
 # CORS settings
@@ -149,3 +192,69 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:8000",
     "http://127.0.0.1:8000",
 ]
+
+# Occupancy forecasting. Analytics writes only mark models stale; retrain them
+# from cron with `manage.py train_occupancy_models --stale`
+OCCUPANCY_MODEL_DIR = os.path.join(BASE_DIR, 'ml_models')  # Shared by every worker on the host
+OCCUPANCY_MODEL_CACHE_SIZE = 128  # Trained lot models kept in memory per process
+
+# Cache. Dashboard and lot/spot caches are invalidated by bumping version keys
+# stored here, so with several workers point CACHE_URL at a shared Redis
+# (needs `pip install redis`). The default per-process cache never sees other
+# workers' writes; their changes only show up once entries time out.
+CACHE_URL = os.environ.get('CACHE_URL', '')
+if CACHE_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_URL}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Dashboard
+# Seconds; writes invalidate sooner, but without a shared cache only in the worker that made them
+DASHBOARD_CACHE_TIMEOUT = 300 if CACHE_URL else 30
+
+# Conditional GETs and response caching for lots and spots
+HTTP_CACHE_TIMEOUT = 300  # Seconds cached lot/spot API data and page fragments are kept, keyed by ETag
+HTTP_CACHE_VALIDATOR_TIMEOUT = 2.0  # Seconds another worker's lot/spot writes may take to change ETags (per-process cache)
+
+# Live availability stream (ASGI only)
+AVAILABILITY_STREAM_POLL_INTERVAL = 1.0  # Seconds between change polls; bursts within one are coalesced
+AVAILABILITY_STREAM_QUEUE_SIZE = 16  # Pending events per subscriber before it is resynced with a snapshot
+AVAILABILITY_STREAM_HEARTBEAT = 15.0
+
+# Spot allocation
+SPOT_ALLOCATOR_REFRESH_INTERVAL = 30.0  # Seconds before a lot's free spot sets are reloaded from the database
+
+# Gate events posted in bulk by edge cameras
+GATE_EVENTS_MAX_BATCH = 5000
+
+# Request metrics, served at /metrics
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', '1.0'))  # Share of requests whose SQL is recorded
+METRICS_SLOW_REQUEST_SECONDS = 1.0  # Requests slower than this are logged (parking.metrics, WARNING) with their costliest SQL
+METRICS_N_PLUS_ONE_THRESHOLD = 5  # Repeats of one statement in a request that count as an N+1
+# When set, /metrics needs "Authorization: Bearer <token>"; otherwise a staff login unless DEBUG is on
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# License plate recognition settings
+ALPR_CAPTURE_BUFFER_SIZE = 8  # Frames kept per camera; the oldest are dropped when full
+ALPR_CAPTURE_MAX_BACKOFF = 30.0  # Seconds between reconnect attempts, at most
+ALPR_CAMERA_SOURCES = {}  # Camera id -> video file path, replaces the RTSP stream
+ALPR_PLATE_TOP_K = 3  # Plate candidates sent to OCR per frame
+ALPR_PLATE_ASPECT_RANGE = (1.0, 6.0)  # Width / height of a plausible plate box
+ALPR_OCR_LANGUAGES = ('en',)
+ALPR_OCR_MAX_BATCH_SIZE = 16  # Plate crops recognised per OCR batch
+ALPR_OCR_MAX_WAIT = 0.02  # Seconds to wait for a batch to fill
+ALPR_OCR_GPU = False
+ALPR_MOTION_ROI = {}  # Camera id -> (x, y, width, height) lane region as fractions of the frame
+ALPR_MOTION_THRESHOLD = 25  # Per-pixel intensity change that counts as motion
+ALPR_MOTION_MIN_CHANGE = 0.01  # Fraction of changed ROI pixels needed to run detection
+ALPR_TRACK_MAX_DISTANCE = 2  # Edits allowed between reads of the same plate
+ALPR_TRACK_GAP = 3.0  # Seconds without a read before a vehicle track closes
+ALPR_TRACK_MIN_VOTES = 3  # Agreeing reads needed to log a vehicle before its track closes
+ALPR_TRACK_EXPIRE_INTERVAL = 0.5  # Seconds between checks for tracks that went quiet
+ALPR_PLATE_INDEX_MAX_DISTANCE = 1  # Edits allowed between a read and a registered plate, after folding 0/O, 8/B, ...
+ALPR_PLATE_INDEX_REFRESH_INTERVAL = 60.0  # Seconds between picking up vehicles changed by other processes
+ALPR_WRITER_BATCH_SIZE = 50  # Plate logs inserted per bulk_create
+ALPR_WRITER_FLUSH_INTERVAL = 1.0  # Seconds between flushes of pending plate logs
+ALPR_WRITER_MAX_PENDING = 1000  # Pending plate logs kept in memory before spilling to disk
+ALPR_WRITER_IMAGE_WORKERS = 4
+ALPR_WRITER_SPOOL = os.path.join(BASE_DIR, 'spool', 'plate_logs.jsonl')
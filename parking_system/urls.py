@@ -18,9 +18,11 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from parking.views import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('parking.urls')),
     path('api-auth/', include('rest_framework.urls')),
+    path('metrics', metrics, name='metrics'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)